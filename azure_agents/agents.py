@@ -1,126 +1,308 @@
-from autogen import AssistantAgent
-from azure.identity import AzureCliCredential
 import json
-import os
-import configparser
-from pathlib import Path
-
-# Load configuration from config.ini
-def load_config():
-    config = configparser.ConfigParser()
-    # Get the path to config.ini (assuming it's in the project root)
-    config_path = Path(__file__).parent.parent / "config.ini"
-    
-    if not config_path.exists():
-        raise FileNotFoundError(f"Configuration file not found: {config_path}")
-    
-    config.read(config_path)
-    return config
+import threading
+from collections import deque
+from azure_agents.chat_memory import ChatMemory, format_turns, usage_counts
+from azure_agents.response_cache import ResponseCache, content_hash
+from azure_agents.retry import call_with_backoff
+from azure_agents.prompt_builder import count_tokens, fit_code_to_budget, question_regions, truncate_to_tokens
+from azure_agents.settings import get_settings
+from azure_agents.streaming import ReplyStream, iter_completion_deltas
+from utility.telemetry import get_telemetry
+
+# AutoGen, the OpenAI SDK, httpx and config.ini are only loaded when the first request is made,
+# so importing this module stays cheap for the CLI and non-LLM code paths.
+
+# Tokens reserved for the prompt template and the reply when estimating a request's size
+REQUEST_OVERHEAD_TOKENS = 1500
+
+# Bump whenever a prompt template below changes so cached responses are not reused
+PROMPT_TEMPLATE_VERSION = 6
+# Share of prompt_token_budget given to the regions of a summarized file that match a chat question
+CHAT_REGIONS_SHARE = 0.25
+
+ANALYZE_SYSTEM_MESSAGE = "You are an assistant agent that helps developer to understand the given code and explain the flow in briefly."
+LEARNING_SYSTEM_MESSAGE = "You are an assistant agent that helps developer to understand the given code explanation and choose important tech topics and suggest hands on tutorails for clear understanding for the concept."
+SUMMARIZE_SYSTEM_MESSAGE = "You are an assistant agent that helps developer to get an overview of a codebase by combining summaries of its files and folders."
+CHAT_SYSTEM_MESSAGE = "You are an assistant agent that helps developer to answer there queries. Context of the query is the code and the related repository code shared with it."
+CHAT_SUMMARY_SYSTEM_MESSAGE = "You are an assistant agent that keeps a short running summary of a developer's conversation about a code file."
+
+# Process-wide response cache shared by every RampUpAgent (and so every Streamlit session)
+_response_cache = None
 
-# Load configuration
-config = load_config()
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        settings = get_settings()
+        _response_cache = ResponseCache(
+            max_memory_entries=settings.cache_memory_entries,
+            max_disk_entries=settings.cache_max_entries,
+            ttl_seconds=settings.cache_ttl_seconds,
+        )
+    return _response_cache
+
+# Process-wide keep-alive connection pool and OpenAI client, so TLS handshakes are paid once
+_http_client = None
+_openai_client = None
 
-# Get Azure OpenAI configuration from config.ini
-AZURE_OPENAI_ENDPOINT = config.get('azure_openai', 'endpoint')
-DEPLOYMENT_NAME = config.get('azure_openai', 'deployment_name')
-API_VERSION = config.get('azure_openai', 'api_version')
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        import httpx
 
-# Try to get API key from environment variable first, then fall back to config file
-API_KEY = os.getenv('AZURE_OPENAI_API_KEY') or config.get('azure_openai', 'api_key')
+        # AutoGen deep-copies llm_config; returning self keeps every agent on the same connection pool
+        class PooledHttpClient(httpx.Client):
+            def __deepcopy__(self, memo):
+                return self
+
+        settings = get_settings()
+        _http_client = PooledHttpClient(
+            timeout=httpx.Timeout(settings.timeout),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+            ),
+        )
+    return _http_client
+
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        from openai import AzureOpenAI
+
+        settings = get_settings()
+        _openai_client = AzureOpenAI(
+            azure_endpoint=settings.endpoint,
+            api_key=settings.api_key,
+            api_version=settings.api_version,
+            http_client=get_http_client(),
+            timeout=settings.timeout,
+            max_retries=0,  # Retries are handled by call_with_backoff with jitter
+        )
+    return _openai_client
 
-# Optional: Get Azure CLI credential as fallback
-credential = AzureCliCredential()
-# Uncomment the line below if you want to use Azure CLI credentials instead
-# token = credential.get_token("https://cognitiveservices.azure.com/.default").token
+# One long-lived AssistantAgent per role and thread, keyed by (name, system message) and shared by
+# every RampUpAgent on that thread. generate_reply records the messages it is given on the agent, so
+# an assistant is never used by two threads at once (the repository analysis map phase runs many)
+_assistants = threading.local()
+
+# Count a completed request's tokens and cost in the telemetry; usage carries the counts reported
+# by the service (chat) or, failing that, local estimates of the prompt and reply
+def count_request_usage(usage):
+    telemetry = get_telemetry()
+    if not telemetry.enabled:
+        return
+    settings = get_settings()
+    input_tokens = usage.get("input_tokens") or usage.get("prompt_tokens") or 0
+    cached_tokens = usage.get("cached_input_tokens") or 0
+    output_tokens = usage.get("output_tokens") or 0
+    telemetry.increment("llm.requests")
+    telemetry.increment("llm.input_tokens", input_tokens)
+    telemetry.increment("llm.cached_input_tokens", cached_tokens)
+    telemetry.increment("llm.output_tokens", output_tokens)
+    telemetry.increment("llm.cost_usd", ((input_tokens - cached_tokens) * settings.cost_per_1k_input_tokens
+                                         + cached_tokens * settings.cost_per_1k_cached_input_tokens
+                                         + output_tokens * settings.cost_per_1k_output_tokens) / 1000)
 
 # Define the AI Agent using AutoGen
 
 class RampUpAgent:
-    def __init__(self):
-        self.config_list = [
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else get_response_cache()
+        self.repository_index = None
+        self.dependency_graph = None
+        # Token counts of recent requests, newest last
+        self.usage_log = deque(maxlen=200)
+        # ChatMemory per selected file; the only state that stays with one user's session
+        self._chats = {}
+        self._config_list = None
+
+    @property
+    def config_list(self):
+        if self._config_list is None:
+            settings = get_settings()
+            self._config_list = [
                 {
-                    "model": DEPLOYMENT_NAME,
-                    "api_key": API_KEY,  
-                    "base_url": f"{AZURE_OPENAI_ENDPOINT}",
+                    "model": settings.deployment_name,
+                    "api_key": settings.api_key,
+                    "base_url": f"{settings.endpoint}",
                     "api_type": "azure",
-                    "api_version": API_VERSION,
+                    "api_version": settings.api_version,
+                    "http_client": get_http_client(),
+                    "max_retries": 0,  # Retries are handled by call_with_backoff with jitter
                 }
             ]
+        return self._config_list
     
-    def train_on_repo_summary(self, repo_summary_path):
+    def set_repository_index(self, index):
         """
-        Load and process the repo_summary.json file to train the agent on repository context.
-        
+        Ground later prompts in the repository through a retrieval index built at scan time.
+
         Args:
-            repo_summary_path (str): Path to the repo_summary.json file
-        
+            index (RetrievalIndex): Index over the scanned folder, or None to clear it
+        """
+        self.repository_index = index
+
+    def set_dependency_graph(self, graph):
+        """
+        Ground later prompts in the files the selected file imports and the files importing it.
+
+        Args:
+            graph (DependencyGraph): Dependency graph of the scanned folder, or None to clear it
+        """
+        self.dependency_graph = graph
+
+    def _repository_context(self, query, selected_file):
+        settings = get_settings()
+        dependencies = ""
+        if self.dependency_graph is not None:
+            dependencies = self.dependency_graph.context_for(
+                selected_file, token_budget=settings.graph_token_budget, count_tokens=count_tokens)
+        if self.repository_index is None:
+            return dependencies or "No repository index is available."
+        context = self.repository_index.context_for(
+            query, token_budget=settings.context_token_budget, exclude_path=selected_file, count_tokens=count_tokens)
+        context = context or "No related code was found elsewhere in the repository."
+        return f"{dependencies}\n\n{context}" if dependencies else context
+
+    def _prepare_code(self, method, selected_file, code, query=""):
+        """
+        Fit the selected file into the prompt_token_budget setting and start a usage record for the request.
+
         Returns:
-            dict: Processed repository summary data
+            tuple: (code text for the prompt, usage dict)
         """
-        
-        try:
-            if not os.path.exists(repo_summary_path):
-                raise FileNotFoundError(f"Repository summary file not found: {repo_summary_path}")
-            
-            with open(repo_summary_path, 'r', encoding='utf-8') as file:
-                repo_data = json.load(file)
-            
-            # Send training content to Azure using AutoGen AssistantAgent
-            
-            # Create an AssistantAgent with Azure OpenAI configuration
-            assistant = AssistantAgent(
-                name="ramp_up_assistant",
+        budget = get_settings().prompt_token_budget
+        prompt_code, code_stats = fit_code_to_budget(selected_file, code, budget, query)
+        usage = {"method": method, "file": selected_file, "budget": budget, **code_stats}
+        return prompt_code, usage
+
+    def _record_usage(self, usage, system_message, prompt, cached):
+        usage["prompt_tokens"] = count_tokens(system_message) + count_tokens(prompt)
+        usage["cached"] = cached
+        self.usage_log.append(usage)
+
+    def estimate_request_tokens(self, code):
+        """Upper estimate of the tokens a request about code will consume, for rate limiting."""
+        settings = get_settings()
+        return (min(count_tokens(code), settings.prompt_token_budget) + settings.context_token_budget
+                + settings.graph_token_budget + REQUEST_OVERHEAD_TOKENS)
+
+    @property
+    def last_usage(self):
+        """Token counts of the most recent request, or None."""
+        return self.usage_log[-1] if self.usage_log else None
+
+    def _assistant(self, system_message, name="AI_Agent"):
+        assistants = getattr(_assistants, "by_role", None)
+        if assistants is None:
+            assistants = _assistants.by_role = {}
+        assistant = assistants.get((name, system_message))
+        if assistant is None:
+            from autogen import AssistantAgent
+
+            assistant = assistants[(name, system_message)] = AssistantAgent(
+                name=name,
+                system_message=system_message,
                 llm_config={
                     "config_list": self.config_list,
+                    "timeout": get_settings().timeout,
                 }
             )
-            
-            # Prepare training prompt with repository context
-            training_prompt = f"""
-            You are being trained on the following repository context:
-            
-            Repository Structure: {json.dumps(repo_data, indent=2)}
-            
-            Please acknowledge that you have processed this repository context and are ready to assist with questions about this codebase.
-            """
-            # Send training content to the assistant
-            response = assistant.generate_reply(messages=[{
-                "role": "user",
-                "content": training_prompt
-            }])
-            print(f"Training acknowledgment: {response}")
-            
-            # Store the assistant for later use
-            return assistant
-            
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON file: {e}")
-            return None
-
-    def analyze_code(self, selected_file, code):
-        chatAgent = AssistantAgent(
-            name="AI_Agent",
-            system_message= "You are an assistant agent that helps developer to understand the given code and explain the flow in briefly.",
-            llm_config={
-                    "config_list": self.config_list,
-                }
-        )
+        return assistant
+
+    def _cached_reply(self, method, system_message, prompt, code, *extra, cached_only=False, stream=False,
+                      usage=None):
+        """
+        Return the response for a prompt from the response cache, calling Azure OpenAI on a miss.
+
+        Args:
+            method (str): Name of the calling method, part of the cache key
+            system_message (str): System prompt for the assistant
+            prompt (str): Rendered user prompt
+            code (str): File content the prompt is about, hashed into the cache key
+            *extra (str): Other prompt inputs that must be part of the cache key
+            cached_only (bool): Return None on a cache miss instead of calling the model
+            stream (bool): Return a ReplyStream of text deltas instead of the full reply
+            usage (dict): Usage record from _prepare_code, completed and logged unless cached_only misses
+
+        Returns:
+            str | ReplyStream: Assistant reply
+        """
+        settings = get_settings()
+        telemetry = get_telemetry()
+        key = ResponseCache.make_key(
+            method, settings.deployment_name, system_message, PROMPT_TEMPLATE_VERSION, content_hash(code), *extra)
+        # A cached_only probe that misses sends nothing, so it is not counted as a cache miss
+        cached = self.cache.get(key, count_miss=not cached_only)
+        if cached is not None or not cached_only:
+            telemetry.increment("llm_cache.hits" if cached is not None else "llm_cache.misses")
+            if usage is not None:
+                self._record_usage(usage, system_message, prompt, cached is not None)
+        if stream and cached is not None:
+            return ReplyStream.from_text(cached)
+        if cached is not None or cached_only:
+            return cached
+
+        if stream:
+            messages = [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt},
+            ]
+            deltas = iter_completion_deltas(
+                get_openai_client(), settings.deployment_name, messages, max_retries=settings.max_retries)
+
+            def on_complete(text):
+                self.cache.set(key, text)
+                self._record_stream(method, reply_stream.stats, usage)
 
+            reply_stream = ReplyStream(deltas, on_complete=on_complete)
+            return reply_stream
+
+        chatAgent = self._assistant(system_message)
+        with telemetry.span(f"llm.{method}", stream=False):
+            reply = call_with_backoff(
+                lambda: chatAgent.generate_reply(messages=[{"role": "user", "content": prompt}]),
+                max_retries=settings.max_retries,
+            )
+        if isinstance(reply, str):
+            self.cache.set(key, reply)
+            if usage is not None and telemetry.enabled:
+                usage["output_tokens"] = count_tokens(reply)
+                count_request_usage(usage)
+        return reply
+
+    def _record_stream(self, method, stats, usage=None):
+        """Record the latency of a finished streamed reply, and its tokens when usage is given."""
+        telemetry = get_telemetry()
+        if not telemetry.enabled:
+            return
+        telemetry.record(f"llm.{method}", (stats.total_seconds or 0) * 1000, stream=True,
+                         first_token_ms=round((stats.time_to_first_token or 0) * 1000, 3), chunks=stats.tokens)
+        if usage is not None:
+            usage.setdefault("output_tokens", stats.tokens)
+            count_request_usage(usage)
+
+    def analyze_code(self, selected_file, code, cached_only=False, stream=False):
+        prompt_code, usage = self._prepare_code("analyze_code", selected_file, code)
+        repository_context = self._repository_context(f"{selected_file}\n{prompt_code}", selected_file)
         training_prompt = f"""
-            Based on the complete repository details I shared earlier, please analyze the following specific file and its content:
+            Based on the related repository code below, please analyze the following specific file and its content:
 
             **File:** {selected_file}
             
             **Code Content:**
             ```
-            {code}
+            {prompt_code}
             ```
 
+            **Related Repository Code:**
+            {repository_context}
+
             Please provide a comprehensive analysis that includes:
             
             1. **Purpose & Functionality**: What does this code do within the context of the overall repository?
             2. **Code Flow**: Explain the execution flow and key logic steps.
-            3. **Dependencies**: How does this file relate to other components in the repository?
+            3. **Dependencies**: How does this file relate to other components in the repository? Use the imports and importers listed above.
             4. **Key Components**: Identify important classes, functions, variables, and their roles
             5. **Potential Issues**: Highlight any code smells, potential bugs, or areas for improvement
             6. **Best Practices**: Comment on code quality and adherence to best security practices
@@ -128,31 +310,28 @@ class RampUpAgent:
             Keep the explanation clear and concise, suitable for a developer who needs to understand this code quickly.
         """
 
-        explanations = chatAgent.generate_reply(
-            messages= [{"role": "user", "content": training_prompt}],
-        )
+        explanations = self._cached_reply(
+            "analyze_code", ANALYZE_SYSTEM_MESSAGE, training_prompt, code, selected_file,
+            content_hash(training_prompt), cached_only=cached_only, stream=stream, usage=usage)
 
         return explanations
 
-    def fetch_learning_resorces(self, selected_file, code):
-        chatAgent = AssistantAgent(
-            name="AI_Agent",
-            system_message= "You are an assistant agent that helps developer to understand the given code explanation and choose important tech topics and suggest hands on tutorails for clear understanding for the concept.",
-            llm_config={
-                    "config_list": self.config_list,
-                }
-        )
-
+    def fetch_learning_resorces(self, selected_file, code, cached_only=False, stream=False):
+        prompt_code, usage = self._prepare_code("fetch_learning_resorces", selected_file, code)
+        repository_context = self._repository_context(f"{selected_file}\n{prompt_code}", selected_file)
         training_prompt = f"""
-            Based on the complete repository details I shared earlier and the following specific file analysis:
+            Based on the related repository code below and the following specific file analysis:
 
             **File:** {selected_file}
             
             **Code Content:**
             ```
-            {code}
+            {prompt_code}
             ```
 
+            **Related Repository Code:**
+            {repository_context}
+
             Please identify the key technical concepts, frameworks, and technologies used in this code and throughout the repository, then provide comprehensive learning resources for each:
 
             For each identified concept, please provide:
@@ -182,36 +361,171 @@ class RampUpAgent:
             Organize the response by concept/technology for easy reference.
         """
 
-        tutorials = chatAgent.generate_reply(
-            messages= [{"role": "user", "content": training_prompt}],
-        )
+        tutorials = self._cached_reply(
+            "fetch_learning_resorces", LEARNING_SYSTEM_MESSAGE, training_prompt, code, selected_file,
+            content_hash(training_prompt), cached_only=cached_only, stream=stream, usage=usage)
 
         return tutorials
     
-    def chat_with_context(self, prompt, selected_file, code):
-        chatAgent = AssistantAgent(
-            name="AI_Agent",
-            system_message= "You are an assistant agent that helps developer to answer there queries. Context of the query is the code and repository details shared earlier.",
-            llm_config={
-                    "config_list": self.config_list,
-                }
-        )
+    def _chat_memory(self, selected_file, code):
+        """
+        Conversation about a file, with its context rebuilt only when the file content changes.
 
+        The code is fitted to the budget without a query and the repository context is retrieved
+        for the file rather than the question, so every turn starts with the same bytes; the
+        regions matching the question are sent with the question instead (see chat_with_context).
+        """
+        memory = self._chats.get(selected_file)
+        if memory is None:
+            memory = self._chats[selected_file] = ChatMemory()
+        code_hash = content_hash(code)
+        if memory.code_hash != code_hash:
+            prompt_code, code_stats = fit_code_to_budget(selected_file, code, get_settings().prompt_token_budget)
+            repository_context = self._repository_context(f"{selected_file}\n{prompt_code}", selected_file)
+            context = (f"**File:** {selected_file}\n\n"
+                       f"**Code Content:**\n```\n{prompt_code}\n```\n\n"
+                       f"**Related Repository Code:**\n{repository_context}")
+            memory.set_context(code_hash, context, code_stats)
+        return memory
+
+    def _compact_chat(self, memory, selected_file):
+        """Fold the oldest turns into the rolling summary once the history is over its token budget."""
+        settings = get_settings()
+        if memory.history_tokens(count_tokens) <= settings.chat_history_token_budget:
+            return
+        folded = memory.turns_to_fold(settings.chat_keep_turns)
+        if not folded:
+            return
+        conversation = format_turns(folded)
         training_prompt = f"""
-            Based on the complete repository details I shared earlier, please analyze the following specific file and its content:
+            Summary of the conversation so far about **{selected_file}**:
+            {memory.summary or "(none yet)"}
 
-            **File:** {selected_file}
-            
-            **Code Content:**
-            ```
-            {code}
-            ```
+            Newer messages:
+            {conversation}
 
-            {prompt}
+            Please rewrite the summary so it also covers the newer messages. Keep the questions asked, the answers given, and any code, names or decisions later questions may refer to. Stay under 300 words.
         """
+        summary = self._cached_reply(
+            "summarize_chat", CHAT_SUMMARY_SYSTEM_MESSAGE, training_prompt, conversation, memory.summary)
+        if isinstance(summary, str):
+            memory.fold(len(folded), summary)
 
-        response = chatAgent.generate_reply(
-            messages= [{"role": "user", "content": training_prompt}],
-        )
+    def clear_chat(self, selected_file):
+        """Forget the conversation about a file, keeping its file and repository context."""
+        memory = self._chats.get(selected_file)
+        if memory is not None:
+            memory.clear()
+
+    def chat_with_context(self, prompt, selected_file, code, stream=False):
+        """
+        Answer a question about a file, continuing the conversation about it.
+
+        Each request carries the stable file context, a summary of older turns, the recent turns
+        and the question. When the file was too large for the budget, the question is preceded by
+        the regions of the file that best match it; they are not kept in the conversation. The
+        usage record reports input, prompt-cached and output tokens as returned by the service
+        once the reply is complete.
+
+        Returns:
+            str | ReplyStream: Assistant reply
+        """
+        settings = get_settings()
+        memory = self._chat_memory(selected_file, code)
+        self._compact_chat(memory, selected_file)
+        question = prompt
+        if memory.code_stats.get("summarized"):
+            regions = question_regions(code, prompt, int(settings.prompt_token_budget * CHAT_REGIONS_SHARE))
+            if regions:
+                question = f"**Regions of {selected_file} related to the question:**\n```\n{regions}\n```\n\n{prompt}"
+        messages = memory.messages(CHAT_SYSTEM_MESSAGE, question)
+
+        usage = {"method": "chat_with_context", "file": selected_file, "budget": settings.prompt_token_budget,
+                 **memory.code_stats, "history_turns": len(memory.turns) // 2,
+                 "summarized_turns": memory.summarized_turns,
+                 "prompt_tokens": sum(count_tokens(message["content"]) for message in messages)}
+        key = ResponseCache.make_key(
+            "chat_with_context", settings.deployment_name, CHAT_SYSTEM_MESSAGE, PROMPT_TEMPLATE_VERSION,
+            content_hash(json.dumps(messages)))
+        cached = self.cache.get(key)
+        telemetry = get_telemetry()
+        telemetry.increment("llm_cache.hits" if cached is not None else "llm_cache.misses")
+        usage["cached"] = cached is not None
+        usage.update(usage_counts({"prompt_tokens": 0, "completion_tokens": 0} if usage["cached"] else None))
+        self.usage_log.append(usage)
+
+        def complete(reply, api_usage=None):
+            memory.add_exchange(prompt, reply)
+            if not usage["cached"]:
+                self.cache.set(key, reply)
+                usage.update(usage_counts(api_usage))
+
+        if cached is not None:
+            complete(cached)
+            return ReplyStream.from_text(cached) if stream else cached
+
+        client = get_openai_client()
+        if stream:
+            reported = []
+            options = {"stream_options": {"include_usage": True}} if settings.stream_usage else {}
+            deltas = iter_completion_deltas(client, settings.deployment_name, messages,
+                                            max_retries=settings.max_retries, on_usage=reported.append, **options)
+
+            def on_complete(reply):
+                complete(reply, reported[-1] if reported else None)
+                if not reported:
+                    # Not reported by the service: estimate, counting streamed chunks as tokens
+                    usage.update(input_tokens=usage["prompt_tokens"], output_tokens=reply_stream.stats.tokens)
+                self._record_stream("chat_with_context", reply_stream.stats, usage)
+
+            reply_stream = ReplyStream(deltas, on_complete=on_complete)
+            return reply_stream
+
+        with telemetry.span("llm.chat_with_context", stream=False):
+            response = call_with_backoff(
+                lambda: client.chat.completions.create(model=settings.deployment_name, messages=messages),
+                max_retries=settings.max_retries,
+            )
+        reply = response.choices[0].message.content or ""
+        complete(reply, response.usage)
+        count_request_usage(usage)
+        return reply
+
+    def summarize_components(self, component, summaries, cached_only=False):
+        """
+        Merge summaries of the files and subfolders of a folder into an overview of that folder.
+
+        Args:
+            component (str): Folder being summarized
+            summaries (list): (label, summary) pairs for its files and subfolders
+            cached_only (bool): Return None on a cache miss instead of calling the model
+
+        Returns:
+            str: Overview of the folder
+        """
+        budget = get_settings().prompt_token_budget
+        per_item_budget = max(budget // max(len(summaries), 1), 200)
+        sections = "\n\n".join(
+            f"### {label}\n{truncate_to_tokens(summary, per_item_budget)}" for label, summary in summaries)
+        usage = {"method": "summarize_components", "file": component, "budget": budget,
+                 "code_tokens": count_tokens(sections), "summarized": False}
+        training_prompt = f"""
+            Below are summaries of the files and subfolders inside **{component}**.
+
+            {sections}
+
+            Please write an overview of **{component}** that includes:
+
+            1. **Purpose**: What this part of the repository is responsible for
+            2. **Main Components**: The most important files or subfolders and their roles
+            3. **Interactions**: How the components work together and with the rest of the repository
+            4. **Entry Points**: Where a developer should start reading
+
+            Keep it concise, suitable for a developer who is new to this codebase.
+        """
+
+        overview = self._cached_reply(
+            "summarize_components", SUMMARIZE_SYSTEM_MESSAGE, training_prompt, sections, component,
+            cached_only=cached_only, usage=usage)
 
-        return response
\ No newline at end of file
+        return overview
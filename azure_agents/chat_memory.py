@@ -0,0 +1,85 @@
+class ChatMemory:
+    """
+    Conversation state of one chat about one file.
+
+    Requests are laid out so the start of every request in a conversation is byte-identical:
+    the system message followed by the file and its related repository code, which are built
+    once per version of the file. Providers cache prompt prefixes, so follow-up turns only pay
+    full price for what comes after it: the rolling summary of older turns, the recent turns
+    kept verbatim and the new question.
+    """
+
+    def __init__(self):
+        self.code_hash = None
+        self.context = ""
+        self.code_stats = {}
+        self.summary = ""
+        self.summarized_turns = 0
+        # Recent messages, alternating user and assistant, oldest first
+        self.turns = []
+
+    def set_context(self, code_hash, context, code_stats):
+        """Pin the file and repository context for this version of the file."""
+        self.code_hash = code_hash
+        self.context = context
+        self.code_stats = code_stats
+
+    def messages(self, system_message, prompt):
+        """
+        Chat completion messages for the next question.
+
+        Args:
+            system_message (str): Instructions for the assistant
+            prompt (str): The user's new question
+
+        Returns:
+            list: Messages, starting with the stable prefix
+        """
+        messages = [{"role": "system", "content": f"{system_message}\n\n{self.context}"}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        messages.extend(self.turns)
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def add_exchange(self, prompt, reply):
+        self.turns.append({"role": "user", "content": prompt})
+        self.turns.append({"role": "assistant", "content": reply})
+
+    def history_tokens(self, count_tokens):
+        return count_tokens(self.summary) + sum(count_tokens(turn["content"]) for turn in self.turns)
+
+    def turns_to_fold(self, keep_turns):
+        """Messages older than the last keep_turns exchanges, which the next summary absorbs."""
+        return self.turns[:max(len(self.turns) - 2 * keep_turns, 0)]
+
+    def fold(self, count, summary):
+        """Replace the oldest count messages with an updated summary."""
+        self.turns = self.turns[count:]
+        self.summarized_turns += count // 2
+        self.summary = summary
+
+    def clear(self):
+        self.summary = ""
+        self.summarized_turns = 0
+        self.turns = []
+
+
+# Text of messages for a summarization prompt
+def format_turns(turns):
+    return "\n\n".join(f"**{turn['role'].title()}:** {turn['content']}" for turn in turns)
+
+
+# Input, prompt-cache and output token counts from an OpenAI CompletionUsage (or its dict form);
+# values the service did not report are None
+def usage_counts(usage):
+    if usage is None:
+        return {"input_tokens": None, "cached_input_tokens": None, "output_tokens": None}
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "input_tokens": usage.get("prompt_tokens"),
+        "cached_input_tokens": details.get("cached_tokens"),
+        "output_tokens": usage.get("completion_tokens"),
+    }
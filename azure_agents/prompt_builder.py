@@ -0,0 +1,220 @@
+import ast
+import os
+import re
+
+from utility.retrieval_index import tokenize
+
+REGION_CONTEXT_LINES = 6
+# tiktoken encoding, loaded on first use; False once we know tiktoken is not installed
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+        except ImportError:  # Fall back to a character estimate when tiktoken is not installed
+            _encoding = False
+            return _encoding
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    """Count tokens with the local tokenizer, or estimate 4 characters per token without tiktoken."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is False:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, token_budget):
+    """Cut text to roughly token_budget tokens, marking the cut."""
+    tokens = count_tokens(text)
+    if tokens <= token_budget:
+        return text
+    return text[:int(len(text) * token_budget / tokens)] + "\n... (truncated)"
+
+
+# Signature lines per extension in DEFAULT_EXTENSIONS (Python uses them only when ast fails)
+_OUTLINE_PATTERNS = {
+    ".py": re.compile(r"^\s*(async\s+def|def|class)\s+\w+"),
+    ".js": re.compile(
+        r"^\s*(export\s+)?(default\s+)?(async\s+)?(function\*?\s+\w+|class\s+\w+"
+        r"|(const|let|var)\s+\w+\s*=\s*(async\s+)?(\([^)]*\)|\w+)\s*=>)"),
+    ".ts": re.compile(
+        r"^\s*(export\s+)?(default\s+)?(declare\s+)?(async\s+)?(function\*?\s+\w+|(abstract\s+)?class\s+\w+"
+        r"|interface\s+\w+|type\s+\w+\s*=|enum\s+\w+"
+        r"|(const|let|var)\s+\w+(\s*:\s*[^=]+)?\s*=\s*(async\s+)?(\([^)]*\)|\w+)\s*(:\s*[^=]+)?=>)"),
+    ".java": re.compile(
+        r"^\s*((public|private|protected|static|final|abstract|synchronized)\s+)*"
+        r"(class|interface|enum|record|[\w<>\[\],.? ]+\s+\w+\s*\([^;]*$)"),
+    ".cs": re.compile(
+        r"^\s*((public|private|protected|internal|static|sealed|abstract|virtual|override|async|partial|readonly)\s+)*"
+        r"(class|interface|enum|struct|record|namespace|[\w<>\[\],.? ]+\s+\w+\s*\([^;]*$)"),
+    ".cpp": re.compile(
+        r"^\s*(template\s*<.*>\s*)?(class|struct|namespace|enum)\s+\w+"
+        r"|^[\w:<>*&~ ]+\s+[\w:~]+\s*\([^;]*\)\s*(const)?\s*(\{|$)"),
+    ".html": re.compile(r"^\s*<(script|style|form|section|main|nav|header|footer|template)\b|\bid=\"[^\"]+\""),
+    ".css": re.compile(r"^\s*[^{}/][^{}]*\{\s*$|^\s*@(media|keyframes|import)"),
+}
+_GENERIC_OUTLINE_PATTERN = re.compile(r"^\s*(def|class|function|public|private|protected|struct|interface)\b")
+
+
+def _python_outline(code):
+    tree = ast.parse(code)
+    lines = []
+
+    def visit(nodes, depth):
+        for node in nodes:
+            indent = "    " * depth
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+                signature = f"{indent}{prefix} {node.name}({ast.unparse(node.args)})"
+                if node.returns is not None:
+                    signature += f" -> {ast.unparse(node.returns)}"
+            elif isinstance(node, ast.ClassDef):
+                bases = ", ".join(ast.unparse(base) for base in node.bases)
+                signature = f"{indent}class {node.name}({bases})" if bases else f"{indent}class {node.name}"
+            else:
+                continue
+            docstring = ast.get_docstring(node)
+            if docstring:
+                signature += f"  # {docstring.strip().splitlines()[0]}"
+            lines.append(f"L{node.lineno}: {signature}")
+            if isinstance(node, ast.ClassDef):
+                visit(node.body, depth + 1)
+
+    module_names = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            module_names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.Assign) and all(isinstance(target, ast.Name) for target in node.targets):
+            lines.append(f"L{node.lineno}: {', '.join(target.id for target in node.targets)} = ...")
+    if module_names:
+        lines.insert(0, f"imports: {', '.join(module_names)}"[:300])
+    visit(tree.body, 0)
+    return lines
+
+
+def outline_code(selected_file, code):
+    """
+    Structural outline of a file: classes, functions and signatures with their line numbers.
+
+    Python is parsed with ast; the other supported extensions use per-line signature patterns.
+    """
+    suffix = os.path.splitext(selected_file)[1].lower()
+    if suffix == ".py":
+        try:
+            return _python_outline(code)
+        except (SyntaxError, ValueError):
+            pass
+    pattern = _OUTLINE_PATTERNS.get(suffix, _GENERIC_OUTLINE_PATTERN)
+    return [f"L{number}: {line.strip()[:160]}" for number, line in enumerate(code.splitlines(), 1)
+            if pattern.search(line)]
+
+
+# Rank line windows by how many query terms they contain
+def _relevant_regions(lines, query):
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    hits = [number for number, line in enumerate(lines) if terms.intersection(tokenize(line))]
+    regions = []
+    for number in hits:
+        start = max(0, number - REGION_CONTEXT_LINES)
+        end = min(len(lines), number + REGION_CONTEXT_LINES + 1)
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], end)
+            regions[-1][2] += 1
+        else:
+            regions.append([start, end, 1])
+    return sorted(regions, key=lambda region: region[2], reverse=True)
+
+
+# Texts of the regions, best first, within token_budget; a region that does not fit is shortened
+def _fit_regions(lines, regions, token_budget):
+    texts = []
+    used = 0
+    for start, end, _ in regions:
+        region = f"lines {start + 1}-{end}:\n" + "\n".join(lines[start:end])
+        tokens = count_tokens(region)
+        if used + tokens > token_budget:
+            remaining = token_budget - used
+            if remaining < 50:
+                break
+            # Shrink the region until it fits, assuming tokens spread roughly evenly over its lines
+            while tokens > remaining and end - start >= 3:
+                end = start + int((end - start) * remaining / tokens * 0.9)
+                region = f"lines {start + 1}-{end}:\n" + "\n".join(lines[start:end])
+                tokens = count_tokens(region)
+            if tokens > remaining:
+                continue
+        texts.append(region)
+        used += tokens
+    return texts
+
+
+def question_regions(code, query, token_budget):
+    """
+    Regions of a file that best match a question, within token_budget tokens.
+
+    Used for files that fit_code_to_budget summarized without a query, so a question can still
+    see the code it asks about.
+
+    Returns:
+        str: The regions, or "" when no line matches the question
+    """
+    lines = code.splitlines()
+    return "\n\n".join(_fit_regions(lines, _relevant_regions(lines, query), token_budget))
+
+
+def fit_code_to_budget(selected_file, code, token_budget, query=""):
+    """
+    Return the file content to embed in a prompt, within token_budget tokens.
+
+    Files that fit are returned unchanged. Larger files are replaced by a structural outline
+    followed by the regions that best match query (or the start of the file when there is no
+    query), added best first until the budget is used.
+
+    Returns:
+        tuple: (text, stats) where stats has code_tokens, prompt_code_tokens and summarized
+    """
+    code_tokens = count_tokens(code)
+    if code_tokens <= token_budget:
+        return code, {"code_tokens": code_tokens, "prompt_code_tokens": code_tokens, "summarized": False}
+
+    lines = code.splitlines()
+    header = (f"# NOTE: {selected_file} has {len(lines)} lines ({code_tokens} tokens), more than the "
+              f"{token_budget}-token budget. Showing its outline and the most relevant regions.")
+    parts = [header]
+    used = count_tokens(header)
+
+    outline_budget = token_budget // 2
+    outline = ["## Outline"]
+    outline_used = 0
+    truncated = False
+    for line in outline_code(selected_file, code):
+        tokens = count_tokens(line) + 1
+        if outline_used + tokens > outline_budget:
+            truncated = True
+            continue
+        outline.append(line)
+        outline_used += tokens
+    if truncated:
+        outline.append("... (outline truncated)")
+    parts.append("\n".join(outline))
+    used += outline_used
+
+    regions = _relevant_regions(lines, query) or [[0, min(len(lines), 200), 0]]
+    parts.append("## Relevant regions")
+    parts.extend(_fit_regions(lines, regions, token_budget - used))
+
+    text = "\n\n".join(parts)
+    return text, {"code_tokens": code_tokens, "prompt_code_tokens": count_tokens(text), "summarized": True}
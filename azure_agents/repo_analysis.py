@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from azure_agents.response_cache import content_hash
+from azure_agents.retry import is_throttled
+from utility.cache_dir import atomic_write_text, get_cache_dir
+from utility.file_content import UnreadableFile
+
+CHECKPOINT_FILE = "repo_analysis.jsonl"
+THROTTLE_REQUEUE_LIMIT = 5
+
+
+class TokenRateLimiter:
+    """
+    Token bucket matching a deployment's tokens-per-minute quota.
+
+    acquire(n) blocks until n tokens are available; the bucket refills continuously at
+    tokens_per_minute / 60 per second and never holds more than one minute of quota.
+    """
+
+    def __init__(self, tokens_per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = float(tokens_per_minute)
+        self.available = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens, cancel_event=None):
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = self._clock()
+                self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return True
+                wait = (tokens - self.available) / self.rate
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+            self._sleep(min(wait, 1.0))
+
+
+class RepoAnalysis:
+    """
+    Map-reduce analysis of a whole repository.
+
+    The map step runs RampUpAgent.analyze_code over every file on a bounded thread pool, gated by
+    a TokenRateLimiter; throttled files are re-queued. The reduce step merges file summaries
+    into one overview per directory, deepest first, and finally into a repository overview.
+    Every summary is appended to a JSONL checkpoint keyed on its input hash, so an interrupted
+    run resumes where it stopped; the checkpoint is compacted to the latest summary per file and
+    directory when it is loaded. Binary and unreadable files are skipped and listed in skipped.
+    """
+
+    def __init__(self, agent, folder_path, files, read_file, concurrency=4, tokens_per_minute=30000,
+                 checkpoint_path=None):
+        self.agent = agent
+        self.folder_path = folder_path
+        self.files = list(files)
+        self.read_file = read_file
+        self.concurrency = concurrency
+        self.limiter = TokenRateLimiter(tokens_per_minute)
+        self.checkpoint_path = checkpoint_path or os.path.join(get_cache_dir(folder_path), CHECKPOINT_FILE)
+        self.cancel_event = threading.Event()
+        self.file_summaries = {}
+        self.directory_summaries = {}
+        self.repository_summary = None
+        self.errors = {}
+        self.skipped = {}
+        self.completed = 0
+        self.total = len(self.files)
+        self.stage = "pending"
+        self._checkpoint = {}
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        """Run both phases and return the repository overview (None if cancelled)."""
+        self._load_checkpoint()
+        self.stage = "files"
+        self._map_files()
+        if self.cancel_event.is_set():
+            self.stage = "cancelled"
+            return None
+        self.stage = "directories"
+        self.repository_summary = self._reduce_directories()
+        self.stage = "cancelled" if self.cancel_event.is_set() else "done"
+        return self.repository_summary
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+        lines = 0
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by an interrupted run
+                if isinstance(record.get("summary"), str):
+                    self._checkpoint[(record["kind"], record["path"])] = (record["hash"], record["summary"])
+        if lines > len(self._checkpoint):
+            # Later runs appended newer summaries of the same inputs; keep only the latest of each
+            atomic_write_text(self.checkpoint_path, "".join(
+                self._checkpoint_line(kind, path, input_hash, summary) + "\n"
+                for (kind, path), (input_hash, summary) in self._checkpoint.items()))
+
+    @staticmethod
+    def _checkpoint_line(kind, path, input_hash, summary):
+        return json.dumps({"kind": kind, "path": path, "hash": input_hash, "summary": summary})
+
+    def _save(self, kind, path, input_hash, summary):
+        line = self._checkpoint_line(kind, path, input_hash, summary)
+        with self._lock:
+            self._checkpoint[(kind, path)] = (input_hash, summary)
+            with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def _from_checkpoint(self, kind, path, input_hash):
+        saved = self._checkpoint.get((kind, path))
+        return saved[1] if saved is not None and saved[0] == input_hash else None
+
+    def _analyze_file(self, relative_path):
+        try:
+            code = self.read_file(self.folder_path, relative_path)
+        except UnreadableFile as error:
+            self.skipped[relative_path] = str(error)
+            return relative_path, None
+        code_hash = content_hash(code)
+        summary = self._from_checkpoint("file", relative_path, code_hash)
+        if summary is None:
+            if not self.limiter.acquire(self.agent.estimate_request_tokens(code), self.cancel_event):
+                return relative_path, None
+            summary = self.agent.analyze_code(relative_path, code)
+            if not isinstance(summary, str):
+                raise ValueError(f"Unexpected reply for {relative_path}: {summary!r}")
+            self._save("file", relative_path, code_hash, summary)
+        return relative_path, summary
+
+    def _map_files(self):
+        pending = list(self.files)
+        attempts = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="analyze") as pool:
+            while pending and not self.cancel_event.is_set():
+                futures = {pool.submit(self._analyze_file, path): path for path in pending}
+                pending = []
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        _, summary = future.result()
+                    except Exception as error:
+                        attempts[path] = attempts.get(path, 0) + 1
+                        if is_throttled(error) and attempts[path] < THROTTLE_REQUEUE_LIMIT:
+                            pending.append(path)  # Still throttled after the agent's own retries
+                            continue
+                        self.errors[path] = str(error)
+                        summary = None
+                    if summary is not None:
+                        self.file_summaries[path] = summary
+                    with self._lock:
+                        self.completed += 1
+                if pending:
+                    time.sleep(5)
+
+    def _reduce_directories(self):
+        # Group files and subdirectories under their parent directory ("" is the root)
+        children = {"": []}
+        for path in sorted(self.file_summaries):
+            parent = os.path.dirname(path)
+            children.setdefault(parent, []).append(("file", path))
+            while parent:
+                grandparent = os.path.dirname(parent)
+                siblings = children.setdefault(grandparent, [])
+                if ("directory", parent) in siblings:
+                    break
+                siblings.append(("directory", parent))
+                children.setdefault(parent, [])
+                parent = grandparent
+
+        for directory in sorted(children, key=lambda path: path.count(os.sep) + bool(path), reverse=True):
+            if self.cancel_event.is_set():
+                return None
+            items = []
+            for kind, path in children[directory]:
+                summary = self.file_summaries.get(path) if kind == "file" else self.directory_summaries.get(path)
+                if summary:
+                    items.append((f"{kind} `{path}`", summary))
+            if not items:
+                continue
+            input_hash = content_hash("\x1f".join(f"{name}\x1e{summary}" for name, summary in items))
+            summary = self._from_checkpoint("directory", directory, input_hash)
+            if summary is None:
+                if not self.limiter.acquire(self.agent.estimate_request_tokens("".join(s for _, s in items)),
+                                            self.cancel_event):
+                    return None
+                summary = self.agent.summarize_components(directory or "(repository root)", items)
+                if not isinstance(summary, str):
+                    self.errors[directory or "(repository root)"] = f"Unexpected reply: {summary!r}"
+                    continue
+                self._save("directory", directory, input_hash, summary)
+            self.directory_summaries[directory] = summary
+        return self.directory_summaries.get("")
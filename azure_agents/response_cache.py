@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utility.cache_dir import get_cache_root
+
+DEFAULT_CACHE_FILE = "llm_responses.sqlite"
+
+
+# Hash file content so cache keys stay small and independent of the file's size
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for LLM responses.
+
+    Lookups go through an in-memory LRU first and then an on-disk SQLite table, so a response
+    survives Streamlit reruns, new sessions and process restarts. Entries expire after
+    ttl_seconds and the disk tier is trimmed to max_disk_entries, least recently used first.
+    """
+
+    def __init__(self, path=None, max_memory_entries=256, max_disk_entries=10000, ttl_seconds=7 * 24 * 3600):
+        self.path = path or os.path.join(get_cache_root(), DEFAULT_CACHE_FILE)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(method, deployment, system_message, template_version, file_content_hash, *extra):
+        """
+        Build the cache key for a request.
+
+        Args:
+            method (str): RampUpAgent method name
+            deployment (str): Azure OpenAI deployment the response came from
+            system_message (str): System prompt of the agent
+            template_version (int): Version of the prompt template, bumped whenever it changes
+            file_content_hash (str): content_hash() of the file the prompt is about
+            *extra (str): Any other prompt inputs, such as the file name or the user's question
+        """
+        parts = [method, deployment, system_message, str(template_version), file_content_hash, *extra]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key, count_miss=True):
+        """
+        Look a response up, or return None.
+
+        Args:
+            count_miss (bool): Count a miss in the stats; probes that send nothing on a miss pass False
+        """
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                value, created_at = item
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            row = self._connection.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._connection.commit()
+                if count_miss:
+                    self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._evict(now)
+            self._connection.commit()
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        self._connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
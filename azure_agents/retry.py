@@ -0,0 +1,57 @@
+import random
+import time
+
+
+# Seconds the service asked us to wait, if it said so
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+# openai.RateLimitError and any other APIStatusError with HTTP 429; checked by attribute so the
+# OpenAI SDK does not have to be imported
+def is_throttled(error):
+    return getattr(error, "status_code", None) == 429
+
+
+def call_with_backoff(func, max_retries=3, base_delay=1.0, max_delay=30.0, sleep=time.sleep):
+    """
+    Call func(), retrying on HTTP 429 with full-jitter exponential backoff.
+
+    The Retry-After header is honoured when present; otherwise attempt n waits a random time in
+    [0, min(max_delay, base_delay * 2**n)] so concurrent callers do not retry in lockstep.
+
+    Args:
+        func (callable): Zero-argument call to make
+        max_retries (int): Retries after the first attempt
+        base_delay (float): Backoff scale in seconds
+        max_delay (float): Upper bound for a single wait in seconds
+        sleep (callable): Sleep function, replaceable for tests and benchmarks
+
+    Returns:
+        Whatever func() returns
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as error:
+            if not is_throttled(error) or attempt >= max_retries:
+                raise
+            delay = _retry_after(error)
+            if delay is None:
+                delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            sleep(min(delay, max_delay))
+            attempt += 1
@@ -0,0 +1,83 @@
+import configparser
+import functools
+import os
+from pathlib import Path
+
+# Point at a different config file with this environment variable (defaults to config.ini in the project root)
+CONFIG_ENV_VAR = "AI_REPO_CONFIG"
+
+
+# Load configuration from config.ini
+def load_config():
+    config = configparser.ConfigParser()
+    # Get the path to config.ini (assuming it's in the project root)
+    config_path = Path(os.getenv(CONFIG_ENV_VAR) or Path(__file__).parent.parent / "config.ini")
+
+    if not config_path.exists():
+        raise FileNotFoundError(f"Configuration file not found: {config_path}")
+
+    config.read(config_path)
+    return config
+
+
+class Settings:
+    """Values from config.ini (and the environment overrides), read once on first use."""
+
+    def __init__(self, config):
+        # Get Azure OpenAI configuration from config.ini
+        # The endpoint can be overridden from the environment, e.g. to point at benchmarks/fake_openai_server.py
+        self.endpoint = os.getenv('AZURE_OPENAI_ENDPOINT') or config.get('azure_openai', 'endpoint')
+        self.deployment_name = config.get('azure_openai', 'deployment_name')
+        self.api_version = config.get('azure_openai', 'api_version')
+        # Try to get API key from environment variable first, then fall back to config file
+        self.api_key = os.getenv('AZURE_OPENAI_API_KEY') or config.get('azure_openai', 'api_key')
+
+        # Request settings from the [settings] section
+        self.timeout = config.getfloat('settings', 'timeout', fallback=30)
+        self.max_retries = config.getint('settings', 'max_retries', fallback=3)
+        self.http_max_connections = config.getint('settings', 'http_max_connections', fallback=20)
+        self.http_max_keepalive_connections = config.getint('settings', 'http_max_keepalive_connections', fallback=10)
+
+        # Tokens of related repository code retrieved into each prompt
+        self.context_token_budget = config.getint('settings', 'context_token_budget', fallback=1500)
+        # Tokens of the selected file's imports, their definitions and its importers in each prompt
+        self.graph_token_budget = config.getint('settings', 'graph_token_budget', fallback=600)
+        # Tokens of the selected file embedded in each prompt; larger files are outlined instead
+        self.prompt_token_budget = config.getint('settings', 'prompt_token_budget', fallback=12000)
+
+        # Chat memory: history tokens kept before older turns are folded into a summary, and the
+        # number of recent exchanges always kept verbatim
+        self.chat_history_token_budget = config.getint('settings', 'chat_history_token_budget', fallback=3000)
+        self.chat_keep_turns = config.getint('settings', 'chat_keep_turns', fallback=3)
+        # Ask streamed replies to report token usage (needs api_version 2024-09-01-preview or later)
+        self.stream_usage = config.getboolean('settings', 'stream_usage', fallback=False)
+
+        # Whole-repository analysis: parallel requests and the deployment's tokens-per-minute quota
+        self.analysis_concurrency = config.getint('settings', 'analysis_concurrency', fallback=4)
+        self.tokens_per_minute = config.getint('settings', 'tokens_per_minute', fallback=30000)
+
+        # Prices per 1,000 tokens, used for the cost counter of the diagnostics telemetry
+        self.cost_per_1k_input_tokens = config.getfloat('settings', 'cost_per_1k_input_tokens', fallback=0.0)
+        self.cost_per_1k_cached_input_tokens = config.getfloat(
+            'settings', 'cost_per_1k_cached_input_tokens', fallback=0.0)
+        self.cost_per_1k_output_tokens = config.getfloat('settings', 'cost_per_1k_output_tokens', fallback=0.0)
+
+        # LLM response cache
+        self.cache_memory_entries = config.getint('settings', 'cache_memory_entries', fallback=256)
+        self.cache_max_entries = config.getint('settings', 'cache_max_entries', fallback=10000)
+        self.cache_ttl_seconds = config.getint('settings', 'cache_ttl_seconds', fallback=7 * 24 * 3600)
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings():
+    return Settings(load_config())
+
+
+# Optional: Get Azure CLI credential as fallback, created only when first asked for
+# Use it instead of the API key with:
+# token = get_credential().get_token("https://cognitiveservices.azure.com/.default").token
+@functools.lru_cache(maxsize=None)
+def get_credential():
+    from azure.identity import AzureCliCredential
+
+    return AzureCliCredential()
@@ -0,0 +1,90 @@
+import time
+
+from azure_agents.retry import call_with_backoff
+
+
+class StreamStats:
+    """Latency figures for one streamed reply."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.time_to_first_token = None
+        self.total_seconds = None
+        # Providers send roughly one token per content chunk, so chunks are counted as tokens
+        self.tokens = 0
+        self.from_cache = False
+
+    @property
+    def tokens_per_second(self):
+        if not self.total_seconds or self.time_to_first_token is None:
+            return 0.0
+        generation_seconds = self.total_seconds - self.time_to_first_token
+        return self.tokens / generation_seconds if generation_seconds > 0 else float(self.tokens)
+
+    def as_dict(self):
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "total_seconds": self.total_seconds,
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens_per_second,
+            "from_cache": self.from_cache,
+        }
+
+
+class ReplyStream:
+    """
+    Iterable of text deltas for one assistant reply.
+
+    Iterating drives the underlying request; stats fills in as deltas arrive, and once the
+    stream is exhausted text holds the full reply and on_complete(text) has been called
+    (used to store the reply in the response cache). A stream abandoned half-way is not cached.
+    """
+
+    def __init__(self, deltas, on_complete=None):
+        self._deltas = deltas
+        self._on_complete = on_complete
+        self.stats = StreamStats()
+        self.text = None
+
+    @classmethod
+    def from_text(cls, text):
+        """Wrap an already available reply (e.g. a cache hit) as a single-delta stream."""
+        stream = cls(iter([text]))
+        stream.stats.from_cache = True
+        return stream
+
+    def __iter__(self):
+        # The request is only sent once iteration starts, so time from here
+        self.stats.started_at = time.perf_counter()
+        parts = []
+        for delta in self._deltas:
+            if not delta:
+                continue
+            if self.stats.time_to_first_token is None:
+                self.stats.time_to_first_token = time.perf_counter() - self.stats.started_at
+            self.stats.tokens += 1
+            parts.append(delta)
+            yield delta
+        self.stats.total_seconds = time.perf_counter() - self.stats.started_at
+        self.text = "".join(parts)
+        if self._on_complete:
+            self._on_complete(self.text)
+
+
+# Yield content deltas from an OpenAI-compatible streaming chat completion; opening the
+# stream is retried on 429, once tokens flow the stream is not restarted. With
+# stream_options={"include_usage": True} the final chunk's token usage is passed to on_usage
+def iter_completion_deltas(client, model, messages, max_retries=0, on_usage=None, **kwargs):
+    response = call_with_backoff(
+        lambda: client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs),
+        max_retries=max_retries,
+    )
+    try:
+        for chunk in response:
+            if on_usage and getattr(chunk, "usage", None):
+                on_usage(chunk.usage)
+            # Azure sends a leading chunk with no choices that only carries content filter results
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        response.close()
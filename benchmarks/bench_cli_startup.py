@@ -0,0 +1,61 @@
+"""
+Measure cold-start wall time of the headless CLI for commands that do not call the model.
+
+Usage:
+    python benchmarks/bench_cli_startup.py --runs 5 --limit 1.0
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def time_command(args, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=REPO_ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--limit", type=float, default=1.0, help="Fail if a median exceeds this many seconds")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cli_bench_")
+    try:
+        tree = os.path.join(workdir, "repo")
+        os.makedirs(os.path.join(tree, "pkg"))
+        for index in range(20):
+            with open(os.path.join(tree, "pkg", f"module{index}.py"), "w") as f:
+                f.write(f"def function_{index}():\n    return {index}\n")
+        env = dict(os.environ, AI_REPO_CACHE_DIR=os.path.join(workdir, "cache"))
+
+        commands = {
+            "python -c pass": ["-c", "pass"],
+            "cli --help": ["-m", "cli", "--help"],
+            "cli scan --no-index": ["-m", "cli", "scan", tree, "--no-index"],
+            "cli scan": ["-m", "cli", "scan", tree],
+            "cli scan --incremental": ["-m", "cli", "scan", tree, "--incremental"],
+        }
+        failed = False
+        for name, command in commands.items():
+            median = statistics.median(time_command(command, env) for _ in range(args.runs))
+            over = name != "python -c pass" and median > args.limit
+            failed = failed or over
+            print(f"{name:28s} {median * 1000:8.1f} ms{'  OVER LIMIT' if over else ''}")
+        sys.exit(1 if failed else 0)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
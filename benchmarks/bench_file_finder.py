@@ -0,0 +1,73 @@
+"""
+Measure FileFinder build time and query latency on synthetic paths.
+
+Usage:
+    python benchmarks/bench_file_finder.py --paths 500000 --limit-ms 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utility.file_finder import FileFinder  # noqa: E402
+
+WORDS = ["src", "lib", "core", "utils", "agents", "tests", "models", "views", "api", "server", "client",
+         "components", "common", "internal", "pkg", "handlers", "services", "data", "config", "ui"]
+EXTENSIONS = [".py", ".js", ".ts", ".java", ".cs", ".cpp", ".html", ".css"]
+QUERIES = ["agents_12", "agents", "a", "zqxj", "srvcs", "cmpnts99", "views7/api", "*.py", "test*_1?.ts",
+           "src*/**/*.java"]
+
+
+# A tree of about count / 15 directories, each holding files, like a typical large codebase
+def synthetic_paths(count, seed=0):
+    rng = random.Random(seed)
+    directories = [""]
+    while len(directories) < max(count // 15, 1):
+        parent = rng.choice(directories)
+        if parent.count(os.sep) < 8:
+            directories.append(os.path.join(parent, f"{rng.choice(WORDS)}{rng.randint(0, 30)}"))
+    paths = set()
+    while len(paths) < count:
+        name = f"{rng.choice(WORDS)}_{rng.randint(0, 9999)}{rng.choice(EXTENSIONS)}"
+        paths.add(os.path.join(rng.choice(directories), name))
+    return sorted(paths)  # Scans hand the finder sorted paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paths", type=int, default=500000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--limit-ms", type=float, default=20.0, help="Report queries whose median exceeds this")
+    args = parser.parse_args()
+
+    paths = synthetic_paths(args.paths)
+    start = time.perf_counter()
+    finder = FileFinder(paths)
+    print(f"build {len(paths)} paths      {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    start = time.perf_counter()
+    finder.children("")
+    print(f"tree root                {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    over = 0
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            page = finder.search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        median = statistics.median(timings)
+        slow = median > args.limit_ms
+        over += slow
+        total = f"{page.total}{'+' if page.capped else ''}"
+        print(f"{query!r:24s} {median:8.1f} ms  {total:>6s} matches{'  OVER LIMIT' if slow else ''}")
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
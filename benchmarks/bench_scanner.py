@@ -0,0 +1,72 @@
+"""
+Compare the legacy rglob-then-filter scan with the pruned, parallel scanner.
+
+Usage:
+    python benchmarks/bench_scanner.py --files 500000
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic_repo import build_repo  # noqa: E402
+from utility.scanner import DEFAULT_IGNORE_DIRS, iter_code_files  # noqa: E402
+
+EXTENSIONS = {'.py', '.js', '.ts', '.html', '.css', '.java', '.cpp', '.cs'}
+LEGACY_IGNORE_LIST = tuple(sorted(DEFAULT_IGNORE_DIRS))
+
+
+# The implementation scan_code_files used before the scanner engine
+def legacy_scan(folder_path):
+    files = []
+    for path in list(Path(folder_path).rglob("*")):
+        if not path.is_dir() and any(ignored in str(path) for ignored in LEGACY_IGNORE_LIST):
+            continue
+        if path.is_file() and path.suffix in EXTENSIONS:
+            path.stat()
+            files.append(str(path.relative_to(folder_path)))
+    return files
+
+
+def scanner_scan(folder_path):
+    return [entry.relative_path for entry in iter_code_files(folder_path, EXTENSIONS)]
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=500_000, help="Total files in the synthetic tree")
+    parser.add_argument("--root", help="Reuse an existing synthetic tree instead of building one")
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix="scan_bench_")
+    try:
+        if not args.root:
+            start = time.perf_counter()
+            build_repo(root, args.files, files_per_dir=50, ignored_share=0.4, lines=1)
+            print(f"Built {args.files} files in {time.perf_counter() - start:.1f}s under {root}")
+
+        legacy_time, legacy_files = time_call(legacy_scan, root)
+        scanner_time, scanner_files = time_call(scanner_scan, root)
+        if sorted(legacy_files) != sorted(scanner_files):
+            print("WARNING: legacy and scanner results differ", file=sys.stderr)
+
+        print(f"legacy  : {legacy_time:8.2f}s  {len(legacy_files)} files")
+        print(f"scanner : {scanner_time:8.2f}s  {len(scanner_files)} files")
+        print(f"speedup : {legacy_time / scanner_time:8.2f}x")
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
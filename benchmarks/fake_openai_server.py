@@ -0,0 +1,185 @@
+"""
+Local stand-in for an Azure OpenAI / OpenAI-compatible chat completions endpoint.
+
+Usage:
+    python benchmarks/fake_openai_server.py --port 8765 --first-token-delay 0.5 --token-delay 0.02 --throttle-rate 0.1
+
+Then point the analyzer at it:
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8765 AZURE_OPENAI_API_KEY=fake uv run streamlit run main.py
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = ("This file defines a small module. It reads its inputs, validates them and hands the "
+                 "result to the next component. ") * 8
+# Like the hosted service, prompt prefixes are cached from 1024 tokens on, in steps of 128
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_STEP_TOKENS = 128
+PREFIX_CACHE_ENTRIES = 64
+
+
+# Prompt tokens (about four characters each) and how many of them repeat the prefix of an earlier request
+def prompt_usage(server, messages):
+    prompt = "".join(f"{message.get('role')}\n{message.get('content')}\n" for message in messages)
+    with server.lock:
+        shared = max((len(os.path.commonprefix([prompt, seen])) for seen in server.prompts), default=0)
+        server.prompts.append(prompt)
+        del server.prompts[:-PREFIX_CACHE_ENTRIES]
+    cached = shared // 4
+    cached = cached - cached % PREFIX_CACHE_STEP_TOKENS if cached >= PREFIX_CACHE_MIN_TOKENS else 0
+    return len(prompt) // 4, cached
+
+
+def usage_payload(prompt_tokens, cached_tokens, completion_tokens):
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            throttle = server.rng.random() < server.throttle_rate
+            if throttle:
+                server.throttled_count += 1
+        if throttle:
+            # What Azure OpenAI returns when the deployment's quota is exhausted
+            self._send_json(429, {"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+                            headers={"retry-after-ms": str(server.retry_after_ms)})
+            return
+        model = body.get("model", "fake-deployment")
+        words = server.reply_text.split(" ")
+        prompt_tokens, cached_tokens = prompt_usage(server, body.get("messages") or [])
+        time.sleep(server.first_token_delay)
+
+        if not body.get("stream"):
+            time.sleep(server.token_delay * len(words))
+            self._send_json(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": server.reply_text}}],
+                "usage": usage_payload(prompt_tokens, cached_tokens, len(words)),
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for index, word in enumerate(words):
+            delta = word if index == 0 else " " + word
+            self._send_event({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": None, "delta": {"content": delta}}],
+            })
+            time.sleep(server.token_delay)
+        self._send_event({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}],
+        })
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._send_event({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": usage_payload(prompt_tokens, cached_tokens, len(words)),
+            })
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _send_event(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fake_server(port=0, first_token_delay=0.0, token_delay=0.0, reply_text=DEFAULT_REPLY,
+                      throttle_rate=0.0, retry_after_ms=100, seed=0):
+    """
+    Start the fake endpoint on a daemon thread.
+
+    Args:
+        throttle_rate (float): Fraction of requests answered with HTTP 429
+        retry_after_ms (int): Wait the 429 responses ask for, in milliseconds
+        seed (int): Seed of the throttling decisions, so runs are repeatable
+
+    Returns:
+        tuple: (server, base_url); call server.shutdown() to stop it
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.first_token_delay = first_token_delay
+    server.token_delay = token_delay
+    server.reply_text = reply_text
+    server.throttle_rate = throttle_rate
+    server.retry_after_ms = retry_after_ms
+    server.rng = random.Random(seed)
+    server.request_count = 0
+    server.throttled_count = 0
+    server.prompts = []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-delay", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after-ms", type=int, default=100, help="Wait requested by the 429 responses")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.port, args.first_token_delay, args.token_delay,
+                                         throttle_rate=args.throttle_rate, retry_after_ms=args.retry_after_ms)
+    print(f"Fake OpenAI endpoint listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Offline benchmark and load-test suite: scanning, indexing and agent requests against a local fake endpoint.
+
+Usage:
+    python benchmarks/run_suite.py --files 20000 --output benchmarks/results/latest.json
+    python benchmarks/run_suite.py --baseline benchmarks/results/baseline.json   # fail on regressions
+    python benchmarks/run_suite.py --only load --sessions 16 --throttle-rate 0.1
+
+Every run writes its metrics as JSON. With --baseline the metrics are compared with an earlier
+run and the suite exits with status 1 if any got worse by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_openai_server import start_fake_server  # noqa: E402
+from benchmarks.synthetic_repo import build_repo  # noqa: E402
+from utility.telemetry import Histogram  # noqa: E402
+
+SUITES = ("scan", "agent", "load")
+# Differences smaller than this are noise, whatever the relative change
+MIN_REGRESSION_MS = 5.0
+CHAT_QUESTIONS = ["What does this file do?", "Which function should I read first?",
+                  "How are errors handled?", "What would break if the first function changed?",
+                  "Summarize the public interface.", "Where does the input come from?"]
+
+
+class Results:
+    """
+    Named metrics of one run, each with its unit, whether higher values are better and whether it
+    is compared with baselines (counts that depend only on the setup are recorded for context).
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit="ms", higher_is_better=False, compared=True):
+        self.metrics[name] = {"value": round(value, 3), "unit": unit, "higher_is_better": higher_is_better,
+                              "compared": compared}
+        print(f"  {name:40s} {value:12.2f} {unit}")
+
+    def add_latencies(self, name, histogram):
+        stats = histogram.as_dict()
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            self.add(f"{name}.{key[:-3]}", stats[key])
+
+
+# Best of several runs of func(), in milliseconds, with the last result
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_scan(repo, args, results):
+    from utility.dependency_graph import DependencyGraph
+    from utility.file_finder import FileFinder
+    from utility.file_selection import SelectionPolicy
+    from utility.repo_scan import DEFAULT_EXTENSIONS, rescan_folder, scan_folder
+    from utility.retrieval_index import RetrievalIndex
+
+    print("scan")
+    # The app's default policy, so .gitignore, minified and oversized files are filtered as in the UI
+    policy = SelectionPolicy()
+    elapsed, scan = best_of(args.repeat, lambda: scan_folder(repo, DEFAULT_EXTENSIONS, policy=policy))
+    results.add("scan.full", elapsed)
+    results.add("scan.files", len(scan.files), unit="files", compared=False)
+    results.add("scan.skipped", sum(summary.files for summary in scan.skipped), unit="files", compared=False)
+    elapsed, _ = best_of(args.repeat, lambda: rescan_folder(repo, DEFAULT_EXTENSIONS, policy=policy))
+    results.add("scan.rescan_unchanged", elapsed)
+
+    elapsed, index = best_of(1, lambda: RetrievalIndex.build(scan.manifest))
+    index.close()
+    results.add("index.build", elapsed)
+    elapsed, index = best_of(args.repeat, lambda: RetrievalIndex.build(scan.manifest))
+    index.close()
+    results.add("index.rebuild_unchanged", elapsed)
+    elapsed, _ = best_of(1, lambda: DependencyGraph.build(scan.manifest))
+    results.add("graph.build", elapsed)
+    elapsed, _ = best_of(args.repeat, lambda: DependencyGraph.build(scan.manifest))
+    results.add("graph.rebuild_unchanged", elapsed)
+    elapsed, _ = best_of(args.repeat, lambda: FileFinder(scan.files))
+    results.add("finder.build", elapsed)
+
+    # Touch 1% of the files, as after a pull, and time the incremental path
+    changed = scan.files[::100]
+    future = time.time() + 10
+    for relative_path in changed:
+        path = os.path.join(repo, relative_path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n")
+        os.utime(path, (future, future))
+    elapsed, rescan = best_of(1, lambda: rescan_folder(repo, DEFAULT_EXTENSIONS, policy=policy))
+    results.add("scan.rescan_changed", elapsed)
+    elapsed, index = best_of(1, lambda: RetrievalIndex.build(rescan.manifest, rescan.delta))
+    index.close()
+    results.add("index.rebuild_changed", elapsed)
+    elapsed, _ = best_of(1, lambda: DependencyGraph.build(rescan.manifest, rescan.delta))
+    results.add("graph.rebuild_changed", elapsed)
+    return rescan
+
+
+# Point the settings at the fake endpoint through a throwaway config file
+def configure_fake_endpoint(workdir, base_url):
+    config_path = os.path.join(workdir, "config.ini")
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write("[azure_openai]\n"
+                f"endpoint = {base_url}\n"
+                "deployment_name = bench\n"
+                "api_version = 2024-10-21\n"
+                "api_key = fake\n"
+                "[settings]\n"
+                "max_retries = 10\n"
+                "stream_usage = true\n")
+    os.environ["AI_REPO_CONFIG"] = config_path
+    os.environ["AZURE_OPENAI_ENDPOINT"] = base_url
+    os.environ["AZURE_OPENAI_API_KEY"] = "fake"
+
+
+# Drain a ReplyStream and record its latencies
+def consume(stream, total, first_token):
+    for _ in stream:
+        pass
+    total.add((stream.stats.total_seconds or 0) * 1000)
+    first_token.add((stream.stats.time_to_first_token or 0) * 1000)
+
+
+def bench_agent(repo, scan, args, results, response_cache):
+    from azure_agents.agents import RampUpAgent
+    from utility.repo_scan import read_file_content
+    from utility.retrieval_index import RetrievalIndex
+
+    print("agent")
+    files = scan.files
+    agent = RampUpAgent(cache=response_cache)
+    agent.set_repository_index(RetrievalIndex.load(scan.manifest))
+    total, first_token = Histogram(), Histogram()
+    for relative_path in files[:args.requests]:
+        consume(agent.analyze_code(relative_path, read_file_content(repo, relative_path), stream=True),
+                total, first_token)
+    results.add_latencies("agent.analyze.total", total)
+    results.add_latencies("agent.analyze.first_token", first_token)
+
+    # A conversation about one file: later turns should be served largely from the prompt cache
+    relative_path = files[-1]
+    code = read_file_content(repo, relative_path)
+    total, first_token = Histogram(), Histogram()
+    input_tokens = cached_tokens = 0
+    for question in (CHAT_QUESTIONS * args.chat_turns)[:args.chat_turns]:
+        consume(agent.chat_with_context(question, relative_path, code, stream=True), total, first_token)
+        input_tokens += agent.last_usage.get("input_tokens") or 0
+        cached_tokens += agent.last_usage.get("cached_input_tokens") or 0
+    results.add_latencies("agent.chat.total", total)
+    results.add("agent.chat.cached_input_share", cached_tokens / input_tokens if input_tokens else 0.0,
+                unit="ratio", higher_is_better=True)
+
+    # The same requests again come from the response cache
+    elapsed, _ = best_of(1, lambda: [agent.analyze_code(path, read_file_content(repo, path))
+                                     for path in files[:args.requests]])
+    results.add("agent.analyze.cached", elapsed / max(min(args.requests, len(files)), 1))
+
+
+def bench_load(repo, scan, args, results, response_cache, server):
+    """
+    Simulate concurrent Streamlit sessions: each has its own RampUpAgent and BackgroundTaskRunner,
+    like st.session_state, and shares the process-wide response cache and connection pool.
+    Every session analyzes its own files in the background and chats about one of them.
+    """
+    from azure_agents.agents import RampUpAgent
+    from utility.background_tasks import BackgroundTaskRunner
+    from utility.repo_scan import read_file_content
+    from utility.retrieval_index import RetrievalIndex
+
+    print(f"load ({args.sessions} sessions)")
+    files = scan.files
+    total, first_token = Histogram(), Histogram()
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(args.sessions)
+    throttled_before = server.throttled_count
+
+    def session(number):
+        agent = RampUpAgent(cache=response_cache)
+        agent.set_repository_index(RetrievalIndex.load(scan.manifest))
+        runner = BackgroundTaskRunner()
+        own_files = files[number::args.sessions][:args.requests]
+        start_barrier.wait()
+        for relative_path in own_files:
+            content = read_file_content(repo, relative_path)
+            try:
+                task = runner.submit_stream(("analysis", relative_path), relative_path, agent.analyze_code,
+                                            relative_path, content, stream=True)
+                task.result()
+                stream = agent.chat_with_context(CHAT_QUESTIONS[number % len(CHAT_QUESTIONS)], relative_path,
+                                                 content, stream=True)
+                for _ in stream:
+                    pass
+            except Exception as error:
+                with lock:
+                    errors.append(repr(error))
+                continue
+            with lock:
+                for stats in (task.stream.stats, stream.stats):
+                    total.add((stats.total_seconds or 0) * 1000)
+                    first_token.add((stats.time_to_first_token or 0) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        list(pool.map(session, range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    results.add_latencies("load.total", total)
+    results.add_latencies("load.first_token", first_token)
+    results.add("load.requests_per_second", total.count / elapsed if elapsed else 0.0, unit="req/s",
+                higher_is_better=True)
+    results.add("load.errors", len(errors), unit="errors")
+    results.add("load.throttled", server.throttled_count - throttled_before, unit="responses", compared=False)
+    for error in errors[:5]:
+        print(f"    error: {error}", file=sys.stderr)
+
+
+def compare(current, baseline, tolerance):
+    """
+    Metrics that got worse than the baseline by more than tolerance (a fraction).
+
+    Returns:
+        list: (name, baseline value, current value, relative change) of each regression
+    """
+    regressions = []
+    for name, metric in sorted(current.items()):
+        old = baseline.get(name)
+        if old is None or not metric["compared"]:
+            continue
+        before, after = old["value"], metric["value"]
+        worse = before - after if metric["higher_is_better"] else after - before
+        change = worse / before if before else (1.0 if worse > 0 else 0.0)
+        if change > tolerance and (metric["unit"] != "ms" or worse >= MIN_REGRESSION_MS):
+            regressions.append((name, before, after, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", default=",".join(SUITES), help=f"Comma-separated suites: {', '.join(SUITES)}")
+    parser.add_argument("--files", type=int, default=20000, help="Files in the synthetic repository")
+    parser.add_argument("--depth", type=int, default=4, help="Directory nesting of the synthetic repository")
+    parser.add_argument("--lines", type=int, default=40, help="Lines per synthetic source file")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scan timing; the best is kept")
+    parser.add_argument("--requests", type=int, default=10, help="Files analyzed by the agent and by each session")
+    parser.add_argument("--chat-turns", type=int, default=6)
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions in the load test")
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--throttle-rate", type=float, default=0.05, help="Fraction of requests answered with 429")
+    parser.add_argument("--output", help="Write the metrics to this JSON file")
+    parser.add_argument("--baseline", help="Compare with the metrics of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative slowdown before failing")
+    args = parser.parse_args()
+    suites = {suite.strip() for suite in args.only.split(",") if suite.strip()}
+
+    workdir = tempfile.mkdtemp(prefix="ai_repo_bench_")
+    # Keep the user's caches out of it: every run starts cold
+    os.environ["AI_REPO_CACHE_DIR"] = os.path.join(workdir, "cache")
+    results = Results()
+    server = None
+    try:
+        repo = os.path.join(workdir, "repo")
+        start = time.perf_counter()
+        build_repo(repo, args.files, depth=args.depth, lines=args.lines)
+        print(f"Built a {args.files} file repository in {time.perf_counter() - start:.1f}s")
+
+        if "scan" in suites:
+            scan = bench_scan(repo, args, results)
+        else:
+            from utility.file_selection import SelectionPolicy
+            from utility.repo_scan import DEFAULT_EXTENSIONS, scan_folder
+            from utility.retrieval_index import RetrievalIndex
+
+            scan = scan_folder(repo, DEFAULT_EXTENSIONS, policy=SelectionPolicy())
+            RetrievalIndex.build(scan.manifest).close()
+
+        if suites & {"agent", "load"}:
+            from azure_agents.response_cache import ResponseCache
+
+            server, base_url = start_fake_server(first_token_delay=args.first_token_delay,
+                                                 token_delay=args.token_delay, throttle_rate=args.throttle_rate,
+                                                 retry_after_ms=50)
+            configure_fake_endpoint(workdir, base_url)
+            response_cache = ResponseCache(path=os.path.join(workdir, "responses.sqlite"))
+            if "agent" in suites:
+                bench_agent(repo, scan, args, results, response_cache)
+            if "load" in suites:
+                bench_load(repo, scan, args, results, response_cache, server)
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    run = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+           "platform": platform.platform(), "cpus": os.cpu_count(), "args": vars(args), "metrics": results.metrics}
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        ignored = {"output", "baseline", "tolerance"}
+        differing = sorted(key for key, value in baseline.get("args", {}).items()
+                           if key not in ignored and vars(args).get(key) != value)
+        if differing:
+            print(f"WARNING: baseline was run with different {', '.join(differing)}", file=sys.stderr)
+        regressions = compare(results.metrics, baseline["metrics"], args.tolerance)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: {before:.2f} -> {after:.2f} ({change:+.0%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Generate synthetic repositories for the benchmarks.
+
+Usage:
+    python benchmarks/synthetic_repo.py /tmp/repo --files 20000 --depth 4
+"""
+import argparse
+import os
+import random
+
+SOURCE_SUFFIXES = [".py", ".js", ".ts", ".java", ".cs", ".cpp"]
+OTHER_SUFFIXES = [".md", ".json"]
+# Written to the repository root: a build tree and snapshot files the scanner must skip as gitignored
+GITIGNORE = "/build/\n*_snapshot.*\n"
+# Size of a minified bundle, large enough for the selection policy to sniff its first bytes
+MINIFIED_BYTES = 20 * 1024
+# Size of an oversized source file, just above the default size limit
+OVERSIZED_BYTES = (1 << 20) + 4096
+WORDS = ["user", "order", "invoice", "client", "session", "config", "cache", "report", "payment", "token",
+         "parser", "handler", "service", "model", "view", "store", "queue", "event", "account", "index"]
+
+
+# Source text in the style of the file's language, so retrieval and token counts see real identifiers
+def source_text(suffix, rng, lines):
+    name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}"
+    body = []
+    if suffix == ".py":
+        body.append(f"import {rng.choice(WORDS)}\n\n")
+        while len(body) < lines:
+            function = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}"
+            body.append(f"def {function}({name}, {rng.choice(WORDS)}=None):\n")
+            body.append(f"    result = {name}.get('{rng.choice(WORDS)}')\n")
+            body.append(f"    return result or {rng.randint(0, 999)}\n\n")
+    else:
+        keyword = "function" if suffix in (".js", ".ts") else "public static int"
+        while len(body) < lines:
+            function = f"{rng.choice(WORDS)}{rng.choice(WORDS).title()}"
+            body.append(f"{keyword} {function}({name}) {{\n")
+            body.append(f"    const value = {name}.{rng.choice(WORDS)};\n")
+            body.append(f"    return value + {rng.randint(0, 999)};\n}}\n\n")
+    return "".join(body[:lines])
+
+
+# A bundle on one long line, as minifiers write them
+def minified_text(rng):
+    statements = []
+    size = 0
+    while size < MINIFIED_BYTES:
+        statement = f"var {rng.choice(WORDS)}{len(statements)}=function(e){{return e.{rng.choice(WORDS)}||{size}}};"
+        statements.append(statement)
+        size += len(statement)
+    return "".join(statements) + "\n"
+
+
+def build_repo(root, files, depth=4, files_per_dir=40, ignored_share=0.3, other_share=0.1, lines=40, seed=0,
+               gitignored_share=0.05, minified_share=0.02, oversized=3):
+    """
+    Write a synthetic repository: source files spread over nested packages, some non-code
+    files, a node_modules tree the scanner must prune, and files the default selection policy
+    must leave out: a gitignored build tree and snapshot files, minified JS/TS bundles and a few
+    source files above the size limit.
+
+    Args:
+        root (str): Folder to create the repository in
+        files (int): Total number of files
+        depth (int): Directory nesting below the top-level packages
+        files_per_dir (int): Files per leaf directory
+        ignored_share (float): Fraction of files placed under node_modules
+        other_share (float): Fraction of the remaining files with non-code suffixes
+        lines (int): Lines per source file
+        seed (int): Random seed, so the same arguments build the same repository
+        gitignored_share (float): Fraction of files matched by the repository's .gitignore
+        minified_share (float): Fraction of the JS/TS source files written as minified bundles
+        oversized (int): Source files above the default size limit, on top of files
+
+    Returns:
+        list: Relative paths of the source files the scanner should find
+    """
+    rng = random.Random(seed)
+    ignored = int(files * ignored_share)
+    gitignored = int(files * gitignored_share)
+    sources = []
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write(GITIGNORE)
+    # Half of the gitignored files are build output, the other half snapshot files among the sources
+    build = gitignored // 2
+    snapshots = set(random.Random(seed + 1).sample(range(files - ignored - build), gitignored - build))
+    for base, count in (("src", files - ignored - build), (os.path.join("node_modules", "vendor"), ignored),
+                        ("build", build)):
+        for index in range(count):
+            directory_index = index // files_per_dir
+            parts = [base]
+            # Eight subdirectories per level, three bits of the directory number each
+            for level in range(depth):
+                branch = directory_index >> (3 * level)
+                parts.append(f"{WORDS[branch % len(WORDS)]}{branch % 8}")
+            directory = os.path.join(*parts)
+            if index % files_per_dir == 0:
+                os.makedirs(os.path.join(root, directory), exist_ok=True)
+            if base == "src" and rng.random() >= other_share:
+                suffix = rng.choice(SOURCE_SUFFIXES)
+            else:
+                suffix = rng.choice(OTHER_SUFFIXES + SOURCE_SUFFIXES)
+            skipped = base == "src" and index in snapshots
+            name = f"{rng.choice(WORDS)}_{index}{'_snapshot' if skipped else ''}{suffix}"
+            relative_path = os.path.join(directory, name)
+            if base == "src" and suffix in (".js", ".ts") and rng.random() < minified_share:
+                text = minified_text(rng)
+                skipped = True
+            else:
+                text = source_text(suffix, rng, lines) if suffix in SOURCE_SUFFIXES else "{}\n"
+            with open(os.path.join(root, relative_path), "w", encoding="utf-8") as f:
+                f.write(text)
+            if base == "src" and suffix in SOURCE_SUFFIXES and not skipped:
+                sources.append(relative_path)
+
+    for index in range(oversized):
+        with open(os.path.join(root, "src", f"oversized_{index}.py"), "w", encoding="utf-8") as f:
+            text = source_text(".py", rng, lines)
+            f.write(text * (OVERSIZED_BYTES // len(text) + 1))
+    return sorted(sources)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root")
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--files-per-dir", type=int, default=40)
+    parser.add_argument("--lines", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sources = build_repo(args.root, args.files, args.depth, args.files_per_dir, lines=args.lines, seed=args.seed)
+    print(f"Wrote {args.files} files ({len(sources)} source files kept by the default selection policy) "
+          f"under {args.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Headless entry point for scanning and analyzing a codebase without Streamlit.
+
+Usage:
+    python -m cli scan PATH [--ext ".py,.js"] [--exclude "tests/,*.g.cs"] [--incremental] [--no-index]
+    python -m cli analyze PATH [FILE ...]
+    python -m cli summarize PATH
+    python -m cli ask PATH FILE "question"
+    python -m cli find PATH QUERY [--limit 50]
+    python -m cli deps PATH FILE
+    python -m cli --telemetry DIR COMMAND ...
+
+The scan options --ext, --include, --exclude, --max-file-kb, --no-ignore-files, --no-heuristics
+and --telemetry are accepted by every command, before or after its name.
+
+Every result is written to stdout as one JSON object per line; progress goes to stderr.
+Configuration and Azure credentials are only loaded by the commands that call the model.
+"""
+import argparse
+import json
+import sys
+import time
+
+_STARTED = time.perf_counter()
+
+
+def emit(record):
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+# Selection policy from the global --include/--exclude/--max-file-kb/--no-* options
+def _policy(args):
+    from utility.file_selection import SelectionPolicy, parse_globs
+
+    return SelectionPolicy(parse_globs(args.include), parse_globs(args.exclude), args.max_file_kb * 1024,
+                           not args.no_ignore_files, not args.no_heuristics)
+
+
+# Saved manifest of the folder for the selected extensions and selection options
+def _manifest(args):
+    from utility.manifest import Manifest
+    from utility.repo_scan import parse_extensions
+    from utility.scanner import DEFAULT_IGNORE_DIRS
+
+    return Manifest.load(args.path, parse_extensions(args.ext), DEFAULT_IGNORE_DIRS, _policy(args))
+
+
+# Files from the saved manifest, scanning the folder first if it has never been scanned
+def _scanned_files(args):
+    from utility.repo_scan import parse_extensions, scan_folder
+
+    manifest = _manifest(args)
+    if manifest.loaded:
+        return manifest.paths()
+    log(f"No previous scan of {args.path}, scanning it first")
+    return scan_folder(args.path, parse_extensions(args.ext), policy=_policy(args)).files
+
+
+# Agent grounded in the retrieval index and dependency graph of the last scan, when they are current
+def _agent(args):
+    from azure_agents.agents import RampUpAgent
+    from utility.dependency_graph import DependencyGraph
+    from utility.retrieval_index import RetrievalIndex
+
+    manifest = _manifest(args)
+    agent = RampUpAgent()
+    agent.set_repository_index(RetrievalIndex.load(manifest))
+    agent.set_dependency_graph(DependencyGraph.load(manifest))
+    return agent
+
+
+def command_scan(args):
+    from utility.dependency_graph import DependencyGraph
+    from utility.repo_scan import parse_extensions, rescan_folder, scan_folder
+    from utility.retrieval_index import RetrievalIndex
+
+    extensions = parse_extensions(args.ext)
+    policy = _policy(args)
+    if args.incremental:
+        result = rescan_folder(args.path, extensions, policy=policy)
+        for event, items in (("added", result.delta.added), ("modified", result.delta.modified)):
+            for entry in items:
+                emit({"event": event, "path": entry.relative_path, "size": entry.size, "mtime": entry.mtime})
+        for relative_path in result.delta.deleted:
+            emit({"event": "deleted", "path": relative_path})
+    else:
+        result = scan_folder(args.path, extensions, policy=policy, on_entry=lambda entry: emit(
+            {"event": "file", "path": entry.relative_path, "size": entry.size, "mtime": entry.mtime}))
+    for summary in result.skipped:
+        emit({"event": "skipped", "reason": summary.reason, "files": summary.files, "dirs": summary.dirs,
+              "examples": summary.examples})
+
+    if not args.no_index:
+        RetrievalIndex.build(result.manifest, result.delta).close()
+        DependencyGraph.build(result.manifest, result.delta)
+    emit({"event": "scan", "path": args.path, "files": len(result.files), "indexed": not args.no_index})
+
+
+def command_analyze(args):
+    from utility.file_content import UnreadableFile
+    from utility.repo_scan import read_file_content
+
+    files = args.files or _scanned_files(args)
+    agent = _agent(args)
+    for relative_path in files:
+        try:
+            code = read_file_content(args.path, relative_path)
+        except UnreadableFile as error:
+            emit({"event": "skipped", "file": relative_path, "reason": str(error)})
+            continue
+        analysis = agent.analyze_code(relative_path, code)
+        emit({"event": "analysis", "file": relative_path, "analysis": analysis, "usage": agent.last_usage})
+
+
+def command_summarize(args):
+    from azure_agents.repo_analysis import RepoAnalysis
+    from azure_agents.settings import get_settings
+    from utility.repo_scan import read_file_content
+
+    settings = get_settings()
+    analysis = RepoAnalysis(_agent(args), args.path, _scanned_files(args), read_file_content,
+                            concurrency=settings.analysis_concurrency,
+                            tokens_per_minute=settings.tokens_per_minute)
+    analysis.run()
+    for relative_path, summary in sorted(analysis.file_summaries.items()):
+        emit({"event": "file_summary", "file": relative_path, "summary": summary})
+    for directory, summary in sorted(analysis.directory_summaries.items()):
+        emit({"event": "directory_summary", "directory": directory, "summary": summary})
+    for relative_path, reason in sorted(analysis.skipped.items()):
+        emit({"event": "skipped", "file": relative_path, "reason": reason})
+    for relative_path, error in sorted(analysis.errors.items()):
+        emit({"event": "error", "file": relative_path, "error": error})
+    emit({"event": "repository_summary", "summary": analysis.repository_summary})
+
+
+def command_ask(args):
+    from utility.file_content import UnreadableFile
+    from utility.repo_scan import read_file_content
+
+    try:
+        code = read_file_content(args.path, args.file)
+    except UnreadableFile as error:
+        emit({"event": "skipped", "file": args.file, "reason": str(error)})
+        return
+    agent = _agent(args)
+    answer = agent.chat_with_context(args.question, args.file, code)
+    emit({"event": "answer", "file": args.file, "question": args.question, "answer": answer,
+          "usage": agent.last_usage})
+
+
+def command_find(args):
+    from utility.file_finder import FileFinder
+
+    page = FileFinder(_scanned_files(args)).search(args.query, limit=args.limit)
+    for relative_path in page.paths:
+        emit({"event": "match", "path": relative_path})
+    emit({"event": "find", "query": args.query, "matches": page.total, "capped": page.capped})
+
+
+def command_deps(args):
+    from utility.dependency_graph import DependencyGraph
+
+    graph = DependencyGraph.load(_manifest(args))
+    if graph is None:
+        from utility.repo_scan import parse_extensions, rescan_folder
+
+        log(f"No current dependency graph for {args.path}, building it first")
+        result = rescan_folder(args.path, parse_extensions(args.ext), policy=_policy(args))
+        graph = DependencyGraph.build(result.manifest, result.delta)
+    for relative_path in graph.imports_of(args.file):
+        emit({"event": "imports", "path": relative_path})
+    for relative_path in graph.importers_of(args.file):
+        emit({"event": "imported_by", "path": relative_path})
+    for name, kind, line, signature in graph.definitions(args.file):
+        emit({"event": "definition", "name": name, "kind": kind, "line": line, "signature": signature})
+
+
+# Scan options shared by every command; the commands' copies suppress their defaults so an option
+# given before the command is not reset when the command is parsed
+def _scan_options(suppress_defaults):
+    def default(value):
+        return argparse.SUPPRESS if suppress_defaults else value
+
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--ext", default=default(""),
+                         help="Comma-separated file extensions (defaults to the UI defaults)")
+    options.add_argument("--include", default=default(""),
+                         help="Comma-separated globs; only matching files are scanned")
+    options.add_argument("--exclude", default=default(""), help="Comma-separated globs of files and folders to skip")
+    options.add_argument("--max-file-kb", type=int, default=default(1024), help="Skip files larger than this")
+    options.add_argument("--no-ignore-files", action="store_true", default=default(False),
+                         help="Do not honour .gitignore and .ignore files")
+    options.add_argument("--no-heuristics", action="store_true", default=default(False),
+                         help="Keep minified, generated, lock and binary files")
+    options.add_argument("--telemetry", metavar="DIR", default=default(None),
+                         help="Record timings and token counters and write them to DIR as JSONL and Prometheus text")
+    return options
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description=__doc__.strip().splitlines()[0],
+                                     parents=[_scan_options(False)])
+    commands = parser.add_subparsers(dest="command", required=True)
+    # Accepted before or after the command
+    options = _scan_options(True)
+
+    scan = commands.add_parser("scan", parents=[options], help="Scan a folder and build its search index")
+    scan.add_argument("path")
+    scan.add_argument("--incremental", action="store_true", help="Only report what changed since the last scan")
+    scan.add_argument("--no-index", action="store_true", help="Skip building the retrieval index")
+    scan.set_defaults(handler=command_scan)
+
+    analyze = commands.add_parser("analyze", parents=[options], help="Analyze files (all scanned files by default)")
+    analyze.add_argument("path")
+    analyze.add_argument("files", nargs="*")
+    analyze.set_defaults(handler=command_analyze)
+
+    summarize = commands.add_parser("summarize", parents=[options], help="Map-reduce overview of the whole repository")
+    summarize.add_argument("path")
+    summarize.set_defaults(handler=command_summarize)
+
+    ask = commands.add_parser("ask", parents=[options], help="Ask a question about one file")
+    ask.add_argument("path")
+    ask.add_argument("file")
+    ask.add_argument("question")
+    ask.set_defaults(handler=command_ask)
+
+    find = commands.add_parser("find", parents=[options],
+                               help="Fuzzy, path fragment or glob search over the scanned files")
+    find.add_argument("path")
+    find.add_argument("query")
+    find.add_argument("--limit", type=int, default=50)
+    find.set_defaults(handler=command_find)
+
+    deps = commands.add_parser("deps", parents=[options],
+                               help="Files a file imports, files importing it, and its definitions")
+    deps.add_argument("path")
+    deps.add_argument("file")
+    deps.set_defaults(handler=command_deps)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    telemetry = None
+    if args.telemetry:
+        from utility.telemetry import get_telemetry
+
+        telemetry = get_telemetry()
+        telemetry.enabled = True
+    try:
+        args.handler(args)
+    finally:
+        if telemetry is not None:
+            log(f"Telemetry written to {telemetry.export(args.telemetry)}")
+    emit({"event": "done", "command": args.command,
+          "elapsed_ms": round((time.perf_counter() - _STARTED) * 1000, 1)})
+
+
+if __name__ == "__main__":
+    main()
@@ -3,54 +3,391 @@ import os
 from json import dumps
 from pathlib import Path
 import time
-from utility.create_json import get_file_details, create_repo_json
+import uuid
+from utility.repo_scan import DEFAULT_EXTENSIONS, DEFAULT_IGNORE_DIRS, parse_extensions, read_file_content
+from utility.retrieval_index import RetrievalIndex
+from utility.dependency_graph import DependencyGraph
+from utility.manifest import Manifest
+from utility.file_finder import PAGE_SIZE
+from utility.file_selection import DEFAULT_MAX_FILE_BYTES, SKIP_REASONS, SelectionPolicy, parse_globs
+from utility.scan_jobs import get_scan_job_manager
+from utility.scan_registry import get_scan_registry
+from utility.file_content import PAGE_BYTES, UnreadableFile, get_content_reader
+from utility.background_tasks import BackgroundTaskRunner
+from utility.telemetry import get_telemetry
 from azure_agents.agents import RampUpAgent
+from azure_agents.response_cache import content_hash
+from azure_agents.settings import get_settings
+from azure_agents.repo_analysis import RepoAnalysis
 
-# Supported code file extensions
-ignore_list = ('venv', '__pycache__', '.git', '.idea', '.vscode', 'node_modules', '.venv', 'env', '.env', '.azure')
-
-# Function to recursively scan and show progress
-def scan_code_files(folder_path):
-    all_paths = list(Path(folder_path).rglob("*"))
-    files = []
-    progress = st.progress(0)
-    count = 0
-    file_details = []
-    for i, path in enumerate(all_paths):
-        if not path.is_dir() and any(ignored in str(path) for ignored in ignore_list):
-            continue
-        if path.is_file() and path.suffix in CODE_EXTENSIONS:
-            relative_path = path.relative_to(folder_path)
-            files.append(str(relative_path))
-            file_details.append(
-                get_file_details(folder_path, relative_path))  # Create JSON summary for each file
-        count += 1
-        progress.progress(min(int((count / len(all_paths)) * 100), 100))
-
-    json_file = create_repo_json(file_details, output_file="repo_summary.json")
-    agents = RampUpAgent()  # Initialize the agent
-    agents.train_on_repo_summary(json_file)  # Train the agent with repo summary
-    st.write(f"Training completed on {len(file_details)} files. Agent is ready to assist.")
-    progress.progress(min(int((len(all_paths) / len(all_paths)) * 100), 100))
-
-    return sorted(files)
-
-# Function to read file content
-def read_file_content(folder_path, relative_path):
-    file_path = os.path.join(folder_path, relative_path)
+# Initialize the agent only once per session and cache it; it only holds this user's chats,
+# the repository index and dependency graph come from the shared scan
+def get_agent():
+    if "agent" not in st.session_state:
+        st.session_state.agent = RampUpAgent()
+        shared = st.session_state.get("shared_scan")
+        if shared is not None:
+            st.session_state.agent.set_repository_index(shared.index)
+            st.session_state.agent.set_dependency_graph(shared.graph)
+        elif st.session_state.get("scanned_folder"):
+            # Reuse the retrieval index and graph left on disk by an earlier scan of this folder with
+            # the same settings, as long as they were built from its latest manifest
+            manifest = Manifest.load(st.session_state.scanned_folder, st.session_state.current_extensions,
+                                     DEFAULT_IGNORE_DIRS, st.session_state.current_policy)
+            st.session_state.agent.set_repository_index(RetrievalIndex.load(manifest))
+            st.session_state.agent.set_dependency_graph(DependencyGraph.load(manifest))
+    return st.session_state.agent
+
+# Point this session at a shared scan
+def use_shared_scan(shared):
+    st.session_state.shared_scan = shared
+    get_agent().set_repository_index(shared.index)
+    get_agent().set_dependency_graph(shared.graph)
+    return shared.files
+
+# Files the selected file imports and the files importing it, from the shared dependency graph
+def render_dependencies(relative_path):
+    shared = st.session_state.get("shared_scan")
+    if shared is None or shared.graph is None:
+        return
+    imports = shared.graph.imports_of(relative_path)
+    importers = shared.graph.importers_of(relative_path)
+    with st.expander(f"🔗 Imports {len(imports)} files, imported by {len(importers)}"):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Imports**")
+            st.markdown("\n".join(f"- `{path}`" for path in imports) or "No files of this repository.")
+        with col2:
+            st.write("**Imported by**")
+            st.markdown("\n".join(f"- `{path}`" for path in importers[:PAGE_SIZE]) or "No files of this repository.")
+            if len(importers) > PAGE_SIZE:
+                st.caption(f"and {len(importers) - PAGE_SIZE} more")
+        definitions = shared.graph.definitions(relative_path)
+        if definitions:
+            st.write("**Definitions**")
+            st.code("\n".join(f"{line:>5}  {signature}" for _, _, line, signature in definitions), language=None)
+
+# Start a scan of the folder in the background, or join the one already running for it
+# (in this session or another); a scan this session started earlier for other settings is
+# dropped, and stops unless another session is waiting for it
+def start_scan_job(folder_path, rescan):
+    manager = get_scan_job_manager()
+    session_id = st.session_state.session_id
+    job = manager.submit(folder_path, CODE_EXTENSIONS, DEFAULT_IGNORE_DIRS, rescan=rescan, owner=session_id,
+                         policy=SELECTION_POLICY)
+    previous = st.session_state.get("scan_job")
+    if previous and previous != job.id:
+        manager.release(previous, session_id)
+    if (st.session_state.scanned_folder != folder_path or st.session_state.current_extensions != CODE_EXTENSIONS
+            or st.session_state.current_policy != SELECTION_POLICY):
+        st.session_state.shared_scan = None
+        st.session_state.code_files = []
+    st.session_state.scan_job = job.id
+    st.session_state.scanned_folder = folder_path
+    st.session_state.current_extensions = CODE_EXTENSIONS.copy()
+    st.session_state.current_policy = SELECTION_POLICY
+
+# The scan job this session is waiting for, or None
+def current_scan_job():
+    job_id = st.session_state.get("scan_job")
+    return get_scan_job_manager().get(job_id) if job_id else None
+
+# Poll the running scan without rerunning the whole page; rerun the app once it finishes
+@st.fragment(run_every=0.5)
+def poll_scan_job(job_id):
+    job = get_scan_job_manager().get(job_id)
+    if job is None or not job.running:
+        st.rerun()
+    action = "Rescanning" if job.rescan else "Scanning"
+    found = f", {len(job.partial_files)} files found so far" if not job.rescan else ""
+    st.progress(job.percent, text=f"🔍 {action} `{job.folder_path}`: {job.progress[0]} of {job.progress[1]} "
+                                  f"folders{found}. Keep browsing, the results will appear here.")
+    if job.cancel_event.is_set():
+        st.caption("Cancelling…")
+    elif st.button("⏹️ Cancel scan", key=f"cancel_scan_{job_id}"):
+        get_scan_job_manager().cancel(job_id)
+
+# Take over the results of a finished scan job
+def finish_scan_job(job):
+    del st.session_state.scan_job
+    if job.state == "cancelled":
+        st.info("⏹️ Scan cancelled.")
+        return
+    if job.state == "failed":
+        st.error(f"❌ Scan failed: {job.error}")
+        return
+    result = job.result
+    st.session_state.code_files = use_shared_scan(result.scan)
+    if result.delta is not None:
+        delta = result.delta
+        st.write(f"Rescan found {len(delta.added)} added, {len(delta.modified)} modified "
+                 f"and {len(delta.deleted)} deleted files.")
+    elif result.reused:
+        st.write("Reusing the shared scan of this folder made in another session.")
+    st.success(f"✅ Successfully scanned {len(st.session_state.code_files)} code files. Agent is ready to assist.")
+
+# Browse the files a running scan has found so far
+def render_partial_files(job):
+    st.header("🗂️ Files found so far")
+    st.metric("Files found", len(job.partial_files))
+    st.caption("The scan keeps running; this list grows as you interact with the page.")
+    query = st.text_input("🔍 Filter found files", "", key="partial_filter")
+    paths, more = job.page(query, PAGE_SIZE)
+    if paths:
+        choose_file(paths)
+    if more:
+        st.caption("Showing the first matches among the files found first; all files are searchable "
+                   "once the scan finishes.")
+
+# What the selection policy left out of the shared scan, by reason
+def render_skip_report(skipped):
+    total = sum(summary.files for summary in skipped)
+    dirs = sum(summary.dirs for summary in skipped)
+    with st.expander(f"🚫 Skipped {total} files and {dirs} folders"):
+        st.table([{"Reason": SKIP_REASONS.get(summary.reason, summary.reason), "Files": summary.files,
+                   "Folders": summary.dirs} for summary in skipped])
+        for summary in skipped:
+            st.caption(f"{SKIP_REASONS.get(summary.reason, summary.reason)}, for example:")
+            st.code("\n".join(summary.examples), language=None)
+
+# Search index over the scanned paths, built once per shared scan
+def get_file_finder():
+    return st.session_state.shared_scan.finder
+
+# Pick a file from one page of paths
+def choose_file(paths, format_func=str):
+    st.session_state.selected_file = st.radio("Choose a file:", paths, key="file_radio", format_func=format_func)
+
+# Browse the scanned folders one level at a time; a folder is only listed once it is opened
+def render_file_tree(finder):
+    directory = st.session_state.get("tree_dir", "")
+    subdirs, files = finder.children(directory)
+    if directory and not subdirs and not files:
+        # The folder is gone after a rescan or a scan of another folder
+        directory = st.session_state.tree_dir = ""
+        subdirs, files = finder.children(directory)
+
+    st.caption(f"📂 {directory or 'Repository root'}")
+    if directory and st.button("⬆️ Up", key="tree_up"):
+        st.session_state.tree_dir = os.path.dirname(directory)
+        st.rerun()
+
+    # Folders first, then files, one page at a time
+    entries = len(subdirs) + len(files)
+    page = 1
+    if entries > PAGE_SIZE:
+        pages = -(-entries // PAGE_SIZE)
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1,
+                               key=f"tree_page_{directory}")
+    start = (page - 1) * PAGE_SIZE
+    stop = start + PAGE_SIZE
+    for name in subdirs[start:stop]:
+        if st.button(f"📁 {name}", key=f"tree_open_{directory}/{name}"):
+            st.session_state.tree_dir = os.path.join(directory, name)
+            st.rerun()
+    page_files = files[max(start - len(subdirs), 0):max(stop - len(subdirs), 0)]
+    if page_files:
+        choose_file(page_files, format_func=os.path.basename)
+
+# Show a file in the content tab; files larger than one page are shown a page at a time
+def show_file_content(folder_path, relative_path, content):
+    reader = get_content_reader()
+    language = Path(relative_path).suffix.lstrip('.')
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except Exception as e:
-        return f"Error reading file: {e}"
+        info = reader.info(os.path.join(folder_path, relative_path))
+    except OSError as error:
+        st.error(f"❌ Error reading file: {error}")
+        return
+    if info.size <= PAGE_BYTES:
+        st.code(content, language=language)
+        return
+
+    pages = reader.page_count(info)
+    page_number = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1,
+                                  key=f"content_page_{relative_path}")
+    page = reader.read_page(info.path, page_number)
+    st.caption(f"Bytes {page.start:,}–{page.end:,} of {info.size:,} ({info.encoding})")
+    st.code(page.text, language=language)
+
+# Show time-to-first-token and throughput for a streamed reply
+def show_stream_stats(stats):
+    if stats.from_cache:
+        st.caption("⚡ Served from cache")
+    else:
+        st.caption(f"⏱️ First token after {stats.time_to_first_token or 0:.2f}s · "
+                   f"{stats.tokens_per_second:.1f} tokens/s · {stats.total_seconds or 0:.1f}s total")
+
+# Show the prompt size of the latest request an agent method made for the selected file
+def show_prompt_usage(method):
+    for usage in reversed(get_agent().usage_log):
+        if usage["method"] == method and usage["file"] == st.session_state.selected_file:
+            note = f" (file outlined from {usage['code_tokens']} tokens)" if usage["summarized"] else ""
+            st.caption(f"🧮 Prompt: {usage['prompt_tokens']} tokens{note}")
+            if usage.get("input_tokens") is not None:
+                # Token counts reported by the service for chat turns
+                st.caption(f"🧾 Input {usage['input_tokens']} tokens "
+                           f"({usage.get('cached_input_tokens') or 0} from prompt cache) · "
+                           f"output {usage['output_tokens']} tokens · "
+                           f"{usage['history_turns']} recent turns, {usage['summarized_turns']} summarized")
+            return
+
+# Poll a background task without rerunning the whole page, rendering tokens as they stream in;
+# rerun the app once it finishes
+@st.fragment(run_every=0.5)
+def poll_background_task(task_key):
+    task = st.session_state.task_runner.get(task_key)
+    if task is None or task.done():
+        st.rerun()
+    if task.partial:
+        st.markdown(task.partial_text + " ▌")
+    else:
+        st.info("⏳ Waiting for the first tokens. Keep browsing, the result will appear here.")
+
+# Render an LLM-backed tab lazily: cached results show instantly, otherwise nothing is sent to
+# the model until the user clicks the button, and the reply then streams in from the background
+def render_llm_tab(kind, button_label, agent_method, content):
+    method = agent_method.__name__
+    selected_file = st.session_state.selected_file
+    runner = st.session_state.task_runner
+    digest = content_hash(content)
+    # A finished reply only belongs to the content it was asked about; replies for earlier content of
+    # the file stay under their own key until the user leaves the file
+    task_key = (kind, selected_file, digest)
+    task = runner.get(task_key)
+    if task is not None:
+        if not task.done():
+            poll_background_task(task_key)
+            return
+        if task.error() is None:
+            st.markdown(task.result())
+            show_stream_stats(task.stream.stats)
+            show_prompt_usage(method)
+            return
+        runner.discard(task_key)  # Let the user retry
+        st.error(f"❌ Request failed: {task.error()}")
+
+    # Probe the response cache once per file content and scan, not on every rerun: building the
+    # prompt fits the file to its budget and queries the retrieval index
+    shared = st.session_state.get("shared_scan")
+    probe_key = (selected_file, digest, shared.generation if shared is not None else None)
+    probe = st.session_state.get(f"probe_{kind}")
+    if probe is None or probe[0] != probe_key:
+        probe = st.session_state[f"probe_{kind}"] = (probe_key, agent_method(selected_file, content, cached_only=True))
+    cached = probe[1]
+    if cached is not None:
+        st.markdown(cached)
+        show_prompt_usage(method)
+    elif st.button(button_label, key=f"run_{kind}"):
+        st.session_state.pop(f"probe_{kind}", None)  # The reply is cached once the request completes
+        runner.submit_stream(task_key, selected_file, agent_method, selected_file, content, stream=True)
+        st.rerun()
+
+# Poll the whole-repository analysis, showing how many files have been summarized
+@st.fragment(run_every=1)
+def poll_repo_analysis(task_key):
+    task = st.session_state.task_runner.get(task_key)
+    analysis = st.session_state.repo_analysis
+    if task is None or task.done():
+        st.rerun()
+    if analysis.stage == "files":
+        st.progress(analysis.completed / max(analysis.total, 1),
+                    text=f"Summarizing files: {analysis.completed} of {analysis.total}")
+    else:
+        st.progress(1.0, text=f"Merging summaries: {len(analysis.directory_summaries)} folders done")
+
+# Map-reduce analysis of every scanned file, run in the background and resumable from its checkpoint
+def render_repo_analysis():
+    folder = st.session_state.scanned_folder
+    runner = st.session_state.task_runner
+    task_key = ("repo_analysis", folder)
+    analysis = st.session_state.get("repo_analysis")
+    settings = get_settings()
+    if analysis is None or analysis.folder_path != folder:
+        st.write(f"Summarize all {len(st.session_state.code_files)} files, then merge the summaries per folder "
+                 f"into a repository overview. Up to {settings.analysis_concurrency} requests run at once within "
+                 f"{settings.tokens_per_minute} tokens per minute; progress is checkpointed, so an interrupted run resumes.")
+        if st.button("🧭 Start repository analysis"):
+            st.session_state.repo_analysis = RepoAnalysis(
+                get_agent(), folder, st.session_state.code_files, read_file_content,
+                concurrency=settings.analysis_concurrency, tokens_per_minute=settings.tokens_per_minute)
+            runner.discard(task_key)
+            runner.submit(task_key, None, st.session_state.repo_analysis.run)
+            st.rerun()
+        return
+
+    task = runner.get(task_key)
+    if task is not None and not task.done():
+        if st.button("⏹️ Cancel repository analysis"):
+            analysis.cancel()
+        poll_repo_analysis(task_key)
+        return
+
+    if task is not None and task.error() is not None:
+        st.error(f"❌ Repository analysis failed: {task.error()}")
+    elif analysis.repository_summary:
+        st.markdown(analysis.repository_summary)
+        folders = sorted(path for path in analysis.directory_summaries if path)
+        if folders:
+            chosen = st.selectbox("Folder overview:", folders)
+            st.markdown(analysis.directory_summaries[chosen])
+    else:
+        st.info("Repository analysis was cancelled. Start it again to resume from the checkpoint.")
+    if analysis.skipped:
+        st.caption(f"🗃️ Skipped {len(analysis.skipped)} binary or unreadable files: {', '.join(sorted(analysis.skipped))}")
+    if analysis.errors:
+        st.warning(f"⚠️ {len(analysis.errors)} files or folders could not be analyzed: {', '.join(sorted(analysis.errors))}")
+    if st.button("🔁 Run repository analysis again"):
+        del st.session_state.repo_analysis
+        st.rerun()
+
+# Hidden diagnostics panel, opened by adding ?diagnostics=1 to the URL. Timings are process-wide,
+# so this session keeps telemetry recording while its panel is open and recording is on; it stops
+# once no session wants it, unless the AI_REPO_TELEMETRY environment variable enabled it for good
+def render_diagnostics():
+    telemetry = get_telemetry()
+    with st.expander("🩺 Diagnostics", expanded=True):
+        if telemetry.always_enabled:
+            st.caption("⏺️ Recording since startup (AI_REPO_TELEMETRY is set).")
+        elif st.toggle("⏺️ Record timings and counters", value=True, key="diagnostics_recording"):
+            telemetry.start_recording(st.session_state.session_id)
+            st.caption(f"Recording while {telemetry.recorders} diagnostics panel(s) keep it on.")
+        else:
+            telemetry.stop_recording(st.session_state.session_id)
+
+        metrics = telemetry.snapshot()
+        if not metrics["histograms"]:
+            st.info("No operations recorded yet. Scan a folder or open a file to collect timings.")
+        else:
+            st.write("**Timings (ms)**")
+            st.dataframe([{"operation": name, **{key: round(value, 2) if isinstance(value, float) else value
+                                                  for key, value in stats.items()}}
+                          for name, stats in metrics["histograms"].items()], hide_index=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Counters**")
+            st.json(metrics["counters"])
+        with col2:
+            st.write("**Cache hit rates**")
+            st.json({name: f"{rate:.0%}" for name, rate in metrics["hit_rates"].items()})
+
+        limit = st.number_input("Recent operations", min_value=10, max_value=500, value=50, step=10)
+        st.dataframe(telemetry.recent(limit), hide_index=True)
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("💾 Export to cache folder"):
+                st.success(f"Appended to {telemetry.export()}")
+        with col2:
+            st.download_button("⬇️ Prometheus metrics", telemetry.prometheus_text(), file_name="metrics.prom")
+        with col3:
+            if st.button("♻️ Reset telemetry"):
+                telemetry.reset()
+                st.rerun()
 
 # Streamlit setup
 st.set_page_config(page_title="Codebase Analyzer", layout="wide")
 st.title("📁 Codebase Analyzer")
 
-# Default supported code file extensions
-DEFAULT_EXTENSIONS = {'.py', '.js', '.ts', '.html', '.css', '.java', '.cpp', '.cs'}
-
 # Initialize session state to preserve scanned files
 if "code_files" not in st.session_state:
     st.session_state.code_files = []
@@ -58,10 +395,16 @@ if "selected_file" not in st.session_state:
     st.session_state.selected_file = None
 if "scanned_folder" not in st.session_state:
     st.session_state.scanned_folder = None
-if "agent_trained" not in st.session_state:
-    st.session_state.agent_trained = False
 if "current_extensions" not in st.session_state:
     st.session_state.current_extensions = DEFAULT_EXTENSIONS
+if "current_policy" not in st.session_state:
+    st.session_state.current_policy = SelectionPolicy()
+if "task_runner" not in st.session_state:
+    st.session_state.task_runner = BackgroundTaskRunner()
+if "active_file" not in st.session_state:
+    st.session_state.active_file = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # --- FORM SECTION ---
 st.subheader("🔧 Folder Configuration")
@@ -82,6 +425,22 @@ with st.form("folder_scan_form"):
         value=", ".join(sorted(DEFAULT_EXTENSIONS)),
         help="Example: .py, .js, .ts, .html, .css"
     )
+
+    # Selection rules applied on top of the extensions
+    with st.expander("🚫 File selection rules"):
+        policy = st.session_state.current_policy
+        include_input = st.text_input(
+            "Only include files matching (globs, comma-separated):", value=", ".join(policy.include),
+            help="Example: src/**, *.py. Leave empty to include every file with a listed extension"
+        )
+        exclude_input = st.text_input(
+            "Exclude files and folders matching (globs, comma-separated):", value=", ".join(policy.exclude),
+            help="Example: tests/, **/migrations/**, *_test.py. A trailing / matches folders only"
+        )
+        max_file_kb = st.number_input("Skip files larger than (KB):", min_value=1,
+                                      value=policy.max_file_bytes // 1024)
+        use_ignore_files = st.checkbox("Honour .gitignore and .ignore files", value=policy.use_ignore_files)
+        heuristics = st.checkbox("Skip minified, generated, lock and binary files", value=policy.heuristics)
     
     # Form columns for buttons
     col1, col2 = st.columns(2)
@@ -92,82 +451,104 @@ with st.form("folder_scan_form"):
     with col2:
         rescan_button = st.form_submit_button("🔄 Rescan Folder")
 
-# Parse user input into a set of extensions
-CODE_EXTENSIONS = set()
-if extensions_input:
-    extensions_list = [ext.strip() for ext in extensions_input.split(',')]
-    for ext in extensions_list:
-        if ext and not ext.startswith('.'):
-            ext = '.' + ext
-        if ext:
-            CODE_EXTENSIONS.add(ext)
-
-# Fallback to defaults if no valid extensions provided
-if not CODE_EXTENSIONS:
-    CODE_EXTENSIONS = DEFAULT_EXTENSIONS
+# Parse user input into a set of extensions, falling back to defaults if none are valid
+CODE_EXTENSIONS = parse_extensions(extensions_input)
+SELECTION_POLICY = SelectionPolicy(parse_globs(include_input), parse_globs(exclude_input),
+                                   int(max_file_kb or DEFAULT_MAX_FILE_BYTES // 1024) * 1024,
+                                   use_ignore_files, heuristics)
 
 # Handle form submission
 if submit_button or rescan_button:
     if folder_path and os.path.isdir(folder_path):
-        # Check if we need to scan (folder changed, extensions changed, or forced rescan)
-        extensions_changed = CODE_EXTENSIONS != st.session_state.current_extensions
+        # Check if we need to scan (folder changed, extensions or selection changed, or forced rescan)
+        extensions_changed = (CODE_EXTENSIONS != st.session_state.current_extensions
+                              or SELECTION_POLICY != st.session_state.current_policy)
         folder_changed = st.session_state.scanned_folder != folder_path
-        
-        if submit_button and (folder_changed or extensions_changed or not st.session_state.code_files):
-            with st.spinner("🔍 Scanning folder for code files..."):
-                st.session_state.code_files = scan_code_files(folder_path)
-                st.session_state.scanned_folder = folder_path
-                st.session_state.current_extensions = CODE_EXTENSIONS.copy()
-                st.session_state.agent_trained = True
-                st.success(f"✅ Successfully scanned {len(st.session_state.code_files)} code files.")
-                
-        elif rescan_button:
-            with st.spinner("🔄 Rescanning folder for code files..."):
-                st.session_state.code_files = scan_code_files(folder_path)
-                st.session_state.scanned_folder = folder_path
-                st.session_state.current_extensions = CODE_EXTENSIONS.copy()
-                st.session_state.agent_trained = True
-                st.success(f"✅ Successfully rescanned {len(st.session_state.code_files)} code files.")
-                
-        elif submit_button:
-            st.info(f"📁 Using existing scan results: {len(st.session_state.code_files)} files found.")
-            
+        job = current_scan_job()
+
+        if submit_button and not (folder_changed or extensions_changed) and (job or st.session_state.code_files):
+            if job is None:
+                st.info(f"📁 Using existing scan results: {len(st.session_state.code_files)} files found.")
+        else:
+            # Scans run in the background; pressing the button again joins the running scan
+            start_scan_job(folder_path, rescan=rescan_button and not (folder_changed or extensions_changed))
+
     else:
         if folder_path:
             st.error("❌ Please enter a valid folder path.")
         else:
             st.warning("⚠️ Please enter a folder path to scan.")
 
+# Follow this session's scan job
+scan_job = current_scan_job()
+if scan_job is not None:
+    if scan_job.running:
+        poll_scan_job(scan_job.id)
+    else:
+        finish_scan_job(scan_job)
+        scan_job = None
+
+# Pick up a rescan of the same folder made in another session
+if st.session_state.get("shared_scan") is not None:
+    latest = get_scan_registry().latest(
+        st.session_state.scanned_folder, st.session_state.current_extensions, DEFAULT_IGNORE_DIRS,
+        st.session_state.current_policy)
+    if latest is not None and latest is not st.session_state.shared_scan:
+        st.session_state.code_files = use_shared_scan(latest)
+
 # Show current scan status
 if st.session_state.scanned_folder and st.session_state.code_files:
     st.info(f"📊 **Current Status:** Scanned `{st.session_state.scanned_folder}` - Found {len(st.session_state.code_files)} files with extensions: {', '.join(sorted(st.session_state.current_extensions))}")
+    if st.session_state.get("shared_scan") is not None and st.session_state.shared_scan.skipped:
+        render_skip_report(st.session_state.shared_scan.skipped)
+
+# Whole-repository analysis
+if st.session_state.scanned_folder and st.session_state.code_files:
+    with st.expander("🧭 Analyze entire repository"):
+        render_repo_analysis()
 
 # Sidebar for filtering and selecting file
 with st.sidebar:
-    if st.session_state.code_files:
+    if scan_job is not None and not st.session_state.code_files:
+        render_partial_files(scan_job)
+    elif st.session_state.code_files:
         st.header("🗂️ Filter & Select Files")
         
         # File count info
         st.metric("Total Files", len(st.session_state.code_files))
         
-        search_query = st.text_input("🔍 Filter files by name", "")
-        filtered_files = [
-            f for f in st.session_state.code_files if search_query.lower() in f.lower()
-        ]
-
-        if filtered_files:
-            st.write(f"Showing {len(filtered_files)} of {len(st.session_state.code_files)} files")
-            st.session_state.selected_file = st.radio(
-                "Choose a file:", filtered_files, key="file_radio"
-            )
-        else:
-            if search_query:
-                st.info("No matching files found.")
+        search_query = st.text_input(
+            "🔍 Find files", "",
+            help="Fuzzy file name (agpy), path fragment (utility/scan) or glob (*.py, src/**/test_*.py)"
+        )
+        finder = get_file_finder()
+        if search_query:
+            # Only the best page of matches is ranked and rendered, however large the repository
+            page = finder.search(search_query, limit=PAGE_SIZE)
+            if page.paths:
+                st.write(f"Showing {len(page.paths)} of {page.total}{'+' if page.capped else ''} matching files")
+                choose_file(page.paths)
             else:
-                st.info("Enter search term to filter files.")
+                st.info("No matching files found.")
+        else:
+            render_file_tree(finder)
     else:
         st.info("👆 Please scan a folder first to see files here.")
 
+    if "agent" in st.session_state:
+        cache_stats = st.session_state.agent.cache.stats()
+        st.caption(f"🗄️ LLM cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, "
+                   f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate)")
+        sent_tokens = sum(usage["prompt_tokens"] for usage in st.session_state.agent.usage_log
+                          if not usage["cached"])
+        st.caption(f"🧮 Prompt tokens sent this session: {sent_tokens}")
+
+# Switching files cancels background requests for the file the user left
+if st.session_state.active_file != st.session_state.selected_file:
+    if st.session_state.active_file:
+        st.session_state.task_runner.cancel_owner(st.session_state.active_file)
+    st.session_state.active_file = st.session_state.selected_file
+
 # Main view with file tabs
 if st.session_state.selected_file and st.session_state.scanned_folder:
     st.success(f"📄 Showing details for: `{st.session_state.selected_file}`")
@@ -175,80 +556,88 @@ if st.session_state.selected_file and st.session_state.scanned_folder:
     tab1, tab2, tab3, tab4 = st.tabs(
         ["📄 File Content", "🧠 Code Analysis", "📚 Learning Resources", "💬 AI Chat"])
 
-    with tab1:
+    # Decoded once and shared by every tab; later reruns hit the reader's cache. Binary and
+    # unreadable files are shown as such and never sent to the model
+    try:
         content = read_file_content(st.session_state.scanned_folder, st.session_state.selected_file)
-        st.code(content, language=Path(st.session_state.selected_file).suffix.lstrip('.'))
+        unreadable = None
+    except UnreadableFile as error:
+        content = None
+        unreadable = f"🗃️ {error}"
+
+    with tab1:
+        render_dependencies(st.session_state.selected_file)
+        if unreadable:
+            st.info(unreadable)
+        else:
+            show_file_content(st.session_state.scanned_folder, st.session_state.selected_file, content)
 
     with tab2:
-        # Initialize agent only once and cache it
-        if "agent" not in st.session_state:
-            st.session_state.agent = RampUpAgent()
-        
         st.subheader("🔍 AI-Powered Code Analysis")
-        content = read_file_content(st.session_state.scanned_folder, st.session_state.selected_file)
-        with st.spinner("🔍 Analyzing code..."):
-            analysis = st.session_state.agent.analyze_code(st.session_state.selected_file, content)
-        st.markdown(analysis)
+        if unreadable:
+            st.info(unreadable)
+        else:
+            render_llm_tab("analysis", "🔍 Analyze code", get_agent().analyze_code, content)
 
     with tab3:
-        # Use cached agent
-        if "agent" not in st.session_state:
-            st.session_state.agent = RampUpAgent()
-            
         st.subheader("📘 Recommended Learning Resources")
-        content = read_file_content(st.session_state.scanned_folder, st.session_state.selected_file)
-        with st.spinner("🔍 Analyzing code..."):
-            tutorials = st.session_state.agent.fetch_learning_resorces(st.session_state.selected_file, content)
-        st.markdown(tutorials)
+        if unreadable:
+            st.info(unreadable)
+        else:
+            render_llm_tab("learning", "📚 Find learning resources", get_agent().fetch_learning_resorces, content)
 
     with tab4:
         st.subheader("💬 Chat with AI Assistant")
         st.write("Ask questions about your codebase, get explanations, or request code improvements.")
+        if unreadable:
+            st.info(unreadable)
+        else:
+            chat_key = f"chat_{st.session_state.selected_file}"
+            if chat_key not in st.session_state:
+                st.session_state[chat_key] = [
+                    {
+                        "role": "user",
+                        "content": f"Hi! I'm analyzing the file `{st.session_state.selected_file}`. What would you like to know about this code?"
+                    }
+                ]
 
-        chat_key = f"chat_{st.session_state.selected_file}"
-        if chat_key not in st.session_state:
-            st.session_state[chat_key] = [
-                {
-                    "role": "user",
-                    "content": f"Hi! I'm analyzing the file `{st.session_state.selected_file}`. What would you like to know about this code?"
-                }
-            ]
-
-        # Display chat messages
-        for message in st.session_state[chat_key]:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-
-        # Chat input
-        if prompt := st.chat_input(f"Ask about {st.session_state.selected_file}..."):
-            # Add user message to chat history
-            st.session_state[chat_key].append({"role": "user", "content": prompt})
+            if st.button("🧹 Clear conversation", key=f"clear_{chat_key}"):
+                del st.session_state[chat_key]
+                get_agent().clear_chat(st.session_state.selected_file)
+                st.rerun()
+
+            # Display chat messages
+            for message in st.session_state[chat_key]:
+                with st.chat_message(message["role"]):
+                    st.markdown(message["content"])
+
+            # Chat input
+            if prompt := st.chat_input(f"Ask about {st.session_state.selected_file}..."):
+                # Add user message to chat history
+                st.session_state[chat_key].append({"role": "user", "content": prompt})
             
-            # Display user message
-            with st.chat_message("user"):
-                st.markdown(prompt)
-
-            # Generate AI response
-            with st.chat_message("assistant"):
-                st.spinner("🤖 AI is thinking...")
-                with st.spinner("🤔 Analyzing..."):
-                    # Get current file content for context
-                    file_content = read_file_content(st.session_state.scanned_folder, st.session_state.selected_file)
-
-                    # Initialize agent if not exists
-                    if "agent" not in st.session_state:
-                        st.session_state.agent = RampUpAgent()
-
-                    response = st.session_state.agent.chat_with_context(
-                        prompt, st.session_state.selected_file, file_content
+                # Display user message
+                with st.chat_message("user"):
+                    st.markdown(prompt)
+
+                # Generate AI response, rendering tokens as they arrive
+                with st.chat_message("assistant"):
+                    reply_stream = get_agent().chat_with_context(
+                        prompt, st.session_state.selected_file, content, stream=True
                     )
-                        
-            st.markdown(response)
+                    response = st.write_stream(reply_stream)
+                    show_stream_stats(reply_stream.stats)
+                    show_prompt_usage("chat_with_context")
 
-            # Add assistant response to chat history
-            st.session_state[chat_key].append({"role": "assistant", "content": response})
+                # Add assistant response to chat history
+                st.session_state[chat_key].append({"role": "assistant", "content": response})
 
 elif st.session_state.code_files and not st.session_state.selected_file:
     st.info("👈 Please select a file from the sidebar to view its details.")
 elif not st.session_state.code_files:
     st.info("👆 Please scan a folder first to analyze code files.")
+
+if st.query_params.get("diagnostics"):
+    render_diagnostics()
+else:
+    get_telemetry().stop_recording(st.session_state.session_id)
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from utility.cache_dir import CACHE_ENV_VAR
+
+
+# Keep every test's manifests, indexes and graphs out of the user's cache
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    root = tmp_path / "cache"
+    monkeypatch.setenv(CACHE_ENV_VAR, str(root))
+    return root
+
+
+# Folder the test's repository is written to
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    return str(root)
+
+
+# Write files under the repository from a {relative path: text} dict. Each write moves the
+# file's mtime a few seconds ahead, so rewrites within the clock's resolution are noticed.
+@pytest.fixture
+def write(repo):
+    def write_files(files):
+        for relative_path, text in files.items():
+            path = os.path.join(repo, *relative_path.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existed = os.path.exists(path)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            if existed:
+                stamp = os.stat(path).st_mtime + 10
+                os.utime(path, (stamp, stamp))
+
+    return write_files
@@ -0,0 +1,69 @@
+from utility.file_finder import FileFinder
+
+PATHS = [
+    "README.md",
+    "src/app/main.py",
+    "src/app/models.py",
+    "src/app/tests/test_models.py",
+    "src/domain/main_window.py",
+    "src/util/config_loader.py",
+    "docs/guide.md",
+]
+
+
+def _finder():
+    return FileFinder(PATHS, sep="/")
+
+
+def test_empty_query_lists_every_file():
+    page = _finder().search("")
+
+    assert page.total == len(PATHS)
+
+
+def test_name_prefix_ranks_before_substring_and_directory_matches():
+    paths = _finder().search("main").paths
+
+    assert paths[:2] == ["src/app/main.py", "src/domain/main_window.py"]
+    assert set(paths) == {"src/app/main.py", "src/domain/main_window.py"}
+
+
+def test_fuzzy_query_matches_characters_in_order():
+    paths = _finder().search("cfgldr").paths
+
+    assert paths == ["src/util/config_loader.py"]
+
+
+def test_exact_matches_rank_before_fuzzy_ones():
+    paths = _finder().search("models").paths
+
+    assert paths[0] == "src/app/models.py"
+    assert "src/app/tests/test_models.py" in paths
+
+
+def test_name_glob_matches_file_names_at_any_depth():
+    paths = _finder().search("*.md").paths
+
+    assert sorted(paths) == ["README.md", "docs/guide.md"]
+
+
+def test_path_glob_matches_whole_paths():
+    assert _finder().search("src/*/main.py").paths == ["src/app/main.py"]
+    assert sorted(_finder().search("src/**/test_*.py").paths) == ["src/app/tests/test_models.py"]
+
+
+def test_path_fragment_matches_anywhere_in_the_path():
+    paths = _finder().search("app/tests").paths
+
+    assert paths == ["src/app/tests/test_models.py"]
+
+
+def test_search_is_case_insensitive():
+    assert _finder().search("readme").paths == ["README.md"]
+
+
+def test_limit_caps_the_page_but_not_the_total():
+    page = _finder().search("*.py", limit=2)
+
+    assert len(page.paths) == 2
+    assert page.total == 5
@@ -0,0 +1,71 @@
+import os
+
+from utility.file_selection import IgnoreRules, SelectionPolicy
+from utility.repo_scan import scan_folder
+
+
+def test_later_negation_re_includes_a_file():
+    rules = IgnoreRules("", ["*.log", "!keep.log"])
+
+    assert rules.match("debug.log", "debug.log", False) is True
+    assert rules.match("keep.log", "keep.log", False) is False
+    assert rules.match("logs/keep.log", "keep.log", False) is False
+
+
+def test_last_matching_rule_decides():
+    rules = IgnoreRules("", ["!keep.log", "*.log"])
+
+    assert rules.match("keep.log", "keep.log", False) is True
+
+
+def test_unmatched_path_is_left_to_other_rules():
+    assert IgnoreRules("", ["*.log"]).match("app.py", "app.py", False) is None
+    assert IgnoreRules("", ["*.log", "!keep.log"]).match("app.py", "app.py", False) is None
+
+
+def test_leading_slash_anchors_to_the_directory():
+    rules = IgnoreRules("", ["/build"])
+
+    assert rules.match("build", "build", True) is True
+    assert rules.match("src/build", "build", True) is None
+
+
+def test_inner_slash_anchors_to_the_directory():
+    rules = IgnoreRules("", ["docs/*.md"])
+
+    assert rules.match("docs/a.md", "a.md", False) is True
+    assert rules.match("src/docs/a.md", "a.md", False) is None
+
+
+def test_unanchored_name_matches_at_any_depth():
+    rules = IgnoreRules("", ["build"])
+
+    assert rules.match("build", "build", True) is True
+    assert rules.match("src/deep/build", "build", True) is True
+
+
+def test_trailing_slash_matches_directories_only():
+    rules = IgnoreRules("", ["out/"])
+
+    assert rules.match("out", "out", True) is True
+    assert rules.match("out", "out", False) is None
+
+
+def test_scan_applies_nested_ignore_files(repo, write):
+    write({
+        ".gitignore": "/build/\n*.gen.py\n!keep.gen.py\n",
+        "build/a.py": "",
+        "src/build/b.py": "",
+        "src/x.gen.py": "",
+        "src/keep.gen.py": "",
+        "src/app.py": "",
+        "src/vendor/.gitignore": "*.py\n!api.py\n",
+        "src/vendor/lib.py": "",
+        "src/vendor/api.py": "",
+    })
+
+    result = scan_folder(repo, {".py"}, policy=SelectionPolicy())
+
+    assert sorted(path.replace(os.sep, "/") for path in result.files) == [
+        "src/app.py", "src/build/b.py", "src/keep.gen.py", "src/vendor/api.py"]
+    assert {summary.reason for summary in result.skipped} == {"gitignored"}
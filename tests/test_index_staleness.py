@@ -0,0 +1,62 @@
+import os
+
+from utility.dependency_graph import DependencyGraph
+from utility.repo_scan import rescan_folder, scan_folder
+from utility.retrieval_index import RetrievalIndex
+
+
+def _indexed_paths(index):
+    return sorted({result[1].replace(os.sep, "/") for result in index.search("marker", 50)})
+
+
+def test_index_and_graph_are_not_reused_for_other_scan_settings(repo, write):
+    write({"a/x.py": "marker = 1\n", "b/y.py": "marker = 2\n"})
+    wide = scan_folder(repo, {".py"})
+    RetrievalIndex.build(wide.manifest).close()
+    DependencyGraph.build(wide.manifest, max_workers=1)
+
+    narrow = scan_folder(repo, {".py"}, ignore={"b"})
+
+    assert RetrievalIndex.load(narrow.manifest) is None
+    assert DependencyGraph.load(narrow.manifest) is None
+    assert RetrievalIndex.load(wide.manifest) is not None
+
+
+def test_index_and_graph_from_an_older_generation_are_not_loaded(repo, write):
+    write({"a.py": "marker = 1\n"})
+    scan = scan_folder(repo, {".py"})
+    RetrievalIndex.build(scan.manifest).close()
+    DependencyGraph.build(scan.manifest, max_workers=1)
+
+    write({"b.py": "import a\nmarker = 2\n"})
+    result = rescan_folder(repo, {".py"})
+
+    assert RetrievalIndex.load(result.manifest) is None
+    assert DependencyGraph.load(result.manifest) is None
+
+
+def test_patched_index_and_graph_match_a_full_build(repo, write):
+    write({"pkg/__init__.py": "", "pkg/a.py": "marker = 1\n", "pkg/b.py": "from pkg import a\nmarker = 2\n",
+           "main.py": "import pkg.d\nfrom pkg import a\n"})
+    scan = scan_folder(repo, {".py"})
+    RetrievalIndex.build(scan.manifest).close()
+    DependencyGraph.build(scan.manifest, max_workers=1)
+
+    write({"pkg/c.py": "from pkg import b\nmarker = 3\n", "pkg/b.py": "import pkg.c\nmarker = 4\n",
+           "pkg/d.py": ""})
+    os.remove(os.path.join(repo, "pkg", "a.py"))
+    result = rescan_folder(repo, {".py"})
+    index = RetrievalIndex.build(result.manifest, result.delta)
+    graph = DependencyGraph.build(result.manifest, result.delta, max_workers=1)
+
+    assert _indexed_paths(index) == ["pkg/b.py", "pkg/c.py"]
+    assert graph.imports_of("pkg/b.py") == [os.path.join("pkg", "c.py")]
+    assert graph.imports_of("pkg/c.py") == [os.path.join("pkg", "b.py")]
+    # main.py did not change, but its import of pkg.d now resolves and its import of pkg.a no longer does
+    assert graph.imports_of("main.py") == [os.path.join("pkg", "d.py"), os.path.join("pkg", "__init__.py")]
+    loaded_index = RetrievalIndex.load(result.manifest)
+    loaded_graph = DependencyGraph.load(result.manifest)
+    assert _indexed_paths(loaded_index) == ["pkg/b.py", "pkg/c.py"]
+    assert loaded_graph.importers_of("pkg/b.py") == [os.path.join("pkg", "c.py")]
+    index.close()
+    loaded_index.close()
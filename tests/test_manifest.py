@@ -0,0 +1,62 @@
+import os
+
+from utility.manifest import Manifest
+from utility.repo_scan import rescan_folder, scan_folder
+
+EXTENSIONS = {".py"}
+
+
+def _paths(entries):
+    return sorted(entry.relative_path.replace(os.sep, "/") for entry in entries)
+
+
+def _deleted(delta):
+    return sorted(relative_path.replace(os.sep, "/") for relative_path in delta.deleted)
+
+
+def test_rescan_reports_added_modified_and_deleted_files(repo, write):
+    write({"a.py": "a = 1\n", "pkg/b.py": "b = 1\n", "pkg/c.py": "c = 1\n", "old/d.py": "d = 1\n"})
+    scan = scan_folder(repo, EXTENSIONS)
+
+    write({"pkg/b.py": "b = 2\n", "pkg/new.py": "n = 1\n"})
+    os.remove(os.path.join(repo, "pkg", "c.py"))
+    os.remove(os.path.join(repo, "old", "d.py"))
+    os.rmdir(os.path.join(repo, "old"))
+    result = rescan_folder(repo, EXTENSIONS)
+
+    assert _paths(result.delta.added) == ["pkg/new.py"]
+    assert _paths(result.delta.modified) == ["pkg/b.py"]
+    assert _deleted(result.delta) == ["old/d.py", "pkg/c.py"]
+    assert result.delta.since == scan.manifest.generation
+    assert result.manifest.generation != scan.manifest.generation
+    assert sorted(path.replace(os.sep, "/") for path in result.files) == ["a.py", "pkg/b.py", "pkg/new.py"]
+
+
+def test_unchanged_rescan_keeps_the_generation(repo, write):
+    write({"a.py": "a = 1\n", "pkg/b.py": "b = 1\n"})
+    scan = scan_folder(repo, EXTENSIONS)
+
+    result = rescan_folder(repo, EXTENSIONS)
+
+    assert result.delta.added == result.delta.modified == result.delta.deleted == []
+    assert result.manifest.generation == scan.manifest.generation
+
+
+def test_a_change_is_reported_once(repo, write):
+    write({"a.py": "a = 1\n"})
+    scan_folder(repo, EXTENSIONS)
+    write({"a.py": "a = 2\n"})
+
+    first = rescan_folder(repo, EXTENSIONS)
+    second = rescan_folder(repo, EXTENSIONS)
+
+    assert _paths(first.delta.modified) == ["a.py"]
+    assert second.delta.modified == []
+
+
+def test_manifest_is_kept_per_scan_settings(repo, write):
+    write({"a.py": "a = 1\n", "b.js": "b = 1\n"})
+    scan_folder(repo, EXTENSIONS)
+
+    assert Manifest.load(repo, EXTENSIONS).loaded
+    assert not Manifest.load(repo, {".py", ".js"}).loaded
@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundTask:
+    """A unit of work submitted to a BackgroundTaskRunner, with cooperative cancellation."""
+
+    def __init__(self, key, owner):
+        self.key = key
+        self.owner = owner
+        self.cancel_event = threading.Event()
+        self.future = None
+        # Streamed tasks collect deltas here while running, and expose the stream's stats
+        self.partial = []
+        self.stream = None
+
+    @property
+    def partial_text(self):
+        return "".join(self.partial)
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+    def error(self):
+        if not self.done() or self.future.cancelled():
+            return None
+        return self.future.exception()
+
+
+class BackgroundTaskRunner:
+    """
+    Runs slow calls (LLM requests) off the Streamlit script thread.
+
+    Tasks are keyed, so a rerun that asks for the same work again finds the task already in flight
+    instead of starting a duplicate. Every task has an owner (the selected file); cancelling an
+    owner drops its queued tasks and signals running ones through their cancel_event.
+    """
+
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, owner, func, *args, **kwargs):
+        """Start func(*args, **kwargs) in the background unless a task with this key already exists."""
+        return self._submit(key, owner, lambda task: func(*args, **kwargs))
+
+    def submit_stream(self, key, owner, stream_factory, *args, **kwargs):
+        """
+        Like submit, but stream_factory(*args, **kwargs) returns an iterable of text deltas that are
+        collected into task.partial as they arrive. A cancelled task stops reading the stream.
+        """
+        def consume(task):
+            task.stream = stream_factory(*args, **kwargs)
+            deltas = iter(task.stream)
+            try:
+                for delta in deltas:
+                    if task.cancelled:
+                        break
+                    task.partial.append(delta)
+            finally:
+                close = getattr(deltas, "close", None)
+                if close:
+                    close()
+            return task.partial_text
+
+        return self._submit(key, owner, consume)
+
+    def _submit(self, key, owner, work):
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None and not task.cancelled:
+                return task
+            task = BackgroundTask(key, owner)
+            task.future = self._pool.submit(work, task)
+            self._tasks[key] = task
+            return task
+
+    def get(self, key):
+        with self._lock:
+            return self._tasks.get(key)
+
+    def discard(self, key):
+        with self._lock:
+            self._tasks.pop(key, None)
+
+    def cancel_owner(self, owner):
+        """Cancel every task belonging to owner, e.g. when the user switches to another file."""
+        with self._lock:
+            keys = [key for key, task in self._tasks.items() if task.owner == owner]
+            for key in keys:
+                task = self._tasks.pop(key)
+                task.cancel_event.set()
+                task.future.cancel()
+        return len(keys)
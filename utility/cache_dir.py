@@ -0,0 +1,38 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+# Override the cache location with this environment variable (defaults to ~/.cache/ai_repo)
+CACHE_ENV_VAR = "AI_REPO_CACHE_DIR"
+
+
+# Root folder for every artifact the analyzer persists between runs
+def get_cache_root():
+    root = os.getenv(CACHE_ENV_VAR) or os.path.join(Path.home(), ".cache", "ai_repo")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+# Per-folder cache directory, keyed on the absolute path of the scanned folder
+def get_cache_dir(folder_path):
+    normalized = os.path.normcase(os.path.abspath(folder_path))
+    key = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+    cache_dir = os.path.join(get_cache_root(), "roots", key)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+# Write a file via a temporary sibling and os.replace so readers never see a partial file
+def atomic_write_text(path, text, encoding="utf-8"):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
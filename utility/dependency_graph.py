@@ -0,0 +1,738 @@
+import ast
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import posixpath
+import re
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utility.cache_dir import atomic_write_text
+from utility.telemetry import get_telemetry
+
+GRAPH_VERSION = 2
+SYMBOLS_FILE = "symbols.sqlite"
+GRAPH_FILE = "graph.json"
+MAX_PARSED_FILE_BYTES = 1 << 20
+# Below this many files to parse, starting a process pool costs more than it saves
+PARALLEL_MIN_FILES = 200
+# Files parsed per task sent to a worker process
+PARSE_BATCH_FILES = 64
+# Longest definition line kept for prompts
+MAX_SIGNATURE_CHARS = 160
+# Capitalized identifiers kept per Java/C# file to resolve type references
+MAX_TYPE_REFERENCES = 400
+# Definitions shown per neighbouring file in prompt context
+DEFINITIONS_PER_NEIGHBOUR = 6
+# Rough in-memory cost of one file of the graph (its path and id), on top of the path text
+_BYTES_PER_FILE = 150
+# Keys per SQL statement when looking up the files depending on changed keys
+_SQL_BATCH = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, "
+    "hash TEXT, symbols TEXT NOT NULL, imports TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS provides (key TEXT NOT NULL, path TEXT NOT NULL, rank INTEGER NOT NULL, "
+    "PRIMARY KEY (key, path)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS provides_path ON provides (path)",
+    "CREATE TABLE IF NOT EXISTS depends (path TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (path, key)) "
+    "WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS depends_key ON depends (key)",
+)
+
+# Parser used for each suffix; other files become nodes without imports or definitions
+LANGUAGES = {
+    ".py": "python",
+    ".js": "js", ".jsx": "js", ".mjs": "js", ".cjs": "js", ".ts": "js", ".tsx": "js",
+    ".java": "java",
+    ".cs": "csharp",
+    ".cpp": "cpp", ".cc": "cpp", ".cxx": "cpp", ".c": "cpp", ".h": "cpp", ".hpp": "cpp", ".hh": "cpp",
+}
+# Suffixes tried, in order, for an extensionless JS/TS import
+_JS_SUFFIXES = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+
+_JS_IMPORT = re.compile(
+    r"""^[ \t]*(?:import|export)\s+(?:type\s+)?(?:([\w$*{}\s,]+?)\s+from\s+)?['"]([^'"\n]+)['"]"""
+    r"""|\brequire\(\s*['"]([^'"\n]+)['"]\s*\)|\bimport\(\s*['"]([^'"\n]+)['"]\s*\)""", re.M)
+_JS_DEFINITION = re.compile(
+    r"^(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+    r"(function\*?|class|interface|type|enum|const|let|var)\s+([A-Za-z_$][\w$]*)", re.M)
+_JAVA_PACKAGE = re.compile(r"^\s*package\s+([\w.]+)\s*;", re.M)
+_JAVA_IMPORT = re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+(?:\.\*)?)\s*;", re.M)
+_CS_NAMESPACE = re.compile(r"^\s*namespace\s+([\w.]+)", re.M)
+_CS_USING = re.compile(r"^\s*(?:global\s+)?using\s+(?:static\s+)?(?:\w+\s*=\s*)?([\w.]+)\s*;", re.M)
+_TYPE_DEFINITION = re.compile(
+    r"^[ \t]*(?:(?:public|private|protected|internal|static|final|abstract|sealed|partial|readonly|unsafe"
+    r"|new)\s+)*(class|interface|enum|record|struct)\s+([A-Za-z_]\w*)", re.M)
+_TYPE_REFERENCE = re.compile(r"\b[A-Z]\w*")
+_CPP_INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*[<"]([^>"\n]+)[>"]', re.M)
+_CPP_TYPE = re.compile(r"^(?:template\s*<[^>\n]*>\s*)?(class|struct|union|enum(?:\s+class)?|namespace)\s+"
+                       r"([A-Za-z_]\w*)\s*(?:[:{]|$)", re.M)
+_CPP_FUNCTION = re.compile(r"^(?:[\w:<>,*&]+[ \t]+)+[*&]*([A-Za-z_~][\w:~]*)[ \t]*\([^;{}]*\)[ \t\w]*\{", re.M)
+_CPP_KEYWORDS = frozenset({"if", "for", "while", "switch", "catch", "return", "else"})
+
+
+# Text of a definition's line, trimmed for prompts
+def _signature(lines, line_number):
+    return lines[line_number - 1].strip()[:MAX_SIGNATURE_CHARS] if 0 < line_number <= len(lines) else ""
+
+
+# 1-based line number of a character offset
+def _line_at(line_starts, offset):
+    return bisect.bisect_right(line_starts, offset)
+
+
+# Import statements anywhere in a module; only statement bodies are visited, imports are never
+# inside expressions
+def _import_nodes(statements):
+    for node in statements:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            yield node
+            continue
+        for field in ("body", "orelse", "finalbody", "handlers"):
+            children = getattr(node, field, None)
+            if isinstance(children, list):
+                yield from _import_nodes(children)
+
+
+def parse_python(text):
+    """
+    Imports and definitions of a Python file, read with ast.
+
+    Returns:
+        dict: {"imports": [[module, [names]]], "defs": [[name, kind, line, signature]]}; relative
+        imports keep their leading dots
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return {"imports": [], "defs": []}
+    lines = text.splitlines()
+    imports = []
+    for node in _import_nodes(tree.body):
+        if isinstance(node, ast.Import):
+            imports.extend([alias.name, []] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append(["." * node.level + (node.module or ""), [alias.name for alias in node.names]])
+    definitions = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            definitions.append([node.name, "function", node.lineno, _signature(lines, node.lineno)])
+        elif isinstance(node, ast.ClassDef):
+            definitions.append([node.name, "class", node.lineno, _signature(lines, node.lineno)])
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    definitions.append([f"{node.name}.{item.name}", "method", item.lineno,
+                                        _signature(lines, item.lineno)])
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id.isupper():
+                    definitions.append([target.id, "constant", node.lineno, _signature(lines, node.lineno)])
+    return {"imports": imports, "defs": definitions}
+
+
+# Names bound by a JS/TS import clause such as "React, { useState as state }"
+def _js_imported_names(clause):
+    names = []
+    for part in re.split(r"[{},]", clause or ""):
+        name = part.strip().split(" as ")[0].strip()
+        if name and name not in ("*", "type"):
+            names.append(name)
+    return names
+
+
+def parse_js(text):
+    """Imports (static, require and dynamic) and top-level definitions of a JS/TS file."""
+    lines = text.splitlines()
+    line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+    imports = []
+    for match in _JS_IMPORT.finditer(text):
+        clause, module, required, dynamic = match.groups()
+        imports.append([module or required or dynamic, _js_imported_names(clause)])
+    definitions = []
+    for match in _JS_DEFINITION.finditer(text):
+        line = _line_at(line_starts, match.start())
+        kind = match.group(1).rstrip("*")
+        definitions.append([match.group(2), "variable" if kind in ("const", "let", "var") else kind, line,
+                            _signature(lines, line)])
+    return {"imports": imports, "defs": definitions}
+
+
+def _parse_typed(text, namespace_regex, import_regex):
+    lines = text.splitlines()
+    line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+    namespace = namespace_regex.search(text)
+    definitions = []
+    for match in _TYPE_DEFINITION.finditer(text):
+        line = _line_at(line_starts, match.start())
+        definitions.append([match.group(2), match.group(1), line, _signature(lines, line)])
+    defined = {definition[0] for definition in definitions}
+    references = sorted({name for name in _TYPE_REFERENCE.findall(text) if name not in defined})
+    return {"imports": [[module, []] for module in import_regex.findall(text)], "defs": definitions,
+            "namespace": namespace.group(1) if namespace else "", "refs": references[:MAX_TYPE_REFERENCES]}
+
+
+def parse_java(text):
+    """Package, imports, type definitions and referenced type names of a Java file."""
+    return _parse_typed(text, _JAVA_PACKAGE, _JAVA_IMPORT)
+
+
+def parse_csharp(text):
+    """Namespace, usings, type definitions and referenced type names of a C# file."""
+    return _parse_typed(text, _CS_NAMESPACE, _CS_USING)
+
+
+def parse_cpp(text):
+    """Includes, types and function definitions of a C/C++ file."""
+    lines = text.splitlines()
+    line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+    definitions = []
+    for match in _CPP_TYPE.finditer(text):
+        line = _line_at(line_starts, match.start())
+        definitions.append([match.group(2), match.group(1).split()[0], line, _signature(lines, line)])
+    for match in _CPP_FUNCTION.finditer(text):
+        if match.group(1) not in _CPP_KEYWORDS:
+            line = _line_at(line_starts, match.start())
+            definitions.append([match.group(1), "function", line, _signature(lines, line)])
+    definitions.sort(key=lambda definition: definition[2])
+    return {"imports": [[include, []] for include in _CPP_INCLUDE.findall(text)], "defs": definitions}
+
+
+_PARSERS = {"python": parse_python, "js": parse_js, "java": parse_java, "csharp": parse_csharp, "cpp": parse_cpp}
+
+
+def parse_file(folder_path, relative_path, old_hash=None):
+    """
+    Read and parse one file.
+
+    Args:
+        folder_path (str): Scanned folder
+        relative_path (str): File to parse
+        old_hash (str): Content hash of the cached symbols; matching content is not parsed again
+
+    Returns:
+        tuple: (relative_path, content hash, symbols dict, or None when the content is unchanged)
+    """
+    try:
+        with open(os.path.join(folder_path, relative_path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return relative_path, None, {"imports": [], "defs": []}
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if digest == old_hash:
+        return relative_path, digest, None
+    language = LANGUAGES.get(os.path.splitext(relative_path)[1].lower())
+    symbols = _PARSERS[language](data.decode("utf-8", errors="replace"))
+    symbols["lang"] = language
+    return relative_path, digest, symbols
+
+
+# Parse a batch of (relative_path, old_hash) pairs; runs in a worker process
+def _parse_batch(folder_path, batch):
+    return [parse_file(folder_path, relative_path, old_hash) for relative_path, old_hash in batch]
+
+
+# Keys a file provides to the resolver, with their rank: "p:" its path and "n:" its file name,
+# "m:" every dotted module name of a Python file, ranked by the leading packages skipped, and
+# "t:namespace:name" each type a Java/C# file defines
+def _provided_keys(path, record):
+    keys = {"p:" + path: 0, "n:" + posixpath.basename(path): 0}
+    language = record.get("lang")
+    if language == "python":
+        parts = path[:-len(".py")].split("/")
+        if parts[-1] == "__init__":
+            parts.pop()
+        # Every suffix of the dotted path, so packages under src/ or other roots resolve too
+        for skipped in range(len(parts)):
+            keys.setdefault("m:" + ".".join(parts[skipped:]), skipped)
+    elif language in ("java", "csharp"):
+        for name, *_ in record["defs"]:
+            keys.setdefault(f"t:{record.get('namespace', '')}:{name}", 0)
+    return list(keys.items())
+
+
+# Key a lookup depends on: type lookups depend on their namespace, so a Java/C# file referencing
+# hundreds of names is resolved again when one of the namespaces it searches gains or loses a type
+def _dependency_key(key):
+    return "s:" + key[2:].rpartition(":")[0] if key.startswith("t:") else key
+
+
+class _Resolver:
+    """
+    Maps the import strings of every language to files of the scanned folder.
+
+    Files are found through lookup(key), which returns the (rank, path) pairs of the files
+    providing a key (see _provided_keys) sorted by path. The keys a resolution looked up, hits and
+    misses alike, are collected in depends_on: a file only resolves differently once the files
+    providing one of those keys change.
+
+    Args:
+        lookup (callable): Providers of a key
+    """
+
+    def __init__(self, lookup):
+        self.lookup = lookup
+        self.depends_on = set()
+
+    def _find(self, key):
+        self.depends_on.add(_dependency_key(key))
+        return self.lookup(key)
+
+    def resolve(self, path, record):
+        """Files imported by the file at path, in import order; depends_on is reset to what it looked up."""
+        self.depends_on = set()
+        language = record.get("lang")
+        targets = []
+        if language == "python":
+            for module, names in record["imports"]:
+                targets.extend(self._python(path, module, names))
+        elif language == "js":
+            for module, _ in record["imports"]:
+                targets.extend(self._js(path, module))
+        elif language in ("java", "csharp"):
+            targets.extend(self._typed(record))
+        elif language == "cpp":
+            for include, _ in record["imports"]:
+                targets.extend(self._cpp(path, include))
+        seen = {path}
+        return [target for target in targets if not (target in seen or seen.add(target))]
+
+    def _python(self, path, module, names):
+        level = len(module) - len(module.lstrip("."))
+        module = module[level:]
+        if level:
+            # Relative import: from the importer's package, one level up per extra dot
+            package = posixpath.dirname(path).split("/") if posixpath.dirname(path) else []
+            package = package[:max(len(package) - (level - 1), 0)]
+            module = ".".join(package + ([module] if module else []))
+        # "from package import name" may import a submodule or a name defined in the package
+        found = [target for name in names for target in self._module(f"{module}.{name}" if module else name, path,
+                                                                     exact=bool(level))]
+        if len(found) < len(names) or not names:
+            found.extend(self._module(module, path, exact=bool(level)))
+        return found
+
+    def _module(self, module, importer, exact=False):
+        matches = self._find("m:" + module)
+        # A match below the root only counts if the importer lives under the same source root
+        matches = [(skipped, path) for skipped, path in matches
+                   if skipped == 0 or (not exact and importer.startswith("/".join(path.split("/")[:skipped]) + "/"))]
+        if not matches:
+            return []
+        best = min(skipped for skipped, _ in matches)
+        return [path for skipped, path in matches if skipped == best][:3]
+
+    def _js(self, path, module):
+        if not module.startswith("."):
+            return []  # Package imports are outside the repository
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(path), module))
+        for candidate in ([base] + [base + suffix for suffix in _JS_SUFFIXES]
+                          + [base + "/index" + suffix for suffix in _JS_SUFFIXES]):
+            if self._find("p:" + candidate):
+                return [candidate]
+        return []
+
+    def _typed(self, record):
+        namespace = record.get("namespace", "")
+        imported_types = {}
+        namespaces = set()
+        for module, _ in record["imports"]:
+            if module.endswith(".*"):
+                namespaces.add(module[:-2])
+                continue
+            # "a.b.C" or a static import "a.b.C.member": the longest prefix naming a known type
+            parts = module.split(".")
+            for end in range(len(parts), 0, -1):
+                owner, name = ".".join(parts[:end - 1]), parts[end - 1]
+                if self._find(f"t:{owner}:{name}"):
+                    imported_types[name] = owner
+                    break
+            else:
+                namespaces.add(module)  # A C# using names a namespace
+        # The file's own namespace and its parents are visible without imports
+        parts = namespace.split(".") if namespace else []
+        namespaces.update(".".join(parts[:end]) for end in range(len(parts), -1, -1))
+        targets = []
+        for name in list(imported_types) + record.get("refs", []):
+            owners = [imported_types[name]] if name in imported_types else sorted(namespaces)
+            for owner in owners:
+                targets.extend(path for _, path in self._find(f"t:{owner}:{name}"))
+        return targets
+
+    def _cpp(self, path, include):
+        local = posixpath.normpath(posixpath.join(posixpath.dirname(path), include))
+        if self._find("p:" + local):
+            return [local]
+        candidates = [candidate for _, candidate in self._find("n:" + posixpath.basename(include))]
+        return [candidate for candidate in candidates if candidate == include or candidate.endswith("/" + include)][:1]
+
+
+class DependencyGraph:
+    """
+    Cross-file imports and top-level definitions of the scanned code, built at scan time and
+    stored in the scan's cache directory with the manifest generation it was built from.
+
+    Files are parsed with ast (Python) or a few regular expressions (JS/TS, Java, C#, C/C++)
+    on a process pool. Parsed symbols are kept in symbols.sqlite with each file's size, mtime,
+    content hash and resolved imports: unchanged files are not read again, touched files whose
+    content hash still matches are not parsed again, and symbols are read back one file at a time
+    when a prompt needs them. Imports are resolved to files of the folder and kept as compressed
+    adjacency arrays (offsets into a flat target list) in both directions, so "what does this
+    file import" and "who imports this file" are array slices.
+
+    After a rescan only the delta is parsed, and only the changed files and the files whose
+    imports could resolve differently are resolved again: symbols.sqlite also records the keys
+    every file provides to the resolver and the keys every resolution looked up.
+
+    Args:
+        folder_path (str): Scanned folder
+        directory (str): Cache directory of the scan
+    """
+
+    def __init__(self, folder_path, directory):
+        self.folder_path = os.path.abspath(folder_path)
+        self.directory = os.path.join(directory, "graph")
+        # Manifest generation the graph was built from
+        self.generation = None
+        self.files = []
+        self._ids = {}
+        self._offsets = array("i", [0])
+        self._targets = array("i")
+        self._reverse_offsets = array("i", [0])
+        self._reverse_targets = array("i")
+        self.approx_bytes = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, manifest):
+        """
+        Open the graph saved for a manifest's scan, or return None when it has not been built or
+        was built from another generation of the manifest.
+        """
+        graph = cls._open(manifest)
+        return graph if graph is not None and graph.generation == manifest.generation else None
+
+    # Open whatever graph is saved for the manifest's scan
+    @classmethod
+    def _open(cls, manifest):
+        graph = cls(manifest.folder_path, manifest.directory)
+        try:
+            with open(os.path.join(graph.directory, GRAPH_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if data.get("version") != GRAPH_VERSION:
+            return None
+        graph.generation = data["generation"]
+        graph._connection = graph._connect()
+        graph._set(data["files"], array("i", data["offsets"]), array("i", data["targets"]))
+        return graph
+
+    @classmethod
+    def build(cls, manifest, delta=None, max_workers=None):
+        """
+        Build or incrementally update the graph for the files of a saved manifest and save it.
+
+        Args:
+            manifest (Manifest): Saved manifest of the scan; its generation is recorded with the graph
+            delta (ManifestDelta): Changes of the rescan that saved the manifest; when the saved graph
+                was built from the generation the delta starts at, only the delta is parsed
+            max_workers (int): Parser processes, defaults to the CPU count; 1 parses in this process
+
+        Returns:
+            DependencyGraph: The built graph
+        """
+        with get_telemetry().span("graph.build", folder=manifest.folder_path) as span:
+            graph = cls._patch(manifest, delta, max_workers) if delta is not None and delta.since is not None else None
+            span.set(patched=graph is not None)
+            if graph is None:
+                graph = cls._build(manifest, max_workers)
+            span.set(files=len(graph.files), edges=len(graph._targets))
+        return graph
+
+    def _connect(self):
+        os.makedirs(self.directory, exist_ok=True)
+        connection = sqlite3.connect(os.path.join(self.directory, SYMBOLS_FILE), isolation_level=None,
+                                     check_same_thread=False)
+        # Graphs still in use keep reading symbols while a rescan updates them
+        connection.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    @classmethod
+    def _build(cls, manifest, max_workers):
+        graph = cls(manifest.folder_path, manifest.directory)
+        graph.generation = manifest.generation
+        connection = graph._connection = graph._connect()
+
+        # [size, mtime, content hash, symbols] per file
+        records = {}
+        pending = []
+        for entry in manifest.entries():
+            path = entry.relative_path.replace(os.sep, "/")
+            if LANGUAGES.get(os.path.splitext(path)[1].lower()) is None:
+                continue
+            old = connection.execute("SELECT size, mtime, hash, symbols FROM files WHERE path = ?", (path,)).fetchone()
+            if old is not None and old[:2] == (entry.size, entry.mtime):
+                records[path] = [entry.size, entry.mtime, old[2], json.loads(old[3])]
+            elif entry.size > MAX_PARSED_FILE_BYTES:
+                records[path] = [entry.size, entry.mtime, None, {"imports": [], "defs": []}]
+            else:
+                records[path] = [entry.size, entry.mtime, None, None]
+                pending.append((path, old[2] if old is not None else None))
+        for path, digest, symbols in cls._parse(graph.folder_path, pending, max_workers):
+            records[path][2] = digest
+            records[path][3] = symbols if symbols is not None else graph._symbols(path)
+
+        files = sorted(records)
+        provided = {}
+        for path in files:
+            for key, rank in _provided_keys(path, records[path][3]):
+                provided.setdefault(key, []).append((rank, path))
+        resolver = _Resolver(lambda key: provided.get(key, ()))
+        ids = {path: file_id for file_id, path in enumerate(files)}
+        offsets = array("i", [0])
+        targets = array("i")
+        connection.execute("BEGIN")
+        for table in ("files", "provides", "depends"):
+            connection.execute(f"DELETE FROM {table}")
+        for path in files:
+            size, mtime, digest, symbols = records[path]
+            imports = resolver.resolve(path, symbols)
+            targets.extend(ids[target] for target in imports)
+            offsets.append(len(targets))
+            connection.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                               (path, size, mtime, digest, json.dumps(symbols), json.dumps(imports)))
+            connection.executemany("INSERT INTO depends VALUES (?, ?)", [(path, key) for key in resolver.depends_on])
+        connection.executemany("INSERT INTO provides VALUES (?, ?, ?)",
+                               [(key, path, rank) for key, providers in provided.items() for rank, path in providers])
+        connection.execute("COMMIT")
+        graph._save(files, offsets, targets)
+        return graph
+
+    @classmethod
+    def _patch(cls, manifest, delta, max_workers):
+        """
+        Bring the saved graph from the generation the delta starts at to the manifest's: parse the
+        added and modified files, and resolve them again along with every file that looked up a
+        key they provide or stopped providing. Returns None when the saved graph is from another
+        generation, so the caller builds it instead.
+        """
+        graph = cls._open(manifest)
+        if graph is None or graph.generation not in (delta.since, manifest.generation):
+            return None
+        if graph.generation == manifest.generation:
+            return graph
+        connection = graph._connection
+
+        changed = {}
+        for entry in delta.added + delta.modified:
+            path = entry.relative_path.replace(os.sep, "/")
+            if LANGUAGES.get(os.path.splitext(path)[1].lower()) is not None:
+                changed[path] = entry
+        deleted = {relative_path.replace(os.sep, "/") for relative_path in delta.deleted}
+        deleted = {path for path in deleted if LANGUAGES.get(os.path.splitext(path)[1].lower()) is not None}
+        old_keys = {path: {key for key, in connection.execute("SELECT key FROM provides WHERE path = ?", (path,))}
+                    for path in list(changed) + list(deleted)}
+
+        symbols = {}
+        pending = []
+        for path, entry in changed.items():
+            if entry.size > MAX_PARSED_FILE_BYTES:
+                symbols[path] = {"imports": [], "defs": []}
+                continue
+            old = connection.execute("SELECT hash FROM files WHERE path = ?", (path,)).fetchone()
+            pending.append((path, old[0] if old is not None else None))
+        hashes = {}
+        for path, digest, parsed in cls._parse(graph.folder_path, pending, max_workers):
+            hashes[path] = digest
+            symbols[path] = parsed if parsed is not None else graph._symbols(path)
+
+        # Keys whose providers changed: every key of added and deleted files, and the keys a
+        # modified file gained or lost
+        new_keys = {path: _provided_keys(path, symbols[path]) for path in changed}
+        touched = set()
+        for path in changed:
+            touched.update(old_keys[path].symmetric_difference(key for key, _ in new_keys[path]))
+        for path in deleted:
+            touched.update(old_keys[path])
+        dependency_keys = sorted({_dependency_key(key) for key in touched})
+
+        connection.execute("BEGIN")
+        for path in list(changed) + list(deleted):
+            connection.execute("DELETE FROM provides WHERE path = ?", (path,))
+        for path in deleted:
+            connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            connection.execute("DELETE FROM depends WHERE path = ?", (path,))
+        for path, entry in changed.items():
+            connection.executemany("INSERT INTO provides VALUES (?, ?, ?)",
+                                   [(key, path, rank) for key, rank in new_keys[path]])
+            connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                               (path, entry.size, entry.mtime, hashes.get(path), json.dumps(symbols[path]), "[]"))
+
+        affected = set(changed)
+        for start in range(0, len(dependency_keys), _SQL_BATCH):
+            batch = dependency_keys[start:start + _SQL_BATCH]
+            affected.update(path for path, in connection.execute(
+                f"SELECT path FROM depends WHERE key IN ({','.join('?' * len(batch))})", batch))
+        affected -= deleted
+        resolver = _Resolver(lambda key: connection.execute(
+            "SELECT rank, path FROM provides WHERE key = ? ORDER BY path", (key,)).fetchall())
+        imports_by_path = {}
+        for path in sorted(affected):
+            imports = imports_by_path[path] = resolver.resolve(path, symbols.get(path) or graph._symbols(path))
+            connection.execute("UPDATE files SET imports = ? WHERE path = ?", (json.dumps(imports), path))
+            connection.execute("DELETE FROM depends WHERE path = ?", (path,))
+            connection.executemany("INSERT INTO depends VALUES (?, ?)", [(path, key) for key in resolver.depends_on])
+        connection.execute("COMMIT")
+
+        # Files that were not resolved again keep their edges
+        for file_id, path in enumerate(graph.files):
+            if path not in affected and path not in deleted:
+                imports_by_path[path] = [graph.files[target] for target in
+                                         graph._targets[graph._offsets[file_id]:graph._offsets[file_id + 1]]]
+        files = sorted(imports_by_path)
+        ids = {path: file_id for file_id, path in enumerate(files)}
+        offsets = array("i", [0])
+        targets = array("i")
+        for path in files:
+            targets.extend(ids[target] for target in imports_by_path[path])
+            offsets.append(len(targets))
+        graph.generation = manifest.generation
+        graph._save(files, offsets, targets)
+        return graph
+
+    @staticmethod
+    def _parse(folder_path, pending, max_workers):
+        if len(pending) < PARALLEL_MIN_FILES or max_workers == 1:
+            return _parse_batch(folder_path, pending)
+        batches = [pending[start:start + PARSE_BATCH_FILES] for start in range(0, len(pending), PARSE_BATCH_FILES)]
+        # Graphs are built on scan job and Streamlit threads; forking a multi-threaded process can
+        # copy locks held by other threads into the workers, so workers are spawned instead
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                return [result for batch in pool.map(_parse_batch, [folder_path] * len(batches), batches)
+                        for result in batch]
+        except BrokenProcessPool:
+            # Workers could not start, e.g. when __main__ cannot be imported again; parse here
+            return _parse_batch(folder_path, pending)
+
+    # Write the adjacency arrays with the graph's generation and install them
+    def _save(self, files, offsets, targets):
+        atomic_write_text(os.path.join(self.directory, GRAPH_FILE), json.dumps({
+            "version": GRAPH_VERSION,
+            "generation": self.generation,
+            "files": files,
+            "offsets": offsets.tolist(),
+            "targets": targets.tolist(),
+        }, separators=(",", ":")))
+        self._set(files, offsets, targets)
+
+    # Install the forward adjacency arrays and derive the reverse ones
+    def _set(self, files, offsets, targets):
+        self.files = files
+        self._ids = {path: file_id for file_id, path in enumerate(files)}
+        self._offsets = offsets
+        self._targets = targets
+        counts = [0] * (len(files) + 1)
+        for target in targets:
+            counts[target + 1] += 1
+        for file_id in range(len(files)):
+            counts[file_id + 1] += counts[file_id]
+        reverse = array("i", bytes(4 * len(targets)))
+        filled = counts[:-1]
+        for source in range(len(files)):
+            for position in range(offsets[source], offsets[source + 1]):
+                target = targets[position]
+                reverse[filled[target]] = source
+                filled[target] += 1
+        self._reverse_offsets = array("i", counts)
+        self._reverse_targets = reverse
+        self.approx_bytes = 4 * (2 * len(targets) + 2 * len(files)) + sum(_BYTES_PER_FILE + len(path) for path in files)
+
+    # Parsed symbols of a file, read from symbols.sqlite when a prompt or a resolution needs them
+    def _symbols(self, relative_path):
+        if self._connection is None:
+            return {}
+        with self._lock:
+            row = self._connection.execute("SELECT symbols FROM files WHERE path = ?",
+                                           (relative_path.replace(os.sep, "/"),)).fetchone()
+        return json.loads(row[0]) if row is not None else {}
+
+    def _neighbours(self, relative_path, offsets, targets):
+        file_id = self._ids.get(relative_path.replace(os.sep, "/"))
+        if file_id is None:
+            return []
+        paths = [self.files[target] for target in targets[offsets[file_id]:offsets[file_id + 1]]]
+        return paths if os.sep == "/" else [path.replace("/", os.sep) for path in paths]
+
+    def imports_of(self, relative_path):
+        """Files of the folder the given file imports, in import order."""
+        return self._neighbours(relative_path, self._offsets, self._targets)
+
+    def importers_of(self, relative_path):
+        """Files of the folder that import the given file, sorted."""
+        return self._neighbours(relative_path, self._reverse_offsets, self._reverse_targets)
+
+    def definitions(self, relative_path):
+        """Top-level definitions of a file as [name, kind, line, signature] lists."""
+        return self._symbols(relative_path).get("defs", [])
+
+    def context_for(self, relative_path, token_budget=600, count_tokens=None):
+        """
+        Render the file's neighbourhood as prompt context, stopping at token_budget: the files
+        it imports with the definitions it uses from them, then the files that import it.
+
+        Args:
+            relative_path (str): File the prompt is about
+            token_budget (int): Maximum tokens of context to return
+            count_tokens (callable): Token counter, defaults to a 4-characters-per-token estimate
+
+        Returns:
+            str: Markdown lines, or an empty string when the file has no known neighbours
+        """
+        count_tokens = count_tokens or (lambda text: len(text) // 4)
+        record = self._symbols(relative_path)
+        # Names the file imports or references; definitions with these names are shown first
+        wanted = {name for _, names in record.get("imports", []) for name in names}
+        wanted.update(record.get("refs", []))
+
+        lines = []
+        used = 0
+
+        def add(line):
+            nonlocal used
+            tokens = count_tokens(line)
+            if used + tokens > token_budget:
+                return False
+            lines.append(line)
+            used += tokens
+            return True
+
+        imports = self.imports_of(relative_path)
+        if imports and add(f"Imports of `{relative_path}` within the repository:"):
+            for target in imports:
+                definitions = self.definitions(target)
+                used_definitions = [definition for definition in definitions
+                                    if definition[0] in wanted or definition[0].split(".")[0] in wanted]
+                shown = (used_definitions or definitions)[:DEFINITIONS_PER_NEIGHBOUR]
+                described = "; ".join(f"`{signature}` (line {line})" for _, _, line, signature in shown)
+                if not add(f"- `{target}`" + (f": {described}" if described else "")):
+                    break
+        importers = self.importers_of(relative_path)
+        if importers:
+            add(f"Files importing `{relative_path}`:")
+            for position, source in enumerate(importers):
+                if not add(f"- `{source}`"):
+                    if position:
+                        lines.append(f"- and {len(importers) - position} more")
+                    break
+        return "\n".join(lines)
@@ -0,0 +1,232 @@
+import codecs
+import mmap
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from utility.telemetry import get_telemetry
+
+# Bytes inspected to tell binary from text and guess the encoding
+SNIFF_BYTES = 8192
+# Files at least this large are read through mmap
+MMAP_THRESHOLD = 1024 * 1024
+# Bytes shown per page of the file viewer
+PAGE_BYTES = 256 * 1024
+# Longest text handed to the agents; the rest of a bigger file is cut off with a note
+MAX_TEXT_BYTES = 4 * 1024 * 1024
+# Decoded characters kept in the LRU cache across all files
+MAX_CACHED_CHARS = 64 * 1024 * 1024
+# Sniffed FileInfo records kept in their own LRU cache
+MAX_CACHED_INFOS = 4096
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# Control bytes that do not occur in text files
+_BINARY_BYTES = bytes(range(0, 9)) + bytes(range(14, 32))
+
+# What a prefix sniff says about a file; encoding is None for binary files
+FileInfo = namedtuple("FileInfo", ["path", "size", "mtime_ns", "encoding", "binary"])
+# One page of a file: its text, 1-based page number, page count and byte range
+FilePage = namedtuple("FilePage", ["text", "page", "pages", "start", "end"])
+
+
+class UnreadableFile(Exception):
+    """Raised by read_text for binary files and files that cannot be read; the message says which."""
+
+
+def sniff_encoding(prefix, complete=False):
+    """
+    Guess how to decode a file from its first bytes.
+
+    Args:
+        prefix (bytes): Start of the file
+        complete (bool): The prefix is the whole file
+
+    Returns:
+        str | None: Codec name, or None if the file looks binary
+    """
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    if b"\0" in prefix or len(prefix.translate(None, _BINARY_BYTES)) < len(prefix) * 0.9:
+        return None
+    try:
+        prefix.decode("utf-8")
+    except UnicodeDecodeError as error:
+        # A multi-byte character cut off by the end of the prefix is still UTF-8
+        if complete or error.reason != "unexpected end of data":
+            return "cp1252"
+    return "utf-8"
+
+
+class FileContentReader:
+    """
+    Reads scanned files for the UI and the agents, decoding each one once.
+
+    Decoded text is cached under (path, mtime, size) in an LRU bounded by max_cached_chars,
+    so the tabs of one rerun, and later reruns, reuse it until the file changes; sniffed file
+    info is kept in an LRU of max_cached_infos entries. Binary files are recognised from a
+    prefix and never decoded, undecodable bytes are replaced instead of failing, and large
+    files are read page by page through mmap.
+    """
+
+    def __init__(self, max_cached_chars=MAX_CACHED_CHARS, max_text_bytes=MAX_TEXT_BYTES,
+                 max_cached_infos=MAX_CACHED_INFOS):
+        self.max_cached_chars = max_cached_chars
+        self.max_text_bytes = max_text_bytes
+        self.max_cached_infos = max_cached_infos
+        self._texts = OrderedDict()
+        self._cached_chars = 0
+        self._infos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def info(self, path):
+        """Size, modification time and sniffed encoding of a file; raises OSError if unreadable."""
+        stat = os.stat(path)
+        with self._lock:
+            info = self._infos.get(path)
+            if info is not None and info.mtime_ns == stat.st_mtime_ns and info.size == stat.st_size:
+                self._infos.move_to_end(path)
+                return info
+        with open(path, "rb") as f:
+            prefix = f.read(SNIFF_BYTES)
+        encoding = sniff_encoding(prefix, complete=len(prefix) == stat.st_size)
+        info = FileInfo(path, stat.st_size, stat.st_mtime_ns, encoding, encoding is None)
+        with self._lock:
+            self._infos[path] = info
+            self._infos.move_to_end(path)
+            while len(self._infos) > self.max_cached_infos:
+                self._infos.popitem(last=False)
+        return info
+
+    def read_text(self, path):
+        """
+        Decoded text of a file, at most max_text_bytes of it.
+
+        Returns:
+            str: File text
+
+        Raises:
+            UnreadableFile: The file is binary or cannot be read
+        """
+        try:
+            info = self.info(path)
+        except OSError as e:
+            raise UnreadableFile(f"Error reading file: {e}") from e
+        if info.binary:
+            raise UnreadableFile(f"Binary file ({info.size:,} bytes), content not shown.")
+
+        key = (path, info.mtime_ns, info.size)
+        telemetry = get_telemetry()
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+                telemetry.increment("file_cache.hits")
+                return text
+        telemetry.increment("file_cache.misses")
+
+        try:
+            with telemetry.span("file.read", bytes=min(info.size, self.max_text_bytes)):
+                text = self._decode(info, 0, min(info.size, self.max_text_bytes))
+        except OSError as e:
+            raise UnreadableFile(f"Error reading file: {e}") from e
+        if info.size > self.max_text_bytes:
+            text += f"\n\n[... truncated: showing the first {self.max_text_bytes} of {info.size} bytes ...]"
+
+        with self._lock:
+            if key not in self._texts:
+                self._texts[key] = text
+                self._cached_chars += len(text)
+            while self._cached_chars > self.max_cached_chars and len(self._texts) > 1:
+                _, evicted = self._texts.popitem(last=False)
+                self._cached_chars -= len(evicted)
+        return text
+
+    def page_count(self, info, page_bytes=PAGE_BYTES):
+        return max(1, -(-info.size // page_bytes))
+
+    def read_page(self, path, page=1, page_bytes=PAGE_BYTES):
+        """
+        Read one page of a text file without decoding the rest of it.
+
+        Pages are page_bytes long, extended to the end of their last line so no line is split;
+        a line longer than a page makes the pages it spans come back empty.
+
+        Args:
+            path (str): File path
+            page (int): 1-based page number
+            page_bytes (int): Nominal page size in bytes
+
+        Returns:
+            FilePage: The page text and its position in the file
+        """
+        info = self.info(path)
+        pages = self.page_count(info, page_bytes)
+        page = min(max(page, 1), pages)
+        if info.encoding.startswith(("utf-16", "utf-32")):
+            # Newlines are not single bytes here, so page the (capped) decoded text instead
+            text = self.read_text(path)
+            start = (page - 1) * page_bytes
+            return FilePage(text[start:start + page_bytes], page, pages, start, min(start + page_bytes, len(text)))
+
+        with open(path, "rb") as f:
+            if info.size < MMAP_THRESHOLD:
+                data = f.read()
+            else:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                start = self._line_boundary(data, (page - 1) * page_bytes)
+                end = self._line_boundary(data, page * page_bytes)
+                text = data[start:end].decode(info.encoding, errors="replace")
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        return FilePage(text, page, pages, start, end)
+
+    # The offset just after the first newline at or after offset (0 and the file end stay)
+    def _line_boundary(self, data, offset):
+        if offset <= 0:
+            return 0
+        if offset >= len(data):
+            return len(data)
+        newline = data.find(b"\n", offset - 1)
+        return len(data) if newline == -1 else newline + 1
+
+    def _decode(self, info, start, end):
+        with open(info.path, "rb") as f:
+            if info.size < MMAP_THRESHOLD:
+                f.seek(start)
+                data = f.read(end - start)
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    data = mapped[start:end]
+        # An incremental decoder holds back a multibyte character cut off at end instead of
+        # replacing its first bytes
+        decoder = codecs.getincrementaldecoder(info.encoding)(errors="replace")
+        return decoder.decode(data, final=end >= info.size)
+
+    def clear(self):
+        with self._lock:
+            self._texts.clear()
+            self._cached_chars = 0
+            self._infos.clear()
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+# Process-wide reader, so every session and worker shares one cache
+def get_content_reader():
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = FileContentReader()
+    return _reader
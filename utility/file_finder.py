@@ -0,0 +1,294 @@
+import bisect
+import os
+import re
+from array import array
+from collections import Counter, namedtuple
+from itertools import accumulate, chain, islice
+
+from utility.file_selection import glob_pattern
+from utility.telemetry import get_telemetry
+
+# Results shown per page in the sidebar
+PAGE_SIZE = 50
+# Matches collected per ranking tier; past this the count is reported as a lower bound
+MAX_MATCHES = 1000
+# Fuzzy matches collected for ranking; fuzzy is the last and slowest tier
+FUZZY_MATCHES = 200
+# Candidate names the fuzzy tier checks in full before it stops and reports a lower bound
+FUZZY_CANDIDATES = 2000
+
+_GLOB_CHARS = frozenset("*?[")
+# Sorts after every character that can appear in a path
+_PATH_END = "\U0010ffff"
+
+# One page of ranked search results; capped is True when total is only a lower bound
+FinderPage = namedtuple("FinderPage", ["paths", "total", "capped"])
+
+
+# Subsequence match: every character is found by scanning to its first occurrence, and each
+# lookahead/backreference pair makes that scan atomic, so a failed attempt costs one pass
+def _subsequence_regex(chars, start=""):
+    parts = [start]
+    for number, char in enumerate(re.escape(char) for char in chars):
+        parts.append(f"(?=(?P<g{number}>[^\n{char}]*))(?P=g{number}){char}")
+    return re.compile("".join(parts))
+
+
+class _LineIndex:
+    """
+    Lines joined into one newline-delimited string with their start offsets, so a query is a
+    single regex scan in C instead of a Python loop over every line. The text also starts with
+    a newline, so "\\n" at the start of a pattern anchors it to the start of a line.
+    """
+
+    def __init__(self, lines):
+        self.text = "\n" + "\n".join(lines) + "\n"
+        self.starts = array("q", accumulate(chain((1,), map((1).__add__, map(len, lines)))))
+
+    def containing(self, literal):
+        """
+        Yield the lines containing a literal, in order, as (line number, offset) pairs.
+
+        str.find is several times faster than a regex scan for a plain substring, and the
+        search resumes at the next line once a line matched.
+        """
+        find = self.text.find
+        starts = self.starts
+        position = find(literal)
+        while position != -1:
+            line = bisect.bisect_right(starts, position) - 1
+            yield line, position
+            if line + 1 >= len(starts):
+                return
+            position = find(literal, starts[line + 1])
+
+    def lines(self, regex, skip=0):
+        """
+        Yield the lines matched by a regex, in order, as (line number, match) pairs.
+
+        Args:
+            regex: Compiled pattern over self.text
+            skip (int): Characters the match starts before its line (1 for a leading newline)
+        """
+        last = -1
+        for match in regex.finditer(self.text):
+            line = bisect.bisect_right(self.starts, match.start() + skip) - 1
+            if line != last:
+                last = line
+                yield line, match
+
+
+# Lowercase a list of paths in one pass, with "/" as the separator
+def _lowered(paths, sep):
+    if not paths:
+        return []
+    text = "\n".join(paths).lower()
+    if sep != "/":
+        text = text.replace(sep, "/")
+    return text.split("\n")
+
+
+class FileFinder:
+    """
+    Search index and lazily expanded tree over the relative paths of one scan.
+
+    The index holds every file name once and every directory that contains files once, so
+    queries are regex scans over those two texts and never loop over the paths in Python.
+    Plain queries rank file names that start with the query, then file names containing it,
+    then files in directories containing it, then file names containing its characters in
+    order (fuzzy). Queries with a "/" match anywhere in the path, and queries with *, ? or
+    [...] are globs, matched against the file name unless they contain a "/".
+
+    Args:
+        paths (list): Relative paths of the scanned files
+        sep (str): Path separator used in the paths
+    """
+
+    def __init__(self, paths, sep=os.sep):
+        with get_telemetry().span("finder.build", paths=len(paths)):
+            self._build(paths, sep)
+
+    def _build(self, paths, sep):
+        self.paths = sorted(paths)
+        self.sep = sep
+        lowered = _lowered(self.paths, sep)
+        # Line n of the name index is self.paths[n]
+        self._names = [path[path.rfind("/") + 1:] for path in lowered]
+        self._name_index = _LineIndex(self._names)
+        # The files of a directory and its subdirectories are a contiguous range of the sorted
+        # paths; lines end with "/" so globs and fragments can match up to the file name
+        self._directories = list(dict.fromkeys([path[:path.rfind(sep)] for path in self.paths if sep in path]))
+        self._directory_index = _LineIndex([directory + "/" for directory in _lowered(self._directories, sep)])
+        # Character frequencies from a sample of the names pick the rarest query character
+        self._char_counts = Counter(self._name_index.text[::97])
+        self._listings = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def search(self, query, limit=PAGE_SIZE):
+        """
+        Rank the paths matching a query.
+
+        Args:
+            query (str): Fuzzy text, a path fragment, or a glob
+            limit (int): Number of results to return
+
+        Returns:
+            FinderPage: The best `limit` paths and the number of matches
+        """
+        with get_telemetry().span("finder.search") as span:
+            page = self._search(query, limit)
+            span.set(matches=page.total)
+        return page
+
+    def _search(self, query, limit):
+        query = query.strip().lower().replace(self.sep, "/")
+        if not query:
+            return FinderPage(self.paths[:limit], len(self.paths), False)
+
+        ranked = []
+        seen = set()
+
+        def add(lines):
+            lines = list(islice(lines, MAX_MATCHES))
+            for line in sorted(lines, key=lambda line: len(self.paths[line])):
+                if line not in seen:
+                    seen.add(line)
+                    ranked.append(line)
+            return len(lines) >= MAX_MATCHES
+
+        if _GLOB_CHARS.intersection(query):
+            capped = add(self._glob(query))
+        elif "/" in query:
+            capped = add(self._paths_containing(query))
+        else:
+            names = list(islice(self._name_index.containing(query), MAX_MATCHES))
+            add(line for line, _ in names if self._names[line].startswith(query))
+            capped = add(line for line, _ in names)
+            # Later tiers only run while the page is not full, which keeps typing responsive;
+            # skipping one makes the total a lower bound
+            if len(ranked) >= limit:
+                capped = True
+            else:
+                capped = add(self._files_under(self._directory_index.containing(query))) or capped
+            if len(ranked) >= limit:
+                capped = True
+            else:
+                hits, fuzzy_capped = self._fuzzy_names(query)
+                capped = capped or fuzzy_capped
+                # Tighter matches first: "agpy" ranks "agent.py" above "a_long_page.py"
+                for line, _ in sorted(hits, key=lambda hit: hit[1]):
+                    add((line,))
+        return FinderPage([self.paths[line] for line in ranked[:limit]], len(ranked), capped)
+
+    def _fuzzy_names(self, query):
+        """
+        File names containing the characters of the query in order, as (line, span) pairs.
+
+        The regex engine only stops at the query's rarest character, checking the characters
+        after it; the few lines it finds are then checked in full. Starting from the first
+        character instead would stop at nearly every line for queries like "srvcs". At most
+        FUZZY_CANDIDATES lines are checked, so common characters cannot make one keystroke
+        loop over a large part of the names in Python.
+
+        Returns:
+            tuple: (hits, capped), capped being True when the scan stopped early
+        """
+        pivot = min(range(len(query)), key=lambda position: self._char_counts.get(query[position], 0))
+        candidates = _subsequence_regex(query[pivot + 1:], start=re.escape(query[pivot]))
+        full = _subsequence_regex(query[1:], start=re.escape(query[0]))
+        hits = []
+        for checked, (line, _) in enumerate(self._name_index.lines(candidates), 1):
+            match = full.search(self._names[line])
+            if match:
+                hits.append((line, match.end() - match.start()))
+                if len(hits) >= FUZZY_MATCHES:
+                    return hits, True
+            if checked >= FUZZY_CANDIDATES:
+                return hits, True
+        return hits, False
+
+    # Every file below the directories of the given directory index hits
+    def _files_under(self, directory_hits):
+        for line, _ in directory_hits:
+            prefix = self._directories[line] + self.sep
+            start = bisect.bisect_left(self.paths, prefix)
+            yield from range(start, bisect.bisect_left(self.paths, prefix + _PATH_END, start))
+
+    # Files directly inside the directories of the given directory index hits
+    def _files_in(self, directory_hits):
+        for line, _ in directory_hits:
+            yield from self._listing(self._directories[line])[1]
+
+    def _paths_containing(self, fragment):
+        """
+        Files whose path contains a fragment with a "/", in two parts: files below a directory
+        containing it, then files whose directory ends with the text before its last "/" and
+        whose name starts with the text after it.
+        """
+        yield from self._files_under(self._directory_index.lines(re.compile(re.escape(fragment))))
+        head, _, tail = fragment.rpartition("/")
+        if head:
+            directories = self._directory_index.lines(re.compile(re.escape(head + "/") + "(?=\n)"))
+            yield from (line for line in self._files_in(directories) if self._names[line].startswith(tail))
+        else:
+            # "/name" matches file names starting with "name" in any directory but the root
+            names = self._name_index.lines(re.compile("\n" + re.escape(tail)), skip=1)
+            yield from (line for line, _ in names if self.sep in self.paths[line])
+
+    def _glob(self, pattern):
+        """
+        Files matching a glob. Without a "/" it is matched against file names; otherwise its
+        directory part is matched against the directory index and its last part against the
+        names of the files directly in the matching directories.
+        """
+        head, slash, tail = pattern.rpartition("/")
+        if tail == "**":
+            head, tail = pattern, "*"
+        if not slash or head == "**":
+            # Starting with the newline before the line lets the regex engine jump between lines
+            regex = re.compile("\n" + glob_pattern(tail) + "(?=\n)")
+            yield from (line for line, _ in self._name_index.lines(regex, skip=1))
+            return
+        names = re.compile(glob_pattern(tail) + r"\Z")
+        if head:
+            regex = re.compile("\n" + glob_pattern(head + "/") + "(?=\n)")
+            candidates = self._files_in(self._directory_index.lines(regex, skip=1))
+        else:
+            candidates = self._listing("")[1]  # A leading "/" anchors the glob at the root
+        yield from (line for line in candidates if names.match(self._names[line]))
+
+    # Subdirectory names and the indexes of the files directly inside one directory
+    def _listing(self, directory):
+        listing = self._listings.get(directory)
+        if listing is not None:
+            return listing
+        prefix = directory + self.sep if directory else ""
+        subdirs, files = [], []
+        index = bisect.bisect_left(self.paths, prefix)
+        end = bisect.bisect_left(self.paths, prefix + _PATH_END)
+        while index < end:
+            name, sep, _ = self.paths[index][len(prefix):].partition(self.sep)
+            if sep:
+                # Jump over the whole subtree instead of visiting its files
+                subdirs.append(name)
+                index = bisect.bisect_left(self.paths, prefix + name + self.sep + _PATH_END, index, end)
+            else:
+                files.append(index)
+                index += 1
+        listing = self._listings[directory] = (subdirs, files)
+        return listing
+
+    def children(self, directory=""):
+        """
+        List one directory of the tree, computed on first expansion and then cached.
+
+        Args:
+            directory (str): Relative directory, "" for the root
+
+        Returns:
+            tuple: (subdirectory names, file paths) directly inside the directory
+        """
+        subdirs, files = self._listing(directory)
+        return subdirs, [self.paths[index] for index in files]
@@ -0,0 +1,362 @@
+import json
+import os
+import re
+from collections import Counter, namedtuple
+
+from utility.file_content import sniff_encoding
+
+# Per-directory ignore files, read in this order so rules in later files win
+IGNORE_FILES = (".gitignore", ".ignore")
+# Repository-wide excludes git keeps outside the tree, read before the root's ignore files
+GIT_INFO_EXCLUDE = os.path.join(".git", "info", "exclude")
+# Larger files are skipped: they are almost always generated, vendored or data
+DEFAULT_MAX_FILE_BYTES = 1 << 20
+# Files at least this large have their first bytes checked for binary, minified or generated content
+SNIFF_MIN_BYTES = 16 * 1024
+SNIFF_BYTES = 8192
+# Sniffed text whose lines average more characters than this is treated as minified
+MINIFIED_LINE_CHARS = 300
+# Example paths kept per reason in a skip report
+SKIP_EXAMPLES = 20
+
+# File names of bundles, lock files and generated sources, by the reason they are skipped
+GENERATED_NAME_GLOBS = {
+    "minified": ("*.min.js", "*.min.mjs", "*.min.css", "*-min.js", "*.bundle.js", "*-bundle.js", "*.bundle.css",
+                 "*.chunk.js", "*.map"),
+    "lockfile": ("package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock",
+                 "Pipfile.lock", "Cargo.lock", "composer.lock", "Gemfile.lock", "uv.lock", "go.sum",
+                 "packages.lock.json"),
+    "generated": ("*.designer.cs", "*.Designer.cs", "*.g.cs", "*.g.i.cs", "*.generated.*", "*.AssemblyInfo.cs",
+                  "*.AssemblyAttributes.cs", "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.pb.cc", "*.pb.h"),
+}
+
+# Why a file or directory was left out, as shown in skip reports
+SKIP_REASONS = {
+    "gitignored": "Matched a .gitignore or .ignore file",
+    "excluded": "Matched an exclude glob",
+    "not_included": "Matched no include glob",
+    "too_large": "Larger than the size limit",
+    "binary": "Binary content",
+    "minified": "Minified or bundled",
+    "lockfile": "Dependency lock file",
+    "generated": "Generated code",
+}
+
+# Markers code generators put near the top of the files they write
+_GENERATED_MARKERS = re.compile(
+    rb"<auto-generated|@generated|do not edit|code generated by|automatically generated|autogenerated",
+    re.IGNORECASE)
+_GENERATED_MARKER_BYTES = 2048
+_GLOB_CHARS = frozenset("*?[\\")
+
+# A file or directory of a listing that the selection policy left out
+SkipEntry = namedtuple("SkipEntry", ["name", "reason", "is_dir"])
+# Skipped files and directories of one reason across a scan, with a few example paths
+SkipSummary = namedtuple("SkipSummary", ["reason", "files", "dirs", "examples"])
+
+# Which files a scan keeps beyond the extension filter. include and exclude are tuples of globs;
+# without include globs every file is a candidate. heuristics turns on the size-independent
+# checks for minified, lock, generated and binary files.
+SelectionPolicy = namedtuple("SelectionPolicy",
+                             ["include", "exclude", "max_file_bytes", "use_ignore_files", "heuristics"],
+                             defaults=((), (), DEFAULT_MAX_FILE_BYTES, True, True))
+
+
+# Translate a glob into a regex fragment for one line; "*" and "?" stay within a path component,
+# "**" crosses directories and "**/" may also match no directory at all
+def glob_pattern(pattern):
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:[^\n]*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append("[^\n]*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/\n]*")
+        elif char == "?":
+            parts.append("[^/\n]")
+        elif char == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            parts.append("[^/\n" + body[1:] + "]" if body[0] in "!^" else "[" + body + "]")
+            i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
+
+
+# Parse comma- or newline-separated globs into a sorted tuple
+def parse_globs(globs_input):
+    return tuple(sorted({glob.strip() for glob in re.split(r"[,\n]", globs_input or "") if glob.strip()}))
+
+
+# Stable text form of a policy, stored in manifests so a different policy forces a full scan
+def policy_key(policy):
+    return None if policy is None else json.dumps(list(policy))
+
+
+# Split a gitignore-style glob into its regex, whether it is matched against the whole path from
+# its base directory (otherwise just the entry name, at any depth) and whether it only matches
+# directories
+def _glob_rule(glob):
+    dir_only = glob.endswith("/")
+    glob = glob.rstrip("/")
+    anchored = "/" in glob
+    return glob_pattern(glob.lstrip("/")), anchored, dir_only
+
+
+# One regex out of alternatives whose group name tells which label matched, or None when empty
+def _compile_alternatives(patterns_by_label):
+    groups = [f"(?P<{label}>{'|'.join(patterns)})" for label, patterns in patterns_by_label.items() if patterns]
+    return re.compile("|".join(groups)) if groups else None
+
+
+class GlobSet:
+    """
+    Labelled globs compiled for matching many entries quickly. Literal names are looked up in a
+    dictionary and "*suffix" globs checked with one str.endswith call; the remaining name globs
+    and the globs matched against whole paths are each folded into one regex, whose matching
+    group's name tells which label matched.
+
+    Args:
+        labelled_globs (iterable): (label, glob) pairs; labels must be valid identifiers
+    """
+
+    def __init__(self, labelled_globs):
+        self._exact = {}
+        self._suffixes = {}
+        names, paths = {}, {}
+        for label, glob in labelled_globs:
+            pattern, anchored, _ = _glob_rule(glob)
+            literal = glob.strip("/")
+            if anchored:
+                paths.setdefault(label, []).append(pattern)
+            elif not _GLOB_CHARS.intersection(literal):
+                self._exact.setdefault(literal, label)
+            elif literal.startswith("*") and not _GLOB_CHARS.intersection(literal[1:]):
+                self._suffixes.setdefault(literal[1:], label)
+            else:
+                names.setdefault(label, []).append(pattern)
+        self._suffix_tuple = tuple(self._suffixes)
+        self._names = _compile_alternatives(names)
+        self._paths = _compile_alternatives(paths)
+
+    def __bool__(self):
+        return bool(self._exact or self._suffixes) or self._names is not None or self._paths is not None
+
+    def match(self, path, name):
+        """The label of a glob matching the "/"-separated path or its last component name, or None."""
+        label = self._exact.get(name)
+        if label is not None:
+            return label
+        if self._suffix_tuple and name.endswith(self._suffix_tuple):
+            return next(label for suffix, label in self._suffixes.items() if name.endswith(suffix))
+        match = (self._names is not None and self._names.fullmatch(name)
+                 or self._paths is not None and self._paths.fullmatch(path))
+        return match.lastgroup if match else None
+
+
+class IgnoreRules:
+    """
+    The rules of the ignore files in one directory, matched against paths relative to it.
+
+    Lines follow gitignore syntax: "#" comments, "!" re-includes, a trailing "/" matches
+    directories only and a "/" anywhere else anchors the glob at the directory. Without any
+    "!" line the rules are folded into one GlobSet per entry kind; otherwise the last matching
+    rule decides, as in git.
+
+    Args:
+        base (str): Directory holding the ignore files, relative to the root with "/" separators
+        lines (list): Lines of its ignore files, in order
+    """
+
+    def __init__(self, base, lines):
+        self.base = base
+        self.prefix = base + "/" if base else ""
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated or line.startswith("\\"):
+                line = line[1:]
+            pattern, anchored, dir_only = _glob_rule(line)
+            self.rules.append((re.compile(pattern), anchored, dir_only, negated, line))
+        self.negations = any(negated for *_, negated, _ in self.rules)
+        if not self.negations:
+            self._files = GlobSet(("ignored", line) for _, _, dir_only, _, line in self.rules if not dir_only)
+            self._dirs = GlobSet(("ignored", line) for *_, line in self.rules)
+
+    def match(self, path, name, is_dir):
+        """
+        Whether a path below the directory is ignored: True or False when a rule decides, None
+        when no rule matches it.
+        """
+        if not self.negations:
+            return True if (self._dirs if is_dir else self._files).match(path, name) else None
+        for rule, anchored, dir_only, negated, _ in reversed(self.rules):
+            if (is_dir or not dir_only) and rule.fullmatch(path if anchored else name):
+                return not negated
+        return None
+
+
+# Read lines from a text file, or an empty list if it cannot be read
+def _read_lines(file_path):
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            return f.readlines()
+    except OSError:
+        return []
+
+
+# Binary, generated or minified, judged from the first bytes of a large file; None if it looks like source
+def sniff_file(file_path):
+    try:
+        with open(file_path, "rb") as f:
+            prefix = f.read(SNIFF_BYTES)
+    except OSError:
+        return None
+    if sniff_encoding(prefix, complete=len(prefix) < SNIFF_BYTES) is None:
+        return "binary"
+    if _GENERATED_MARKERS.search(prefix, 0, _GENERATED_MARKER_BYTES):
+        return "generated"
+    if len(prefix) > (prefix.count(b"\n") + 1) * MINIFIED_LINE_CHARS:
+        return "minified"
+    return None
+
+
+class FileSelector:
+    """
+    Applies a SelectionPolicy to the entries of a folder while it is walked.
+
+    Exclude globs and the generated-file name checks are compiled into a single GlobSet whose
+    matching group names the skip reason, so each file costs a couple of regex matches, one
+    dictionary lookup for its directory's ignore rules and, only when it is large, a read of
+    its first few kilobytes. Ignore files are loaded once per directory, the first time the walk (or a
+    lookup below it) reaches it; directories listed in parallel may share the selector.
+
+    Args:
+        root (str): Folder being scanned
+        policy (SelectionPolicy): What to keep
+    """
+
+    def __init__(self, root, policy):
+        self.root = root
+        self.policy = policy
+        excludes = policy.exclude
+        generated = []
+        if policy.heuristics:
+            generated = [(reason, glob) for reason, globs in GENERATED_NAME_GLOBS.items() for glob in globs]
+        self._include = GlobSet(("included", glob) for glob in policy.include)
+        self._dir_excludes = GlobSet(("excluded", glob) for glob in excludes)
+        self._file_excludes = GlobSet([("excluded", glob) for glob in excludes if not glob.endswith("/")]
+                                      + generated)
+        # Ignore rules in effect per directory, outermost first
+        self._chains = {}
+
+    def directory_rules(self, relative_dir, names=None):
+        """
+        The ignore rules that apply inside a directory, outermost first.
+
+        Args:
+            relative_dir (str): Directory relative to the root
+            names (container): Names in the directory if already listed, to skip opening missing files
+        """
+        chain = self._chains.get(relative_dir)
+        if chain is not None:
+            return chain
+        chain = ()
+        if self.policy.use_ignore_files:
+            if relative_dir:
+                chain = self.directory_rules(os.path.dirname(relative_dir))
+            dir_path = os.path.join(self.root, relative_dir)
+            lines = []
+            if not relative_dir and (names is None or ".git" in names):
+                lines.extend(_read_lines(os.path.join(dir_path, GIT_INFO_EXCLUDE)))
+            for name in IGNORE_FILES:
+                if names is None or name in names:
+                    lines.extend(_read_lines(os.path.join(dir_path, name)))
+            rules = IgnoreRules(relative_dir.replace(os.sep, "/"), lines) if lines else None
+            if rules is not None and rules.rules:
+                chain = chain + (rules,)
+        self._chains[relative_dir] = chain
+        return chain
+
+    def skip_directory(self, relative_path, rules):
+        """Why a directory should not be descended into, or None to walk it."""
+        path = relative_path if os.sep == "/" else relative_path.replace(os.sep, "/")
+        name = path[path.rfind("/") + 1:]
+        if self._dir_excludes and self._dir_excludes.match(path, name):
+            return "excluded"
+        if rules and self._ignored(path, name, True, rules):
+            return "gitignored"
+        return None
+
+    def skip_file(self, relative_path, size, rules):
+        """
+        Why a file with a selected extension should be left out, or None to keep it.
+
+        Args:
+            relative_path (str): File path relative to the root
+            size (int): File size in bytes
+            rules (tuple): directory_rules() of the file's directory
+        """
+        path = relative_path if os.sep == "/" else relative_path.replace(os.sep, "/")
+        name = path[path.rfind("/") + 1:]
+        if self._include and not self._include.match(path, name):
+            return "not_included"
+        reason = self._file_excludes.match(path, name) if self._file_excludes else None
+        if reason:
+            return reason
+        if rules and self._ignored(path, name, False, rules):
+            return "gitignored"
+        if size > self.policy.max_file_bytes:
+            return "too_large"
+        if self.policy.heuristics and size >= SNIFF_MIN_BYTES:
+            return sniff_file(os.path.join(self.root, relative_path))
+        return None
+
+    # The innermost ignore file with a matching rule decides
+    @staticmethod
+    def _ignored(path, name, is_dir, rules):
+        for ignore_rules in reversed(rules):
+            if ignore_rules.prefix and not path.startswith(ignore_rules.prefix):
+                continue
+            ignored = ignore_rules.match(path[len(ignore_rules.prefix):], name, is_dir)
+            if ignored is not None:
+                return ignored
+        return False
+
+
+def summarize_skipped(skipped_by_dir):
+    """
+    Count what a scan left out, by reason.
+
+    Args:
+        skipped_by_dir (iterable): (relative_dir, [SkipEntry]) pairs
+
+    Returns:
+        list: SkipSummary per reason, most skipped first
+    """
+    files, dirs = Counter(), Counter()
+    examples = {}
+    for relative_dir, skipped in skipped_by_dir:
+        for name, reason, is_dir in skipped:
+            (dirs if is_dir else files)[reason] += 1
+            reason_examples = examples.setdefault(reason, [])
+            if len(reason_examples) < SKIP_EXAMPLES:
+                path = os.path.join(relative_dir, name) if relative_dir else name
+                reason_examples.append(path + os.sep if is_dir else path)
+    reasons = sorted(examples, key=lambda reason: (-files[reason], -dirs[reason], reason))
+    return [SkipSummary(reason, files[reason], dirs[reason], sorted(examples[reason])) for reason in reasons]
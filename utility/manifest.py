@@ -0,0 +1,363 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import namedtuple
+from contextlib import closing
+
+from utility.cache_dir import get_cache_dir
+from utility.file_selection import FileSelector, SkipEntry, policy_key, summarize_skipped
+from utility.scanner import (DEFAULT_IGNORE_DIRS, DirListing, ScanEntry, iter_directory_listings, scan_directory,
+                             walk_parallel)
+from utility.telemetry import get_telemetry
+
+MANIFEST_VERSION = 2
+MANIFEST_FILE = "manifest.sqlite"
+# Subdirectory of the folder's cache directory holding one directory per scan settings
+SCANS_DIR = "scans"
+# How long a scan waits for another process writing the same manifest
+WRITE_TIMEOUT_SECONDS = 60
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS dirs (dir TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, subdirs TEXT NOT NULL, "
+    "skipped TEXT)",
+    "CREATE TABLE IF NOT EXISTS files (dir TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, "
+    "mtime REAL NOT NULL, ctime REAL NOT NULL, inode INTEGER NOT NULL, hash TEXT, PRIMARY KEY (dir, name)) "
+    "WITHOUT ROWID",
+)
+
+# Files added, modified (ScanEntry lists) and deleted (relative paths) since the previous scan, and
+# the manifest generation they are relative to (None when there was no previous scan)
+ManifestDelta = namedtuple("ManifestDelta", ["added", "modified", "deleted", "since"])
+
+# One directory refreshed on a walk worker: its DirListing, one (ScanEntry, files row,
+# "added"/"modified"/None) tuple per file whose row changed, the subdirectories the walk continues
+# with, the directory's new dirs row (None when unchanged) and the relative paths of its deleted files
+RefreshedDir = namedtuple("RefreshedDir", ["listing", "records", "subdirs", "dir_row", "deleted"])
+
+
+# Stream a file through blake2b so large files are never held in memory
+def hash_file(file_path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Row of the dirs table; skipped is only stored when the policy left something out
+def _dir_row(relative_dir, mtime_ns, subdirs, skipped):
+    return (relative_dir, mtime_ns, json.dumps(subdirs),
+            json.dumps([list(entry) for entry in skipped]) if skipped else None)
+
+
+# Row of the files table for a ScanEntry, keyed on its directory and name
+def _file_row(entry, content_hash=None):
+    relative_dir, name = os.path.split(entry.relative_path)
+    return (relative_dir, name, entry.size, entry.mtime, entry.ctime, entry.inode, content_hash)
+
+
+# Relative path of a file row's directory and name
+def _join(relative_dir, name):
+    return os.path.join(relative_dir, name) if relative_dir else name
+
+
+class Manifest:
+    """
+    Persistent record of a scanned folder used to make rescans incremental.
+
+    The manifest is an SQLite database with a row per directory (mtime, subdirectories and what
+    the selection policy left out) and a row per matching file (size, mtime, ctime, inode, content
+    hash). A full scan streams the rows in as directories are listed, and a refresh reads the rows
+    of one directory at a time, so neither holds the whole manifest in memory. A directory whose
+    mtime is unchanged had no entries added, removed or renamed, so its cached listing is reused
+    and only its known files are stat-ed. A file whose size changed is modified; one whose mtime
+    or inode changed at the same size is hashed and only reported as modified when its content
+    hash differs. A full scan reads no file contents, so a file it recorded has no hash yet: the
+    first same-size touch after a full scan is reported as modified and stores the hash the next
+    one is compared against. A refresh only writes the rows that changed.
+
+    generation identifies the scanned content: it is new for every full scan and changes on each
+    refresh that finds added, modified or deleted files, so results derived from a manifest can
+    be shared and reused for as long as its generation stays the same. The manifest lives in a
+    cache directory of its own for each combination of extensions, ignore names and selection
+    policy, next to the retrieval index and dependency graph built from it, which record the
+    generation they were built from.
+
+    With a SelectionPolicy, each directory also records what the policy left out of it. Files in
+    a reused listing keep the selection made when the directory was last listed, so editing an
+    ignore file or growing a file past the size limit takes effect once its directory changes
+    or on the next full scan.
+
+    Changes are written in one transaction that save() commits; close() discards them.
+    """
+
+    def __init__(self, folder_path, extensions=(), ignore=DEFAULT_IGNORE_DIRS, policy=None):
+        self.folder_path = os.path.abspath(folder_path)
+        self.extensions = sorted(extensions)
+        self.ignore = sorted(ignore)
+        self.policy = policy
+        # Scans of the folder with other extensions, ignore names or selection policy keep their own
+        # manifest, retrieval index and dependency graph
+        settings = json.dumps([self.extensions, self.ignore, policy_key(policy)])
+        self.directory = os.path.join(get_cache_dir(self.folder_path), SCANS_DIR,
+                                      hashlib.sha1(settings.encode("utf-8")).hexdigest()[:16])
+        self.generation = uuid.uuid4().hex
+        # Files in the manifest
+        self.file_count = 0
+        # Whether the manifest holds a previous scan that a refresh can compare against
+        self.loaded = False
+        self._writer = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, folder_path, extensions, ignore=DEFAULT_IGNORE_DIRS, policy=None):
+        """
+        Open the saved manifest for a folder, or an empty one when it is missing or was built
+        with different extensions, ignore settings or selection policy. Only its settings are
+        read; directory and file rows are read when needed.
+        """
+        manifest = cls(folder_path, extensions, ignore, policy)
+        if not os.path.exists(manifest.path):
+            return manifest
+        try:
+            with closing(manifest._connect()) as connection:
+                meta = {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM meta")}
+        except (sqlite3.DatabaseError, ValueError):
+            return manifest
+        if (meta.get("version") == MANIFEST_VERSION
+                and meta.get("extensions") == manifest.extensions
+                and meta.get("ignore") == manifest.ignore
+                and meta.get("selection") == policy_key(policy)):
+            manifest.generation = meta["generation"]
+            manifest.file_count = meta["files"]
+            manifest.loaded = True
+        return manifest
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=WRITE_TIMEOUT_SECONDS, isolation_level=None,
+                                     check_same_thread=False)
+        # Readers keep seeing the last saved manifest while a scan writes the next one
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    # The write transaction of this scan, started on first use; a full scan starts from empty tables
+    def _begin_write(self):
+        if self._writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            writer = self._connect()
+            for statement in _SCHEMA:
+                writer.execute(statement)
+            writer.execute("BEGIN IMMEDIATE")
+            if not self.loaded:
+                writer.execute("DELETE FROM files")
+                writer.execute("DELETE FROM dirs")
+            self._writer = writer
+        return self._writer
+
+    def save(self):
+        """Commit the scan's changes and its settings, generation and file count."""
+        writer = self._begin_write()
+        writer.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            (key, json.dumps(value)) for key, value in (
+                ("version", MANIFEST_VERSION),
+                ("root", self.folder_path),
+                ("extensions", self.extensions),
+                ("ignore", self.ignore),
+                ("selection", policy_key(self.policy)),
+                ("generation", self.generation),
+                ("files", self.file_count),
+            )])
+        writer.execute("COMMIT")
+        writer.close()
+        self._writer = None
+        self.loaded = True
+        return self.path
+
+    def close(self):
+        """Discard the changes that were not saved, e.g. when the scan was cancelled."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def selector(self):
+        """A FileSelector for the manifest's policy, or None without one."""
+        return FileSelector(self.folder_path, self.policy) if self.policy is not None else None
+
+    def add_listing(self, listing):
+        """Record a DirListing produced by a full scan."""
+        if listing.mtime_ns is None:
+            return
+        writer = self._begin_write()
+        writer.execute("INSERT INTO dirs VALUES (?, ?, ?, ?)",
+                       _dir_row(listing.relative_dir, listing.mtime_ns, listing.subdirs, listing.skipped))
+        writer.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", map(_file_row, listing.files))
+        self.file_count += len(listing.files)
+
+    def entries(self):
+        """Yield a ScanEntry for every file of the saved manifest, streamed from disk."""
+        if not os.path.exists(self.path):
+            return
+        with closing(self._connect()) as connection:
+            for relative_dir, name, size, mtime, ctime, inode in connection.execute(
+                    "SELECT dir, name, size, mtime, ctime, inode FROM files"):
+                yield ScanEntry(_join(relative_dir, name), size, mtime, ctime, inode)
+
+    def paths(self):
+        """Sorted relative paths of the files of the saved manifest."""
+        return sorted(entry.relative_path for entry in self.entries())
+
+    def skip_report(self):
+        """What the selection policy left out of the folder, as SkipSummary records by reason."""
+        if not os.path.exists(self.path):
+            return []
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT dir, skipped FROM dirs WHERE skipped IS NOT NULL")
+            return summarize_skipped((relative_dir, [SkipEntry(*skipped) for skipped in json.loads(skipped)])
+                                     for relative_dir, skipped in rows)
+
+    def refresh(self, on_progress=None, cancel_event=None):
+        """
+        Bring the manifest up to date with the folder on disk; save() commits the changes.
+
+        Args:
+            on_progress (callable): Called as on_progress(visited_dirs, discovered_dirs)
+            cancel_event (threading.Event): Once set, the refresh stops with ScanCancelled
+
+        Returns:
+            ManifestDelta: Files added, modified and deleted since the manifest was last refreshed
+        """
+        if not self.loaded:
+            # Nothing to compare against: run a full parallel scan, every file is new
+            added = []
+            for listing in iter_directory_listings(self.folder_path, self.extensions, self.ignore,
+                                                   on_progress=on_progress, cancel_event=cancel_event,
+                                                   selector=self.selector()):
+                self.add_listing(listing)
+                added.extend(listing.files)
+            return ManifestDelta(added, [], [], None)
+
+        extensions = frozenset(self.extensions)
+        ignore = frozenset(self.ignore)
+        selector = self.selector()
+        dir_rows = []
+        file_rows = []
+        added = []
+        modified = []
+        deleted = []
+        visited = set()
+        with closing(self._connect()) as reader:
+            refreshed = walk_parallel(
+                self.folder_path,
+                lambda relative_dir: self._refresh_directory(relative_dir, reader, extensions, ignore, selector),
+                on_progress=on_progress, cancel_event=cancel_event)
+            for listing, records, _, dir_row, deleted_files in refreshed:
+                if listing.mtime_ns is None:
+                    continue
+                visited.add(listing.relative_dir)
+                if dir_row is not None:
+                    dir_rows.append(dir_row)
+                for entry, row, status in records:
+                    file_rows.append(row)
+                    if status == "added":
+                        added.append(entry)
+                    elif status == "modified":
+                        modified.append(entry)
+                deleted.extend(deleted_files)
+
+            # Directories that are gone, or no longer reached, take their files with them
+            gone = [relative_dir for relative_dir, in reader.execute("SELECT dir FROM dirs")
+                    if relative_dir not in visited]
+            for relative_dir in gone:
+                deleted.extend(_join(relative_dir, name) for name, in reader.execute(
+                    "SELECT name FROM files WHERE dir = ?", (relative_dir,)))
+
+        if dir_rows or file_rows or deleted or gone:
+            writer = self._begin_write()
+            writer.executemany("DELETE FROM dirs WHERE dir = ?", [(relative_dir,) for relative_dir in gone])
+            writer.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)", dir_rows)
+            writer.executemany("DELETE FROM files WHERE dir = ? AND name = ?",
+                               [os.path.split(relative_path) for relative_path in deleted])
+            writer.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", file_rows)
+        self.file_count += len(added) - len(deleted)
+        since = self.generation
+        if added or modified or deleted:
+            self.generation = uuid.uuid4().hex
+        return ManifestDelta(added, modified, deleted, since)
+
+    def _refresh_directory(self, relative_dir, reader, extensions, ignore, selector):
+        """
+        Refresh one directory on a walk_parallel worker: reuse its cached listing when its mtime is
+        unchanged, list it again otherwise, and compare its files with their saved rows.
+
+        Returns:
+            RefreshedDir: The directory's listing (mtime_ns None when it is gone) and changed rows
+        """
+        dir_path = os.path.join(self.folder_path, relative_dir) if relative_dir else self.folder_path
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return RefreshedDir(DirListing(relative_dir, None, [], [], []), [], [], None, [])
+
+        with self._lock:
+            cached = reader.execute("SELECT mtime_ns, subdirs, skipped FROM dirs WHERE dir = ?",
+                                    (relative_dir,)).fetchone()
+            old_files = {row[0]: row[1:] for row in reader.execute(
+                "SELECT name, size, mtime, ctime, inode, hash FROM files WHERE dir = ?", (relative_dir,))}
+
+        dir_row = None
+        if cached is not None and cached[0] == mtime_ns:
+            entries = []
+            with get_telemetry().span("file.stat", in_recent=False) as span:
+                for name in old_files:
+                    relative_path = _join(relative_dir, name)
+                    try:
+                        stat = os.stat(os.path.join(self.folder_path, relative_path))
+                    except OSError:
+                        continue
+                    entries.append(ScanEntry(relative_path, stat.st_size, stat.st_mtime, stat.st_ctime,
+                                             stat.st_ino))
+                span.set(files=len(entries))
+            listing = DirListing(relative_dir, mtime_ns, entries, json.loads(cached[1]),
+                                 [SkipEntry(*skipped) for skipped in json.loads(cached[2] or "[]")])
+        else:
+            listing = scan_directory(self.folder_path, relative_dir, extensions, ignore, selector)
+            if listing.mtime_ns is None:
+                return RefreshedDir(listing, [], [], None, [])
+            dir_row = _dir_row(relative_dir, listing.mtime_ns, listing.subdirs, listing.skipped)
+            if cached is not None and tuple(cached) == dir_row[1:]:
+                dir_row = None
+
+        records = []
+        seen = set()
+        for entry in listing.files:
+            name = os.path.basename(entry.relative_path)
+            old = old_files.get(name)
+            status = None
+            content_hash = None
+            if old is None:
+                status = "added"
+            elif old[0] != entry.size:
+                status = "modified"
+            elif old[1] != entry.mtime or old[3] != entry.inode:
+                try:
+                    content_hash = hash_file(os.path.join(self.folder_path, entry.relative_path))
+                except OSError:
+                    continue
+                if old[4] != content_hash:
+                    status = "modified"
+            else:
+                content_hash = old[4]
+            seen.add(name)
+            row = _file_row(entry, content_hash)
+            if old is None or tuple(old) != row[2:]:
+                records.append((entry, row, status))
+        deleted = [_join(relative_dir, name) for name in old_files if name not in seen]
+        return RefreshedDir(listing, records, listing.subdirs, dir_row, deleted)
@@ -0,0 +1,91 @@
+import os
+from collections import namedtuple
+
+from utility.file_content import get_content_reader
+from utility.manifest import Manifest
+from utility.scanner import DEFAULT_IGNORE_DIRS, iter_directory_listings
+from utility.telemetry import get_telemetry
+
+# Default supported code file extensions
+DEFAULT_EXTENSIONS = {'.py', '.js', '.ts', '.html', '.css', '.java', '.cpp', '.cs'}
+
+# Sorted relative paths of the scanned files, the saved manifest, the rescan delta (None for full scans)
+# and the SkipSummary records of what the selection policy left out
+ScanResult = namedtuple("ScanResult", ["files", "manifest", "delta", "skipped"])
+
+
+# Parse comma-separated extensions ("py, .js") into a set of dotted suffixes, falling back to the defaults
+def parse_extensions(extensions_input):
+    extensions = set()
+    for ext in (extensions_input or "").split(','):
+        ext = ext.strip()
+        if ext and not ext.startswith('.'):
+            ext = '.' + ext
+        if ext:
+            extensions.add(ext)
+    return extensions or set(DEFAULT_EXTENSIONS)
+
+
+# Function to read file content, decoded once and cached until the file changes; raises
+# UnreadableFile for binary files and files that cannot be read
+def read_file_content(folder_path, relative_path):
+    return get_content_reader().read_text(os.path.join(folder_path, relative_path))
+
+
+def scan_folder(folder_path, extensions, ignore=DEFAULT_IGNORE_DIRS, on_progress=None, on_entry=None,
+                cancel_event=None, policy=None):
+    """
+    Scan a folder from scratch: walk it and save its manifest to the cache directory.
+
+    Args:
+        folder_path (str): Folder to scan
+        extensions (set): File suffixes to include
+        ignore (iterable): Directory and file names to prune
+        on_progress (callable): Called as on_progress(visited_dirs, discovered_dirs)
+        on_entry (callable): Called with each ScanEntry as soon as it is found
+        cancel_event (threading.Event): Once set, the scan stops with ScanCancelled and saves nothing
+        policy (SelectionPolicy): Ignore files, globs and heuristics to apply on top of the extensions
+
+    Returns:
+        ScanResult: Scanned files, the saved manifest and what was skipped
+    """
+    telemetry = get_telemetry()
+    manifest = Manifest(folder_path, extensions, ignore, policy)
+    try:
+        with telemetry.span("scan.walk", folder=folder_path) as span:
+            skipped_files = 0
+            for listing in iter_directory_listings(folder_path, extensions, ignore, on_progress=on_progress,
+                                                   cancel_event=cancel_event, selector=manifest.selector()):
+                manifest.add_listing(listing)  # Streamed into the manifest so later rescans are incremental
+                skipped_files += sum(not skip.is_dir for skip in listing.skipped)
+                if on_entry:
+                    for entry in listing.files:
+                        on_entry(entry)
+            span.set(files=manifest.file_count, skipped=skipped_files)
+
+        with telemetry.span("scan.manifest_save", folder=folder_path):
+            manifest.save()
+    finally:
+        manifest.close()
+    return ScanResult(manifest.paths(), manifest, None, manifest.skip_report())
+
+
+def rescan_folder(folder_path, extensions, ignore=DEFAULT_IGNORE_DIRS, on_progress=None, cancel_event=None,
+                  policy=None):
+    """
+    Rescan only what changed since the last scan, using the saved manifest.
+
+    Returns:
+        ScanResult: Scanned files, the refreshed manifest and the added/modified/deleted delta
+    """
+    telemetry = get_telemetry()
+    manifest = Manifest.load(folder_path, extensions, ignore, policy)
+    try:
+        with telemetry.span("scan.rescan", folder=folder_path) as span:
+            delta = manifest.refresh(on_progress=on_progress, cancel_event=cancel_event)
+            span.set(added=len(delta.added), modified=len(delta.modified), deleted=len(delta.deleted))
+        with telemetry.span("scan.manifest_save", folder=folder_path):
+            manifest.save()
+    finally:
+        manifest.close()
+    return ScanResult(manifest.paths(), manifest, delta, manifest.skip_report())
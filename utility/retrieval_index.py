@@ -0,0 +1,434 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import sqlite3
+import uuid
+from array import array
+from collections import Counter
+from contextlib import closing
+
+from utility.cache_dir import atomic_write_text
+from utility.telemetry import get_telemetry
+
+INDEX_VERSION = 2
+SEGMENTS_FILE = "segments.sqlite"
+PATCH_FILE = "patch.json"
+CHUNK_LINES = 40
+CHUNK_OVERLAP = 5
+MAX_INDEXED_FILE_BYTES = 1 << 20  # Larger files are almost always generated or vendored
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Share of the compiled chunks the patch layer may reach, counting the compiled chunks it replaces,
+# before a rescan compiles it into the postings
+COMPACT_SHARE = 0.1
+# Measured Python object cost of one loaded chunk record and one vocabulary entry, on top of
+# the path and term text; the postings are memory-mapped and not counted
+_BYTES_PER_CHUNK = 180
+_BYTES_PER_TERM = 200
+# Cost of one (chunk id, frequency) pair of the patch layer, which is held in memory
+_BYTES_PER_PATCH_POSTING = 64
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL_PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+_STOP_WORDS = frozenset({
+    "the", "and", "for", "not", "with", "this", "that", "from", "return", "self", "none", "true",
+    "false", "if", "else", "in", "is", "of", "to", "a", "an", "or", "as", "be", "it", "on", "var",
+    "let", "const", "new", "int", "str", "def", "import", "function", "public", "private", "static",
+    "void",
+})
+
+
+# Split source text into lowercase search terms: whole identifiers plus their camel/snake parts
+def tokenize(text):
+    terms = []
+    for identifier in _IDENTIFIER.findall(text):
+        lowered = identifier.lower()
+        if len(lowered) > 1 and lowered not in _STOP_WORDS:
+            terms.append(lowered)
+        parts = [part.lower() for chunk in identifier.split("_") for part in _CAMEL_PART.findall(chunk)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if len(part) > 1 and part not in _STOP_WORDS)
+    return terms
+
+
+# Split a file into overlapping line windows with their term frequencies
+def chunk_file(text):
+    lines = text.splitlines()
+    chunks = []
+    step = CHUNK_LINES - CHUNK_OVERLAP
+    for start in range(0, max(len(lines), 1), step):
+        window = lines[start:start + CHUNK_LINES]
+        terms = tokenize("\n".join(window))
+        if terms:
+            chunks.append([start + 1, start + len(window), len(terms), dict(Counter(terms))])
+        if start + CHUNK_LINES >= len(lines):
+            break
+    return chunks
+
+
+class RetrievalIndex:
+    """
+    BM25 index over line chunks of the scanned code files, stored in the scan's cache directory
+    with the manifest generation it was built from.
+
+    Per-file chunk statistics are kept in segments.sqlite keyed on the file's size and mtime, so
+    only new or changed files are read again. They are compiled into vocab.json and chunks.json
+    plus a memory-mapped postings.bin of (chunk id, term frequency) int32 pairs, so the postings
+    never have to be loaded into memory.
+
+    After a rescan only the delta is indexed: the chunks of added and modified files go to a small
+    patch layer (patch.json) that is searched next to the compiled postings, and the compiled
+    chunks of modified and deleted files stop counting, in the scores and in the document
+    frequencies and average chunk length. The patch layer is compiled into the postings once it
+    outgrows COMPACT_SHARE of the compiled chunks.
+    """
+
+    def __init__(self, folder_path, directory):
+        self.folder_path = os.path.abspath(folder_path)
+        self.directory = os.path.join(directory, "retrieval")
+        # Manifest generation the index was built from
+        self.generation = None
+        self.vocab = {}
+        # [relative_path, start_line, end_line, length] of the compiled chunks, then the patch chunks
+        self.chunks = []
+        self.average_length = 0.0
+        # Estimated memory held by the loaded chunks, vocabulary and patch layer
+        self.approx_bytes = 0
+        self._meta = {}
+        self._compiled_chunks = 0
+        self._live_chunks = 0
+        # Patch layer: paths whose compiled chunks are out of date, term -> [(chunk id, frequency)]
+        # of the patch chunks, their term counts, and the ids of the compiled chunks that no longer count
+        self._removed = set()
+        self._patch_postings = {}
+        self._patch_counts = []
+        self._dead = frozenset()
+        self._postings = None
+        self._postings_file = None
+        self._postings_map = None
+
+    @classmethod
+    def load(cls, manifest):
+        """
+        Open the index saved for a manifest's scan, or return None when it has not been built or
+        was built from another generation of the manifest.
+        """
+        index = cls._open(manifest)
+        if index is not None and index.generation != manifest.generation:
+            index.close()
+            return None
+        return index
+
+    # Open whatever index is saved for the manifest's scan, with its patch layer
+    @classmethod
+    def _open(cls, manifest):
+        index = cls(manifest.folder_path, manifest.directory)
+        meta_path = os.path.join(index.directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            return None
+        with open(os.path.join(index.directory, "vocab.json"), "r", encoding="utf-8") as f:
+            index.vocab = json.load(f)
+        with open(os.path.join(index.directory, "chunks.json"), "r", encoding="utf-8") as f:
+            index.chunks = json.load(f)
+        index._meta = meta
+        index._compiled_chunks = len(index.chunks)
+        index.generation = meta["generation"]
+        patch = None
+        try:
+            with open(os.path.join(index.directory, PATCH_FILE), "r", encoding="utf-8") as f:
+                patch = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+        # A patch left over from before the last compile does not apply
+        if patch is not None and patch.get("base") == meta["base"]:
+            index.generation = patch["generation"]
+            index._apply_patch(patch["removed"], patch["chunks"])
+        else:
+            index._apply_patch([], [])
+        index._open_postings()
+        return index
+
+    @classmethod
+    def build(cls, manifest, delta=None):
+        """
+        Build or incrementally update the index for the files of a saved manifest and open it.
+
+        Args:
+            manifest (Manifest): Saved manifest of the scan; its generation is recorded with the index
+            delta (ManifestDelta): Changes of the rescan that saved the manifest; when the saved index
+                was built from the generation the delta starts at, only the delta is indexed
+
+        Returns:
+            RetrievalIndex: The opened index
+        """
+        with get_telemetry().span("index.build", folder=manifest.folder_path) as span:
+            index = cls._patch(manifest, delta) if delta is not None and delta.since is not None else None
+            span.set(patched=index is not None)
+            if index is None:
+                index = cls._build(manifest)
+            span.set(chunks=len(index.chunks))
+        return index
+
+    @classmethod
+    def _build(cls, manifest):
+        index = cls(manifest.folder_path, manifest.directory)
+        index.generation = manifest.generation
+        with closing(index._connect_segments()) as segments:
+            segments.execute("BEGIN")
+            seen = set()
+            stale = []
+            for entry in manifest.entries():
+                seen.add(entry.relative_path)
+                row = segments.execute("SELECT size, mtime FROM segments WHERE path = ?",
+                                       (entry.relative_path,)).fetchone()
+                if row is None or row != (entry.size, entry.mtime):
+                    stale.append(entry)
+            index._index_files(segments, stale)
+            gone = [(path,) for path, in segments.execute("SELECT path FROM segments") if path not in seen]
+            segments.executemany("DELETE FROM segments WHERE path = ?", gone)
+            segments.execute("COMMIT")
+            index._compile(segments)
+        return index
+
+    @classmethod
+    def _patch(cls, manifest, delta):
+        """
+        Bring the saved index from the generation the delta starts at to the manifest's, reading
+        only the added and modified files. Returns None when the saved index is from another
+        generation, so the caller builds it instead.
+        """
+        index = cls._open(manifest)
+        if index is None or index.generation not in (delta.since, manifest.generation):
+            if index is not None:
+                index.close()
+            return None
+        if index.generation == manifest.generation:
+            return index
+        changed = delta.added + delta.modified
+        removed = {entry.relative_path for entry in changed}.union(delta.deleted)
+        with closing(index._connect_segments()) as segments:
+            segments.execute("BEGIN")
+            patched = index._index_files(segments, changed)
+            segments.executemany("DELETE FROM segments WHERE path = ?", [(path,) for path in delta.deleted])
+            segments.execute("COMMIT")
+
+            # Patch chunks of files that changed again are replaced, the others carry over
+            chunks = [chunk for chunk in index._patch_chunks() if chunk[0] not in removed]
+            for relative_path in sorted(patched):
+                chunks.extend([relative_path, *chunk] for chunk in patched[relative_path])
+            removed.update(index._removed)
+            index.generation = manifest.generation
+            index._apply_patch(sorted(removed), chunks)
+            if len(index._dead) + len(chunks) > COMPACT_SHARE * max(index._compiled_chunks, 1):
+                index._compile(segments)
+                return index
+        atomic_write_text(os.path.join(index.directory, PATCH_FILE), json.dumps({
+            "base": index._meta["base"],
+            "generation": index.generation,
+            "removed": sorted(removed),
+            "chunks": chunks,
+        }, separators=(",", ":")))
+        return index
+
+    def _connect_segments(self):
+        os.makedirs(self.directory, exist_ok=True)
+        connection = sqlite3.connect(os.path.join(self.directory, SEGMENTS_FILE), isolation_level=None)
+        connection.execute("CREATE TABLE IF NOT EXISTS segments (path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                           "mtime REAL NOT NULL, chunks TEXT NOT NULL)")
+        return connection
+
+    # Read and chunk the given ScanEntry files into segments; returns {relative_path: chunks}
+    def _index_files(self, segments, entries):
+        indexed = {}
+        for entry in entries:
+            text = None
+            if entry.size <= MAX_INDEXED_FILE_BYTES:
+                try:
+                    with open(os.path.join(self.folder_path, entry.relative_path), "r",
+                              encoding="utf-8", errors="replace") as f:
+                        text = f.read()
+                except OSError:
+                    pass
+            if text is None:
+                segments.execute("DELETE FROM segments WHERE path = ?", (entry.relative_path,))
+                continue
+            indexed[entry.relative_path] = chunk_file(text)
+            segments.execute("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?)",
+                             (entry.relative_path, entry.size, entry.mtime,
+                              json.dumps(indexed[entry.relative_path], separators=(",", ":"))))
+        return indexed
+
+    def _compile(self, segments):
+        # Gather postings per term, then lay them out contiguously in postings.bin
+        term_postings = {}
+        chunks = []
+        total_length = 0
+        for relative_path, segment in segments.execute("SELECT path, chunks FROM segments ORDER BY path"):
+            for start_line, end_line, length, term_counts in json.loads(segment):
+                chunk_id = len(chunks)
+                chunks.append([relative_path, start_line, end_line, length])
+                total_length += length
+                for term, count in term_counts.items():
+                    term_postings.setdefault(term, []).append((chunk_id, count))
+
+        self.close()
+        vocab = {}
+        postings = array("i")
+        for term, items in term_postings.items():
+            vocab[term] = [len(postings) // 2, len(items)]
+            for chunk_id, count in items:
+                postings.append(chunk_id)
+                postings.append(count)
+
+        postings_path = os.path.join(self.directory, "postings.bin")
+        tmp_path = postings_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            postings.tofile(f)
+        os.replace(tmp_path, postings_path)
+        atomic_write_text(os.path.join(self.directory, "vocab.json"), json.dumps(vocab, separators=(",", ":")))
+        atomic_write_text(os.path.join(self.directory, "chunks.json"), json.dumps(chunks, separators=(",", ":")))
+        self.vocab = vocab
+        self.chunks = chunks
+        self._compiled_chunks = len(chunks)
+        self._meta = {
+            "version": INDEX_VERSION,
+            "generation": self.generation,
+            "base": uuid.uuid4().hex,
+            "total_length": total_length,
+        }
+        self._apply_patch([], [])
+        atomic_write_text(os.path.join(self.directory, "meta.json"), json.dumps(self._meta))
+        patch_path = os.path.join(self.directory, PATCH_FILE)
+        if os.path.exists(patch_path):
+            os.remove(patch_path)
+        self._open_postings()
+
+    # Patch chunks as saved in patch.json: [relative_path, start_line, end_line, length, term counts]
+    def _patch_chunks(self):
+        return [chunk + [counts] for chunk, counts in zip(self.chunks[self._compiled_chunks:], self._patch_counts)]
+
+    # Install a patch layer on top of the compiled chunks and recompute the collection statistics
+    def _apply_patch(self, removed, chunks):
+        del self.chunks[self._compiled_chunks:]
+        self._removed = set(removed)
+        self._dead = frozenset(chunk_id for chunk_id, chunk in enumerate(self.chunks) if chunk[0] in self._removed)
+        total_length = self._meta.get("total_length", 0) - sum(self.chunks[chunk_id][3] for chunk_id in self._dead)
+        self._patch_postings = {}
+        self._patch_counts = []
+        for relative_path, start_line, end_line, length, term_counts in chunks:
+            chunk_id = len(self.chunks)
+            self.chunks.append([relative_path, start_line, end_line, length])
+            self._patch_counts.append(term_counts)
+            total_length += length
+            for term, count in term_counts.items():
+                self._patch_postings.setdefault(term, []).append((chunk_id, count))
+        self._live_chunks = len(self.chunks) - len(self._dead)
+        self.average_length = total_length / self._live_chunks if self._live_chunks else 0.0
+        self._estimate_size()
+
+    def _estimate_size(self):
+        self.approx_bytes = (sum(_BYTES_PER_CHUNK + len(chunk[0]) for chunk in self.chunks)
+                             + sum(_BYTES_PER_TERM + len(term) for term in self.vocab)
+                             + _BYTES_PER_PATCH_POSTING * sum(map(len, self._patch_postings.values())))
+
+    def _open_postings(self):
+        path = os.path.join(self.directory, "postings.bin")
+        if os.path.getsize(path) == 0:
+            self._postings = memoryview(b"").cast("i")
+            return
+        self._postings_file = open(path, "rb")
+        self._postings_map = mmap.mmap(self._postings_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._postings = memoryview(self._postings_map).cast("i")
+
+    def close(self):
+        if self._postings is not None:
+            self._postings.release()
+            self._postings = None
+        if self._postings_map is not None:
+            self._postings_map.close()
+            self._postings_map = None
+        if self._postings_file is not None:
+            self._postings_file.close()
+            self._postings_file = None
+
+    # (chunk id, frequency) pairs of a term's live chunks, compiled and patched
+    def _postings_of(self, term):
+        items = []
+        posting = self.vocab.get(term)
+        if posting is not None:
+            offset, count = posting
+            flat = self._postings[offset * 2:(offset + count) * 2]
+            items = list(zip(flat[0::2], flat[1::2]))
+            if self._dead:
+                items = [item for item in items if item[0] not in self._dead]
+        return items + self._patch_postings.get(term, [])
+
+    def search(self, query, top_k=5, exclude_path=None):
+        """
+        Rank chunks against a free-text query with BM25.
+
+        Returns:
+            list: (score, relative_path, start_line, end_line) tuples, best first
+        """
+        if not self._live_chunks:
+            return []
+        scores = {}
+        for term, query_count in Counter(tokenize(query)).items():
+            items = self._postings_of(term)
+            if not items:
+                continue
+            count = len(items)
+            idf = math.log(1 + (self._live_chunks - count + 0.5) / (count + 0.5))
+            for chunk_id, frequency in items:
+                length = self.chunks[chunk_id][3]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        results = []
+        for chunk_id, score in heapq.nlargest(top_k * 3, scores.items(), key=lambda item: item[1]):
+            relative_path, start_line, end_line, _ = self.chunks[chunk_id]
+            if relative_path == exclude_path:
+                continue
+            results.append((score, relative_path, start_line, end_line))
+            if len(results) == top_k:
+                break
+        return results
+
+    def context_for(self, query, token_budget=1500, top_k=8, exclude_path=None, count_tokens=None):
+        """
+        Render the best matching chunks as prompt context, stopping at token_budget.
+
+        Args:
+            query (str): Text to match, e.g. the user's question or the selected file's code
+            token_budget (int): Maximum tokens of context to return
+            top_k (int): Maximum number of chunks to consider
+            exclude_path (str): Relative path to leave out, usually the file already in the prompt
+            count_tokens (callable): Token counter, defaults to a 4-characters-per-token estimate
+
+        Returns:
+            str: Markdown snippets with their file and line range, or an empty string
+        """
+        count_tokens = count_tokens or (lambda text: len(text) // 4)
+        sections = []
+        used = 0
+        for _, relative_path, start_line, end_line in self.search(query, top_k, exclude_path):
+            try:
+                with open(os.path.join(self.folder_path, relative_path), "r",
+                          encoding="utf-8", errors="replace") as f:
+                    lines = f.read().splitlines()[start_line - 1:end_line]
+            except OSError:
+                continue
+            section = f"`{relative_path}` (lines {start_line}-{end_line}):\n```\n" + "\n".join(lines) + "\n```"
+            tokens = count_tokens(section)
+            if used + tokens > token_budget:
+                continue
+            sections.append(section)
+            used += tokens
+        return "\n\n".join(sections)
@@ -0,0 +1,187 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from utility.scan_registry import get_scan_registry, scan_key
+from utility.scanner import DEFAULT_IGNORE_DIRS, ScanCancelled
+
+# Minimum seconds between two progress updates a job publishes
+PROGRESS_INTERVAL = 0.25
+# Finished jobs kept so sessions can still collect their results
+KEEP_FINISHED_JOBS = 50
+# Paths of a running scan searched per keystroke; the finished scan's index covers the rest
+PARTIAL_SEARCH_LIMIT = 20000
+
+
+class ScanJob:
+    """
+    One scan or rescan of a folder running in the background.
+
+    state is "running", "done", "cancelled" or "failed". progress is (visited, discovered)
+    directories, published at most every PROGRESS_INTERVAL seconds. A full scan collects the
+    paths it finds in partial_files so they can be browsed before it ends; result is the
+    RegistryResult once it is done.
+    """
+
+    def __init__(self, folder_path, extensions, ignore, rescan, policy=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = scan_key(folder_path, extensions, ignore, policy)
+        self.folder_path = folder_path
+        self.extensions = set(extensions)
+        self.ignore = ignore
+        self.policy = policy
+        self.rescan = rescan
+        self.state = "running"
+        self.progress = (0, 1)
+        self.partial_files = []
+        self.result = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        # Sessions waiting for the job; it is cancelled when the last one lets go
+        self.owners = set()
+        self.future = None
+        self._reported_at = 0.0
+
+    @property
+    def running(self):
+        return self.state == "running"
+
+    @property
+    def percent(self):
+        visited, discovered = self.progress
+        return 100 if not self.running else min(int(visited / max(discovered, 1) * 100), 99)
+
+    def page(self, query="", limit=50):
+        """
+        Sorted page of the paths found so far, for browsing a running scan.
+
+        Only the first PARTIAL_SEARCH_LIMIT paths found are filtered by query, the scan stops
+        once the page is full, and only the page is sorted, so a rerun costs the same however
+        many files the scan has found.
+
+        Returns:
+            tuple: (up to limit sorted paths, whether more paths may match)
+        """
+        found = self.partial_files
+        query = query.lower()
+        searched = islice(found, PARTIAL_SEARCH_LIMIT)
+        matches = list(islice((path for path in searched if query in path.lower()), limit))
+        return sorted(matches), len(matches) >= limit or len(found) > PARTIAL_SEARCH_LIMIT
+
+    def _report(self, visited, discovered):
+        now = time.monotonic()
+        if now - self._reported_at >= PROGRESS_INTERVAL or visited >= discovered:
+            self._reported_at = now
+            self.progress = (visited, discovered)
+
+    def _add_entry(self, entry):
+        self.partial_files.append(entry.relative_path)
+
+
+class ScanJobManager:
+    """
+    Runs scans on a small worker pool, decoupled from the Streamlit script runs that start them.
+
+    Jobs have an ID sessions keep across reruns. Asking for a folder that is already being
+    scanned with the same extensions and selection policy returns the running job instead of
+    starting another one, whichever session asks. cancel() stops a job for everybody; release() only drops one
+    session's interest and stops the job once no session is waiting for it.
+
+    Args:
+        max_workers (int): Scans running at once
+        registry (ScanRegistry): Where results are shared, defaults to the process-wide registry
+    """
+
+    def __init__(self, max_workers=2, registry=None):
+        self.registry = registry
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, folder_path, extensions, ignore=DEFAULT_IGNORE_DIRS, rescan=False, owner=None, policy=None):
+        """
+        Start a scan (or an incremental rescan) in the background, or join the one already running.
+
+        Args:
+            owner (str): Session waiting for the job
+            policy (SelectionPolicy): Selection applied on top of the extensions
+
+        Returns:
+            ScanJob: The new or running job
+        """
+        key = scan_key(folder_path, extensions, ignore, policy)
+        with self._lock:
+            job = next((job for job in self._jobs.values() if job.key == key and job.running), None)
+            if job is None:
+                job = ScanJob(folder_path, extensions, ignore, rescan, policy)
+                self._jobs[job.id] = job
+                job.future = self._pool.submit(self._run, job)
+                self._trim()
+            if owner is not None:
+                job.owners.add(owner)
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job.running:
+            job.cancel_event.set()
+        return job
+
+    def release(self, job_id, owner):
+        """Drop owner's interest in a job, cancelling it if nobody else is waiting for it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.owners.discard(owner)
+            if not job.owners and job.running:
+                job.cancel_event.set()
+
+    def _run(self, job):
+        registry = self.registry or get_scan_registry()
+        try:
+            if job.rescan:
+                job.result = registry.rescan(job.folder_path, job.extensions, job.ignore, on_progress=job._report,
+                                             cancel_event=job.cancel_event, policy=job.policy)
+            else:
+                job.result = registry.scan(job.folder_path, job.extensions, job.ignore, on_progress=job._report,
+                                           on_entry=job._add_entry, cancel_event=job.cancel_event,
+                                           policy=job.policy)
+            job.state = "done"
+        except ScanCancelled:
+            job.state = "cancelled"
+        except Exception as error:
+            job.error = error
+            job.state = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.partial_files = []  # The result holds the files now
+
+    # Forget the oldest finished jobs
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.running]
+        for job_id in finished[:max(len(finished) - KEEP_FINISHED_JOBS, 0)]:
+            del self._jobs[job_id]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+# Process-wide job manager, so a scan started in one session can be found from any other
+def get_scan_job_manager():
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ScanJobManager()
+    return _manager
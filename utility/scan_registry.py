@@ -0,0 +1,243 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from utility.dependency_graph import DependencyGraph
+from utility.repo_scan import rescan_folder, scan_folder
+from utility.retrieval_index import RetrievalIndex
+from utility.scanner import DEFAULT_IGNORE_DIRS, ScanCancelled
+from utility.telemetry import get_telemetry
+
+# Override the memory bound of the shared scan results with this environment variable (in MB)
+REGISTRY_MB_ENV_VAR = "AI_REPO_SCAN_REGISTRY_MB"
+DEFAULT_REGISTRY_MB = 512
+# Rough per-path cost of the file list and the finder's indexes, on top of the path text
+_BYTES_PER_PATH = 160
+
+# A shared scan, the added/modified/deleted delta of the rescan that produced it (None for full
+# scans and reused results), and whether it came from another session's scan instead of this call
+RegistryResult = namedtuple("RegistryResult", ["scan", "delta", "reused"])
+
+
+# Registry key of a folder scanned with a set of extensions, ignore names and selection policy
+def scan_key(folder_path, extensions, ignore=DEFAULT_IGNORE_DIRS, policy=None):
+    return (os.path.normcase(os.path.abspath(folder_path)), tuple(sorted(extensions)), tuple(sorted(ignore)),
+            policy)
+
+
+# Stop before indexing when the scan was cancelled while finishing; the saved manifest stays valid
+def _check_cancelled(cancel_event, folder_path):
+    if cancel_event is not None and cancel_event.is_set():
+        raise ScanCancelled(folder_path)
+
+
+class SharedScan:
+    """
+    Read-only results of one scan that every session opening the same folder shares: the sorted
+    file list, the retrieval index, the dependency graph, what the selection policy skipped and,
+    built on first use, the file finder.
+
+    Args:
+        key (tuple): scan_key() of the folder
+        generation (str): Manifest generation the results were built from
+        files (list): Sorted relative paths of the scanned files
+        index (RetrievalIndex): Retrieval index over the files, or None
+        skipped (list): SkipSummary records of the files and directories left out
+        graph (DependencyGraph): Imports and definitions of the files, or None
+    """
+
+    def __init__(self, key, generation, files, index, skipped=(), graph=None):
+        self.key = key
+        self.folder_path, self.extensions, self.ignore, self.policy = key
+        self.generation = generation
+        self.files = files
+        self.index = index
+        self.skipped = skipped
+        self.graph = graph
+        self._finder = None
+        self._lock = threading.Lock()
+
+    @property
+    def finder(self):
+        if self._finder is None:
+            from utility.file_finder import FileFinder
+
+            with self._lock:
+                if self._finder is None:
+                    self._finder = FileFinder(self.files)
+        return self._finder
+
+    @property
+    def approx_bytes(self):
+        index_bytes = self.index.approx_bytes if self.index is not None else 0
+        graph_bytes = self.graph.approx_bytes if self.graph is not None else 0
+        return (sum(map(len, self.files)) * (3 if self._finder is not None else 1) + _BYTES_PER_PATH * len(self.files)
+                + index_bytes + graph_bytes)
+
+
+class _Flight:
+    """A scan in progress that later callers for the same folder wait on instead of scanning again."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.progress = (0, 1)
+
+
+class ScanRegistry:
+    """
+    Process-wide scan results keyed by (folder, extensions, ignore names, selection policy) and
+    manifest generation.
+
+    Concurrent scans of the same folder are single-flight: the first caller scans, the others
+    wait for it (following its progress) and share its result. A full scan of a folder that is
+    already registered returns the registered result; a rescan replaces it only when files were
+    added, modified or deleted. The least recently used results are dropped once their estimated
+    size passes max_bytes; sessions still holding one keep it until they move on.
+
+    Args:
+        max_bytes (int): Memory bound for the registered results
+        build_index (bool): Build the retrieval index and the dependency graph with each scan
+    """
+
+    def __init__(self, max_bytes=DEFAULT_REGISTRY_MB * 1024 * 1024, build_index=True):
+        self.max_bytes = max_bytes
+        self.build_index = build_index
+        self._scans = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def latest(self, folder_path, extensions, ignore=DEFAULT_IGNORE_DIRS, policy=None):
+        """The registered scan of a folder, or None."""
+        key = scan_key(folder_path, extensions, ignore, policy)
+        with self._lock:
+            scan = self._scans.get(key)
+            if scan is not None:
+                self._scans.move_to_end(key)
+            return scan
+
+    def scan(self, folder_path, extensions, ignore=DEFAULT_IGNORE_DIRS, on_progress=None, on_entry=None,
+             cancel_event=None, policy=None):
+        """
+        Scan a folder from scratch, unless it is registered already or being scanned.
+
+        Args:
+            on_progress (callable): Called as on_progress(visited_dirs, discovered_dirs)
+            on_entry (callable): Called with each ScanEntry found, when this call does the scanning
+            cancel_event (threading.Event): Stops the scan with ScanCancelled once set
+            policy (SelectionPolicy): Selection applied on top of the extensions
+
+        Returns:
+            RegistryResult: The shared scan
+        """
+        key = scan_key(folder_path, extensions, ignore, policy)
+        registered = self.latest(folder_path, extensions, ignore, policy)
+        if registered is not None:
+            get_telemetry().increment("scan_registry.hits")
+            return RegistryResult(registered, None, True)
+        get_telemetry().increment("scan_registry.misses")
+
+        def work(report):
+            result = scan_folder(folder_path, extensions, ignore, on_progress=report, on_entry=on_entry,
+                                 cancel_event=cancel_event, policy=policy)
+            _check_cancelled(cancel_event, folder_path)
+            index = graph = None
+            if self.build_index:
+                index = RetrievalIndex.build(result.manifest)
+                _check_cancelled(cancel_event, folder_path)
+                graph = DependencyGraph.build(result.manifest)
+            return RegistryResult(self._register(key, result, index, graph), None, False)
+
+        return self._single_flight(key, work, on_progress)
+
+    def rescan(self, folder_path, extensions, ignore=DEFAULT_IGNORE_DIRS, on_progress=None, cancel_event=None,
+               policy=None):
+        """
+        Rescan a folder incrementally and register the new results if anything changed.
+
+        Returns:
+            RegistryResult: The shared scan and the rescan's delta (None if it joined another scan)
+        """
+        key = scan_key(folder_path, extensions, ignore, policy)
+
+        def work(report):
+            result = rescan_folder(folder_path, extensions, ignore, on_progress=report, cancel_event=cancel_event,
+                                   policy=policy)
+            delta = result.delta
+            registered = self.latest(folder_path, extensions, ignore, policy)
+            if registered is not None and registered.generation == result.manifest.generation:
+                return RegistryResult(registered, delta, False)
+            _check_cancelled(cancel_event, folder_path)
+            index = graph = None
+            if self.build_index:
+                # The saved index and graph are reused when they were built from this generation of
+                # the manifest, and patched with the delta when they were built from the previous one
+                index = RetrievalIndex.load(result.manifest) or RetrievalIndex.build(result.manifest, delta)
+                _check_cancelled(cancel_event, folder_path)
+                graph = DependencyGraph.load(result.manifest) or DependencyGraph.build(result.manifest, delta)
+            return RegistryResult(self._register(key, result, index, graph), delta, False)
+
+        return self._single_flight(key, work, on_progress)
+
+    def discard(self, folder_path, extensions, ignore=DEFAULT_IGNORE_DIRS, policy=None):
+        with self._lock:
+            self._scans.pop(scan_key(folder_path, extensions, ignore, policy), None)
+
+    def _single_flight(self, key, work, on_progress):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            get_telemetry().increment("scan_registry.joined")
+            while not flight.done.wait(0.1):
+                if on_progress:
+                    on_progress(*flight.progress)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result._replace(delta=None, reused=True)
+
+        def report(visited, discovered):
+            flight.progress = (visited, discovered)
+            if on_progress:
+                on_progress(visited, discovered)
+
+        try:
+            flight.result = work(report)
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _register(self, key, result, index, graph):
+        scan = SharedScan(key, result.manifest.generation, result.files, index, result.skipped, graph)
+        with self._lock:
+            self._scans[key] = scan
+            self._scans.move_to_end(key)
+            total = sum(registered.approx_bytes for registered in self._scans.values())
+            while total > self.max_bytes and len(self._scans) > 1:
+                _, evicted = self._scans.popitem(last=False)
+                total -= evicted.approx_bytes
+                get_telemetry().increment("scan_registry.evictions")
+        return scan
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+# Process-wide registry, so every Streamlit session shares the scans of the same folders
+def get_scan_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                megabytes = int(os.getenv(REGISTRY_MB_ENV_VAR) or DEFAULT_REGISTRY_MB)
+                _registry = ScanRegistry(max_bytes=megabytes * 1024 * 1024)
+    return _registry
@@ -0,0 +1,150 @@
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utility.file_selection import SkipEntry
+from utility.telemetry import get_telemetry
+
+# Directory and file names that are never descended into or reported
+DEFAULT_IGNORE_DIRS = frozenset({
+    'venv', '__pycache__', '.git', '.idea', '.vscode', 'node_modules', '.venv', 'env', '.env', '.azure'
+})
+
+class ScanCancelled(Exception):
+    """Raised inside a scan whose cancel_event was set; nothing from the scan is saved."""
+
+
+# Stat details captured from the DirEntry while walking, so callers never stat twice
+ScanEntry = namedtuple("ScanEntry", ["relative_path", "size", "mtime", "ctime", "inode"])
+
+# Result of listing a single directory: matching files, subdirectories still to visit, and the
+# SkipEntry of every matching file or subdirectory the selection policy left out
+DirListing = namedtuple("DirListing", ["relative_dir", "mtime_ns", "files", "subdirs", "skipped"])
+
+
+# List one directory with os.scandir, pruning ignored names by whole path component and, with a
+# FileSelector, whatever its policy leaves out
+def scan_directory(root, relative_dir, extensions, ignore=DEFAULT_IGNORE_DIRS, selector=None):
+    dir_path = os.path.join(root, relative_dir) if relative_dir else root
+    files = []
+    subdirs = []
+    skipped = []
+    try:
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        with os.scandir(dir_path) as iterator:
+            entries = list(iterator)
+    except OSError:
+        return DirListing(relative_dir, None, [], [], [])
+    rules = selector.directory_rules(relative_dir, {entry.name for entry in entries}) if selector else None
+    # Stats of one directory's files; kept out of the recent operations, there is one per directory
+    with get_telemetry().span("file.stat", in_recent=False) as span:
+        for entry in entries:
+            name = entry.name
+            if name in ignore:
+                continue
+            relative_path = os.path.join(relative_dir, name) if relative_dir else name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    reason = selector.skip_directory(relative_path, rules) if selector else None
+                    if reason:
+                        skipped.append(SkipEntry(name, reason, True))
+                    else:
+                        subdirs.append(relative_path)
+                elif os.path.splitext(name)[1] in extensions and entry.is_file():
+                    stat = entry.stat()
+                    reason = selector.skip_file(relative_path, stat.st_size, rules) if selector else None
+                    if reason:
+                        skipped.append(SkipEntry(name, reason, False))
+                    else:
+                        files.append(ScanEntry(relative_path, stat.st_size, stat.st_mtime,
+                                               stat.st_ctime, stat.st_ino))
+            except OSError:
+                # Entry vanished or is unreadable between listing and stat
+                continue
+        span.set(files=len(files))
+    return DirListing(relative_dir, mtime_ns, files, subdirs, skipped)
+
+
+def walk_parallel(root, list_directory, max_workers=None, on_progress=None, cancel_event=None):
+    """
+    Walk a folder in parallel with any directory lister, yielding its results as they are ready.
+
+    list_directory(relative_dir) runs on a thread pool worker and returns a result with a subdirs
+    list; every subdirectory is scheduled as soon as its parent is listed, so large subtrees are
+    spread across the pool instead of being walked depth-first on a single thread.
+
+    Args:
+        root (str): Folder to walk
+        list_directory (callable): Lists one directory given its path relative to root
+        max_workers (int): Thread pool size, defaults to a small multiple of the CPU count
+        on_progress (callable): Called as on_progress(visited_dirs, discovered_dirs) after each listing
+        cancel_event (threading.Event): Once set, queued listings are dropped and ScanCancelled is raised
+
+    Yields:
+        The result of list_directory for each visited directory
+    """
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan")
+    try:
+        pending = {pool.submit(list_directory, "")}
+        visited = 0
+        discovered = 1
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if cancel_event is not None and cancel_event.is_set():
+                raise ScanCancelled(root)
+            for future in done:
+                listing = future.result()
+                for subdir in listing.subdirs:
+                    pending.add(pool.submit(list_directory, subdir))
+                visited += 1
+                discovered += len(listing.subdirs)
+                if on_progress:
+                    on_progress(visited, discovered)
+                yield listing
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_directory_listings(root, extensions, ignore=DEFAULT_IGNORE_DIRS, max_workers=None,
+                            on_progress=None, cancel_event=None, selector=None):
+    """
+    Walk a folder in parallel, yielding one DirListing per visited directory as soon as it is ready.
+
+    Args:
+        root (str): Folder to scan
+        extensions (set): File suffixes (with dots) to report
+        ignore (frozenset): Directory and file names to prune during the walk
+        max_workers (int): Thread pool size, defaults to a small multiple of the CPU count
+        on_progress (callable): Called as on_progress(visited_dirs, discovered_dirs) after each listing
+        cancel_event (threading.Event): Once set, queued listings are dropped and ScanCancelled is raised
+        selector (FileSelector): Leaves out what its selection policy excludes, recording why
+
+    Yields:
+        DirListing: Directory listing with its matching files and subdirectories
+    """
+    root = os.fspath(root)
+    extensions = frozenset(extensions)
+    ignore = frozenset(ignore)
+    return walk_parallel(root, lambda relative_dir: scan_directory(root, relative_dir, extensions, ignore, selector),
+                         max_workers, on_progress, cancel_event)
+
+
+def iter_code_files(root, extensions, ignore=DEFAULT_IGNORE_DIRS, max_workers=None, on_progress=None):
+    """
+    Stream every file under root whose suffix is in extensions, skipping ignored directories.
+
+    Args:
+        root (str): Folder to scan
+        extensions (set): File suffixes (with dots) to report
+        ignore (frozenset): Directory and file names to prune during the walk
+        max_workers (int): Thread pool size
+        on_progress (callable): Progress callback, see iter_directory_listings
+
+    Yields:
+        ScanEntry: Relative path and stat details of each matching file
+    """
+    for listing in iter_directory_listings(root, extensions, ignore, max_workers, on_progress):
+        yield from listing.files
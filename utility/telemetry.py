@@ -0,0 +1,276 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from utility.cache_dir import atomic_write_text, get_cache_root
+
+# Set to 1 to record timings and counters from startup (the UI can also switch them on)
+TELEMETRY_ENV_VAR = "AI_REPO_TELEMETRY"
+# Finished operations kept for the diagnostics view and the JSONL export
+RECENT_OPERATIONS = 500
+# Most recent durations per operation that percentiles are computed from
+HISTOGRAM_SAMPLES = 2048
+# Seconds after which a session that switched recording on and went quiet stops counting
+RECORDER_TIMEOUT = 15 * 60
+OPERATIONS_FILE = "operations.jsonl"
+METRICS_FILE = "metrics.prom"
+
+_METRIC_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class _NoopSpan:
+    """Stands in for a Span while telemetry is off, so instrumented code costs one method call."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """Times a with block and records it under its name when the block exits."""
+
+    __slots__ = ("telemetry", "name", "attributes", "in_recent", "started_at", "start_time")
+
+    def __init__(self, telemetry, name, attributes, in_recent=True):
+        self.telemetry = telemetry
+        self.name = name
+        self.attributes = attributes
+        self.in_recent = in_recent
+
+    def __enter__(self):
+        self.start_time = time.time()
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration_ms = (time.perf_counter() - self.started_at) * 1000
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.telemetry.record(self.name, duration_ms, start_time=self.start_time, in_recent=self.in_recent,
+                              **self.attributes)
+        return False
+
+    def set(self, **attributes):
+        """Attach details only known inside the block, such as a result count."""
+        self.attributes.update(attributes)
+
+
+class Histogram:
+    """Count, sum and maximum of every duration, with percentiles over the most recent ones."""
+
+    def __init__(self, samples=HISTOGRAM_SAMPLES):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.errors = 0
+        self.samples = deque(maxlen=samples)
+
+    def add(self, value, error=False):
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+        self.errors += error
+        self.samples.append(value)
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return [0.0 for _ in quantiles]
+        # Nearest-rank percentiles
+        return [ordered[min(int(quantile * len(ordered)), len(ordered) - 1)] for quantile in quantiles]
+
+    def as_dict(self):
+        p50, p95, p99 = self.percentiles()
+        return {"count": self.count, "errors": self.errors, "total_ms": self.total,
+                "mean_ms": self.total / self.count if self.count else 0.0,
+                "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": self.maximum}
+
+
+class Telemetry:
+    """
+    In-process timings and counters for scans, indexing, file reads and LLM requests.
+
+    Operations are timed with span() blocks and summarized as histograms (p50/p95/p99 per
+    operation name); counters track tokens, cost and cache hits. The last few hundred
+    operations are kept for the diagnostics view, and export() writes them as JSONL next to a
+    Prometheus text snapshot of the metrics. While disabled, span() hands out a shared no-op
+    and record() and increment() return at once, so instrumentation can stay in hot paths.
+
+    Besides being enabled for good, recording can be switched on by owners such as the
+    Streamlit sessions showing the diagnostics panel: it stays on while at least one of them
+    wants it and has been seen in the last RECORDER_TIMEOUT seconds.
+
+    Args:
+        enabled (bool): Record for the whole life of the process
+        recent (int): Finished operations kept in memory
+    """
+
+    def __init__(self, enabled=False, recent=RECENT_OPERATIONS):
+        self.enabled = enabled
+        self.always_enabled = enabled
+        self._recorders = {}
+        self._histograms = {}
+        self._counters = {}
+        self._recent = deque(maxlen=recent)
+        self._sequence = 0
+        self._exported = 0
+        self._lock = threading.Lock()
+
+    def start_recording(self, owner):
+        """Record until owner calls stop_recording() or is not seen for RECORDER_TIMEOUT seconds."""
+        with self._lock:
+            self._recorders[owner] = time.monotonic()
+            self._update_enabled()
+
+    def stop_recording(self, owner):
+        """Drop owner's interest; recording stops once no owner wants it, unless always enabled."""
+        with self._lock:
+            self._recorders.pop(owner, None)
+            self._update_enabled()
+
+    @property
+    def recorders(self):
+        """Number of owners currently keeping recording on."""
+        return len(self._recorders)
+
+    # Called with the lock held
+    def _update_enabled(self):
+        now = time.monotonic()
+        for owner, seen in list(self._recorders.items()):
+            if now - seen > RECORDER_TIMEOUT:
+                del self._recorders[owner]
+        self.enabled = self.always_enabled or bool(self._recorders)
+
+    def span(self, name, in_recent=True, **attributes):
+        """
+        Time a with block as one operation.
+
+        Args:
+            name (str): Operation name, e.g. "scan.walk"; one histogram is kept per name
+            in_recent (bool): Also list it with the recent operations; False for operations
+                repeated so often they would push everything else out
+            **attributes: Details stored with the operation, e.g. the file it was about
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes, in_recent)
+
+    def record(self, name, duration_ms, start_time=None, in_recent=True, **attributes):
+        """Record an operation timed elsewhere, such as a streamed reply measured by its consumer."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(duration_ms, "error" in attributes)
+            if in_recent:
+                self._sequence += 1
+                self._recent.append({"name": name, "start": start_time or time.time() - duration_ms / 1000,
+                                     "duration_ms": round(duration_ms, 3), **attributes, "seq": self._sequence})
+
+    def increment(self, name, value=1):
+        """
+        Add to a counter. Counters named "<prefix>.hits" and "<prefix>.misses" are reported
+        together as the hit rate of <prefix>.
+        """
+        if not self.enabled or not value:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def recent(self, limit=None):
+        """Finished operations, newest first."""
+        with self._lock:
+            operations = list(self._recent)
+        operations.reverse()
+        return operations[:limit] if limit else operations
+
+    def snapshot(self):
+        """
+        Current metrics.
+
+        Returns:
+            dict: {"histograms": {name: stats}, "counters": {name: value}, "hit_rates": {prefix: rate}}
+        """
+        with self._lock:
+            histograms = {name: histogram.as_dict() for name, histogram in sorted(self._histograms.items())}
+            counters = dict(sorted(self._counters.items()))
+        hit_rates = {}
+        for name, hits in counters.items():
+            if name.endswith(".hits"):
+                prefix = name[:-len(".hits")]
+                lookups = hits + counters.get(prefix + ".misses", 0)
+                hit_rates[prefix] = hits / lookups if lookups else 0.0
+        return {"histograms": histograms, "counters": counters, "hit_rates": hit_rates}
+
+    def prometheus_text(self, prefix="ai_repo"):
+        """Metrics in the Prometheus text exposition format: one summary per operation, one counter each."""
+        metrics = self.snapshot()
+        lines = []
+        if metrics["histograms"]:
+            name = f"{prefix}_operation_duration_milliseconds"
+            lines.append(f"# TYPE {name} summary")
+            for operation, stats in metrics["histograms"].items():
+                for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                    lines.append(f'{name}{{operation="{operation}",quantile="{quantile}"}} {stats[key]:.3f}')
+                lines.append(f'{name}_sum{{operation="{operation}"}} {stats["total_ms"]:.3f}')
+                lines.append(f'{name}_count{{operation="{operation}"}} {stats["count"]}')
+        for counter, value in metrics["counters"].items():
+            name = f"{prefix}_{_METRIC_NAME.sub('_', counter)}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory=None):
+        """
+        Append the operations finished since the last export to operations.jsonl and rewrite
+        metrics.prom, in directory (defaults to telemetry/ in the cache root).
+
+        Returns:
+            str: The export directory
+        """
+        directory = directory or os.path.join(get_cache_root(), "telemetry")
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            operations = [operation for operation in self._recent if operation["seq"] > self._exported]
+            self._exported = self._sequence
+        with open(os.path.join(directory, OPERATIONS_FILE), "a", encoding="utf-8") as f:
+            for operation in operations:
+                f.write(json.dumps(operation, default=str) + "\n")
+        atomic_write_text(os.path.join(directory, METRICS_FILE), self.prometheus_text())
+        return directory
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._recent.clear()
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+# Process-wide telemetry shared by every session, enabled from the environment
+def get_telemetry():
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                enabled = os.getenv(TELEMETRY_ENV_VAR, "").lower() in ("1", "true", "yes", "on")
+                _telemetry = Telemetry(enabled=enabled)
+    return _telemetry